@@ -0,0 +1,214 @@
+"""Maintenance commands for the Fuel Station Client Portal.
+
+Run from the backend directory, e.g. ``python cli.py backfill-rollups``.
+"""
+import asyncio
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+import server
+
+app = typer.Typer(help="Fuel Station Client Portal maintenance commands")
+
+
+def run_with_credit_evaluation(coroutine):
+    """Run a command that writes transactions or invoices, then evaluate the credit
+    alerts it queued; no background evaluator runs in this process to do it"""
+    async def run():
+        result = await coroutine
+        await server.drain_credit_evaluations()
+        return result
+
+    return asyncio.run(run())
+
+
+@app.command("backfill-rollups")
+def backfill_rollups(
+    client_id: Optional[str] = typer.Option(None, help="Only rebuild rollups for this client id"),
+):
+    """Rebuild fuel_daily_rollups from raw fuel transactions"""
+    rows = asyncio.run(server.backfill_daily_rollups(client_id))
+    typer.echo(f"fuel_daily_rollups rebuilt: {rows} rollup rows")
+
+
+@app.command("ensure-indexes")
+def ensure_indexes(
+    drop_unknown: bool = typer.Option(False, help="Also drop indexes that are not declared in server.INDEXES"),
+):
+    """Create, rebuild and optionally prune indexes to match server.INDEXES"""
+    report = asyncio.run(server.ensure_indexes(drop_unknown=drop_unknown))
+    for collection_name, changes in report.items():
+        summary = ", ".join(f"{action}: {', '.join(names)}" for action, names in changes.items() if names)
+        typer.echo(f"{collection_name}: {summary or 'up to date'}")
+
+
+@app.command("index-stats")
+def index_stats():
+    """Show how often each managed index has been used since the server started"""
+    usage = asyncio.run(server.get_index_usage())
+    for collection_name, indexes in usage.items():
+        typer.echo(collection_name)
+        for index in indexes:
+            typer.echo(f"  {index['name']:<28} {index['ops']:>12} ops since {index['since']:%Y-%m-%d %H:%M}")
+
+
+@app.command("notification-worker")
+def notification_worker(
+    concurrency: int = typer.Option(server.NOTIFICATION_WORKERS, help="Number of concurrent delivery workers"),
+):
+    """Drain the notification outbox in a standalone process"""
+    async def run():
+        server.start_notification_workers(concurrency)
+        await asyncio.gather(*server.notification_workers)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command("outbox-stats")
+def outbox_stats():
+    """Show notification queue depth and recent delivery latency"""
+    metrics = asyncio.run(server.get_outbox_metrics())
+    typer.echo("depth: " + ", ".join(f"{status}={count}" for status, count in metrics["depth"].items()))
+    typer.echo(f"oldest pending: {metrics['oldest_pending_age_seconds']:.1f}s")
+    latency = metrics["latency_seconds"]
+    typer.echo(
+        f"delivered last hour: {metrics['delivered_in_window']} "
+        f"(p50={latency['p50']}s p95={latency['p95']}s max={latency['max']}s)"
+    )
+
+
+@app.command("reconcile-credit")
+def reconcile_credit(
+    batch_size: int = typer.Option(500, help="Clients corrected per bulk write"),
+):
+    """Recompute clients' credit usage from open invoices and fix any drift"""
+    result = asyncio.run(server.reconcile_credit_usage(batch_size=batch_size))
+    typer.echo(f"checked {result['checked']} clients, repaired {result['repaired']}")
+
+
+@app.command("sweep-credit-alerts")
+def sweep_credit_alerts(
+    concurrency: int = typer.Option(32, help="Clients evaluated concurrently"),
+    batch_size: int = typer.Option(1000, help="Cursor batch size for the client aggregation"),
+):
+    """Evaluate the 70/80/90/100% credit thresholds for every active client"""
+    stats = asyncio.run(server.sweep_credit_alerts(concurrency=concurrency, batch_size=batch_size))
+    typer.echo(
+        f"{stats['at_risk']} clients at or above the lowest threshold, "
+        f"{stats['skipped_cooldown']} on cooldown, {stats['evaluated']} evaluated, "
+        f"{stats['errors']} errors in {stats['elapsed_seconds']:.2f}s "
+        f"({stats['clients_per_second']:.0f} clients/s)"
+    )
+
+
+@app.command("reset-limits")
+def reset_limits(
+    batch_size: int = typer.Option(1000, help="Limits reset per update_many"),
+):
+    """Reset usage on fuel limits whose daily/weekly/monthly window has passed"""
+    processed = asyncio.run(server.reset_expired_limits(batch_size=batch_size))
+    typer.echo(", ".join(f"{limit_type}: {count}" for limit_type, count in processed.items()))
+
+
+@app.command("billing-run")
+def billing_run(
+    cycle: Optional[str] = typer.Option(None, help="Billing cycle as YYYY-MM (default: previous month)"),
+    concurrency: int = typer.Option(8, help="Client batches billed concurrently"),
+    batch_size: int = typer.Option(200, help="Clients per batch"),
+):
+    """Invoice uninvoiced transactions for a billing cycle; safe to rerun"""
+    cycle = cycle or server.previous_billing_cycle()
+    try:
+        stats = run_with_credit_evaluation(server.run_billing(cycle, concurrency=concurrency, batch_size=batch_size))
+    except (ValueError, RuntimeError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    typer.echo(
+        f"{cycle}: {stats['clients']} clients, {stats['invoices']} invoices "
+        f"({stats['created']} new), {stats['transactions']} transactions, "
+        f"{stats['errors']} failed in {stats['elapsed_seconds']:.2f}s "
+        f"({stats['clients_per_second']:.0f} clients/s)"
+    )
+    if stats["errors"]:
+        raise typer.Exit(1)
+
+
+@app.command("link-invoice-transactions")
+def link_invoice_transactions(
+    batch_size: int = typer.Option(500, help="Invoices linked per bulk write"),
+):
+    """Set invoice_id on transactions of invoices created before the billing run; run once before the first billing-run"""
+    stats = asyncio.run(server.link_invoice_transactions(batch_size=batch_size))
+    typer.echo(f"{stats['transactions']} transactions linked to {stats['invoices']} invoices")
+
+
+@app.command("invoice-status")
+def invoice_status(
+    batch_size: int = typer.Option(500, help="Invoices per reminder batch"),
+):
+    """Mark past-due invoices overdue and queue due-date reminders"""
+    stats = asyncio.run(server.update_invoice_statuses(batch_size=batch_size))
+    typer.echo(
+        f"{stats['overdue']} invoices marked overdue, {stats['reminded_invoices']} reminded "
+        f"({stats['notifications']} notifications queued) in {stats['elapsed_seconds']:.2f}s"
+    )
+
+
+def read_transaction_rows(path: Path):
+    """Yield rows from a CSV or NDJSON (.ndjson/.jsonl) transaction file"""
+    with path.open(newline="", encoding="utf-8") as handle:
+        if path.suffix in (".ndjson", ".jsonl"):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(handle):
+                yield {key: value for key, value in row.items() if value != ""}
+
+
+@app.command("ingest")
+def ingest(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False, help="CSV or NDJSON file of transactions"),
+    batch_size: int = typer.Option(2000, help="Transactions per insert batch"),
+):
+    """Bulk ingest station transactions from a file"""
+    async def run():
+        totals = {"received": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+        started = time.perf_counter()
+        batch = []
+
+        async def flush():
+            result = await server.ingest_transactions(batch)
+            for key in ("received", "inserted", "duplicates"):
+                totals[key] += result[key]
+            totals["invalid"] += len(result["invalid"])
+            for problem in result["invalid"][:5]:
+                typer.echo(f"  invalid: {problem}", err=True)
+            batch.clear()
+
+        for row in read_transaction_rows(path):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                await flush()
+        if batch:
+            await flush()
+        return totals, time.perf_counter() - started
+
+    totals, elapsed = run_with_credit_evaluation(run())
+    typer.echo(
+        f"received {totals['received']}, inserted {totals['inserted']}, "
+        f"duplicates {totals['duplicates']}, invalid {totals['invalid']} "
+        f"in {elapsed:.2f}s ({totals['received'] / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateMany, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, ValidationError, validator
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
@@ -17,19 +21,397 @@ import random
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import requests
+import httpx
 import asyncio
+import base64
+import copy
+import hashlib
+import csv
+import io
+import json
+import orjson
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from zoneinfo import ZoneInfo
+from opentelemetry import context as otel_context, propagate, trace
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+from opentelemetry.instrumentation.pymongo import PymongoInstrumentor
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Request and database metrics, rendered in Prometheus text format on /metrics.
+# pymongo listeners run on Motor's executor threads, which inherit the
+# request's context, so database work is attributed to the request that
+# issued it.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+def format_labels(names: tuple, values: tuple) -> str:
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in values:
+            lines.append(f"{self.name}{{{format_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> cumulative bucket counts followed by sum and count
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            all_series = sorted((label_values, list(series)) for label_values, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in all_series:
+            labels = format_labels(self.labels, label_values)
+            prefix = labels + "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+http_requests_total = Counter("portal_http_requests_total", "Requests by route and status", ("method", "route", "status"))
+http_request_seconds = Histogram("portal_http_request_duration_seconds", "Request latency by route", ("method", "route"))
+http_request_db_seconds = Histogram("portal_http_request_db_seconds", "MongoDB time per request", ("method", "route"))
+http_request_db_commands = Histogram(
+    "portal_http_request_db_commands", "MongoDB round trips per request", ("method", "route"), COUNT_BUCKETS
+)
+mongo_command_seconds = Histogram("portal_mongo_command_duration_seconds", "MongoDB command latency", ("command",))
+mongo_command_failures_total = Counter("portal_mongo_command_failures_total", "Failed MongoDB commands", ("command",))
+mongo_checkout_seconds = Histogram("portal_mongo_pool_checkout_wait_seconds", "Time waiting for a pooled connection", ())
+mongo_checkout_failures_total = Counter("portal_mongo_pool_checkout_failures_total", "Failed connection checkouts", ("reason",))
+
+# Mongo diagnostics (off by default): log every command at DEBUG on the
+# portal.mongo logger, log slow commands with their explain plan, and warn
+# about requests that issue too many commands or repeat one in a loop.
+MONGO_DIAGNOSTICS = os.environ.get('MONGO_DIAGNOSTICS', 'false').lower() == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+# Slow query shapes remembered for the explain interval; the least recent are forgotten first
+SLOW_QUERY_EXPLAIN_MAX_SHAPES = int(os.environ.get('SLOW_QUERY_EXPLAIN_MAX_SHAPES', 1000))
+MAX_COMMANDS_PER_REQUEST = int(os.environ.get('MAX_COMMANDS_PER_REQUEST', 25))
+MAX_REPEATED_COMMANDS = int(os.environ.get('MAX_REPEATED_COMMANDS', 5))
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+mongo_logger = logging.getLogger("portal.mongo")
+
+def query_shape(value):
+    """A filter with every value replaced by "?", so calls differing only in ids compare equal"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in sorted(value.items())}
+    if isinstance(value, list):
+        return [query_shape(value[0])] if value else []
+    return "?"
+
+def command_shape(command_name: str, command: dict) -> str:
+    collection = command.get(command_name)
+    if command_name == "aggregate":
+        stages = [next(iter(stage)) for stage in command.get("pipeline", [])]
+        return f"aggregate {collection} {stages}"
+    if command_name == "update":
+        update = (command.get("updates") or [{}])[0]
+        operators = sorted(update.get("u", {})) if isinstance(update.get("u", {}), dict) else ["pipeline"]
+        return f"update {collection} {json.dumps(query_shape(update.get('q', {})))} {operators}"
+    if command_name == "delete":
+        query = (command.get("deletes") or [{}])[0].get("q", {})
+    else:
+        query = command.get("filter", command.get("query", {}))
+    return f"{command_name} {collection} {json.dumps(query_shape(query))}"
+
+def summarize_plan(stage: dict) -> str:
+    """Stage chain of a winning plan, e.g. FETCH > IXSCAN(client_date)"""
+    parts = []
+    while stage:
+        parts.append(f"{stage['stage']}({stage['indexName']})" if "indexName" in stage else stage["stage"])
+        stage = stage.get("inputStage") or (stage.get("inputStages") or [None])[0]
+    return " > ".join(parts)
+
+class RequestMetrics:
+    """DB round trips and time accumulated by one request"""
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.db_commands = 0
+        self.db_seconds = 0.0
+        self.shapes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def handler(self) -> str:
+        route = self.scope.get("route") if self.scope else None
+        return route.name if route is not None else "unmatched"
+
+    def add_command(self, seconds: float, shape: Optional[str] = None):
+        with self._lock:
+            self.db_commands += 1
+            self.db_seconds += seconds
+            if shape is not None:
+                self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def report_access_pattern(self, label: str):
+        """Warn when a request issued too many commands or repeated one"""
+        if self.db_commands > MAX_COMMANDS_PER_REQUEST:
+            mongo_logger.warning(
+                f"{label} ({self.handler}) issued {self.db_commands} Mongo commands "
+                f"in {self.db_seconds * 1000:.1f}ms (limit {MAX_COMMANDS_PER_REQUEST})"
+            )
+        repeated = sorted(
+            ((count, shape) for shape, count in self.shapes.items() if count > MAX_REPEATED_COMMANDS),
+            reverse=True
+        )
+        for count, shape in repeated[:3]:
+            mongo_logger.warning(f"{label} ({self.handler}) repeated {count}x: {shape} (possible N+1)")
+
+current_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request_metrics", default=None)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request id) -> (shape, command, database) while a command is in flight
+        self.in_flight: Dict[tuple, tuple] = {}
+        # shape -> when it was last explained, least recently seen first
+        self.explained: "OrderedDict[str, float]" = OrderedDict()
+        self._explained_lock = threading.Lock()
+        self.explain_executor: Optional[ThreadPoolExecutor] = None
+
+    def started(self, event):
+        if MONGO_DIAGNOSTICS and event.command_name != "explain":
+            self.in_flight[(event.connection_id, event.request_id)] = (
+                command_shape(event.command_name, event.command), event.command, event.database_name
+            )
+
+    def succeeded(self, event):
+        self.record(event)
+
+    def failed(self, event):
+        mongo_command_failures_total.inc((event.command_name,))
+        self.record(event)
+
+    def record(self, event):
+        seconds = event.duration_micros / 1e6
+        mongo_command_seconds.observe((event.command_name,), seconds)
+        diagnostics = self.in_flight.pop((event.connection_id, event.request_id), None)
+        shape = diagnostics[0] if diagnostics else None
+        request_metrics = current_request_metrics.get()
+        if request_metrics is not None:
+            request_metrics.add_command(seconds, shape)
+        if diagnostics:
+            self.log_command(event, seconds, diagnostics, request_metrics.handler if request_metrics else "background")
+
+    def log_command(self, event, seconds: float, diagnostics: tuple, handler: str):
+        shape, command, database_name = diagnostics
+        milliseconds = seconds * 1000
+        if milliseconds < SLOW_QUERY_MS:
+            mongo_logger.debug(f"{shape} took {milliseconds:.1f}ms in {handler}")
+            return
+        
+        mongo_logger.warning(f"Slow Mongo command in {handler}: {shape} took {milliseconds:.1f}ms")
+        if event.command_name not in EXPLAINABLE_COMMANDS:
+            return
+        # Explain each slow shape at most once per interval
+        now = time.monotonic()
+        with self._explained_lock:
+            last_explained = self.explained.get(shape)
+            due = last_explained is None or now - last_explained >= SLOW_QUERY_EXPLAIN_INTERVAL
+            self.explained[shape] = now if due else last_explained
+            self.explained.move_to_end(shape)
+            while len(self.explained) > SLOW_QUERY_EXPLAIN_MAX_SHAPES:
+                self.explained.popitem(last=False)
+        if due:
+            if self.explain_executor is None:
+                self.explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mongo-explain")
+            self.explain_executor.submit(self.explain, shape, command, database_name)
+
+    def explain(self, shape: str, command: dict, database_name: str):
+        # Runs on its own thread with the synchronous client, outside any request
+        command = {
+            key: value for key, value in command.items()
+            if not key.startswith("$") and key not in ("lsid", "txnNumber")
+        }
+        try:
+            result = client.delegate[database_name].command({"explain": command, "verbosity": "queryPlanner"})
+            planner = result.get("queryPlanner") or result.get("stages", [{}])[0].get("$cursor", {}).get("queryPlanner", {})
+            plan = planner.get("winningPlan", {})
+            mongo_logger.warning(f"Plan for {shape}: {summarize_plan(plan.get('queryPlan', plan))}")
+        except Exception as e:
+            mongo_logger.debug(f"Could not explain {shape}: {e}")
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Open and checked-out connections per server, plus checkout wait time"""
+
+    def __init__(self):
+        self.pools: Dict[str, Dict[str, int]] = {}
+        self._checkout_started = threading.local()
+        self._lock = threading.Lock()
+
+    def _adjust(self, address, field: str, delta: int):
+        with self._lock:
+            pool = self.pools.setdefault(f"{address[0]}:{address[1]}", {"open": 0, "checked_out": 0, "max_size": 0})
+            pool[field] += delta
+
+    def pool_created(self, event):
+        self._adjust(event.address, "max_size", event.options.get("maxPoolSize", 100))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        self._adjust(event.address, "open", 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._adjust(event.address, "open", -1)
+
+    def connection_check_out_started(self, event):
+        # Checkout happens on the calling thread, so the start time is kept per thread
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        mongo_checkout_failures_total.inc((event.reason,))
+
+    def connection_checked_out(self, event):
+        self._adjust(event.address, "checked_out", 1)
+        started = getattr(self._checkout_started, "value", None)
+        if started is not None:
+            mongo_checkout_seconds.observe((), time.perf_counter() - started)
+
+    def connection_checked_in(self, event):
+        self._adjust(event.address, "checked_out", -1)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            pools = sorted((address, dict(pool)) for address, pool in self.pools.items())
+        lines = []
+        for field, help_text in (
+            ("open", "Open MongoDB connections"),
+            ("checked_out", "MongoDB connections in use"),
+            ("max_size", "MongoDB connection pool size limit"),
+        ):
+            name = f"portal_mongo_pool_{field}_connections"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f'{name}{{address="{address}"}} {pool[field]}' for address, pool in pools]
+        return lines
+
+class RequestMetricsMiddleware:
+    """Record latency, status and DB work per matched route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request_metrics = RequestMetrics(scope)
+        token = current_request_metrics.set(request_metrics)
+        started = time.perf_counter()
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request_metrics.reset(token)
+            # The router stores the matched route in the scope; using its
+            # template keeps ids out of the label values
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else "unmatched")
+            http_request_seconds.observe(labels, time.perf_counter() - started)
+            http_requests_total.inc(labels + (str(status_code),))
+            http_request_db_seconds.observe(labels, request_metrics.db_seconds)
+            http_request_db_commands.observe(labels, request_metrics.db_commands)
+            if MONGO_DIAGNOSTICS:
+                request_metrics.report_access_pattern(" ".join(labels))
+
+mongo_command_metrics = MongoCommandMetrics()
+mongo_pool_metrics = MongoPoolMetrics()
+
+# OpenTelemetry tracing, off unless OTEL_TRACES_EXPORTER is "console" or
+# "otlp" (OTLP/HTTP, endpoint from OTEL_EXPORTER_OTLP_ENDPOINT, default
+# http://localhost:4318). Pymongo must be instrumented before the client
+# below is created; the FastAPI app is instrumented right after it exists.
+OTEL_TRACES_EXPORTER = os.environ.get('OTEL_TRACES_EXPORTER', 'none').lower()
+OTEL_SERVICE_NAME = os.environ.get('OTEL_SERVICE_NAME', 'fuel-portal-backend')
+TRACING_ENABLED = OTEL_TRACES_EXPORTER in ("console", "otlp")
+
+if TRACING_ENABLED:
+    tracer_provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    tracer_provider.add_span_processor(BatchSpanProcessor(
+        ConsoleSpanExporter() if OTEL_TRACES_EXPORTER == "console" else OTLPSpanExporter()
+    ))
+    trace.set_tracer_provider(tracer_provider)
+    PymongoInstrumentor().instrument()
+    HTTPXClientInstrumentor().instrument()
+
+tracer = trace.get_tracer("portal")
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_command_metrics, mongo_pool_metrics])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app
 app = FastAPI(title="Fuel Station Client Portal", version="1.0.0")
+if TRACING_ENABLED:
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="/metrics")
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -45,12 +427,68 @@ SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
 EMAIL_ADDRESS = os.environ.get('EMAIL_ADDRESS', '')
 EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD', '')
+SMTP_START_TLS = os.environ.get('SMTP_START_TLS', 'true').lower() == 'true'
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 4))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get('SMTP_MAX_MESSAGES_PER_CONNECTION', 100))
+SMTP_IDLE_CHECK_SECONDS = float(os.environ.get('SMTP_IDLE_CHECK_SECONDS', 30))
 
 # Z-API WhatsApp configuration
 ZAPI_TOKEN = os.environ.get('ZAPI_TOKEN', '')
 ZAPI_INSTANCE_ID = os.environ.get('ZAPI_INSTANCE_ID', '')
 ZAPI_BASE_URL = os.environ.get('ZAPI_BASE_URL', 'https://api.z-api.io')
 ZAPI_SECURITY_TOKEN = os.environ.get('ZAPI_SECURITY_TOKEN', '')
+ZAPI_TIMEOUT = float(os.environ.get('ZAPI_TIMEOUT', 5))
+ZAPI_MAX_RETRIES = int(os.environ.get('ZAPI_MAX_RETRIES', 2))
+ZAPI_RETRY_BACKOFF = float(os.environ.get('ZAPI_RETRY_BACKOFF', 0.5))
+ZAPI_MAX_CONNECTIONS = int(os.environ.get('ZAPI_MAX_CONNECTIONS', 20))
+
+# Credit usage reconciliation interval in seconds (0 disables the background job)
+CREDIT_RECONCILE_INTERVAL = float(os.environ.get('CREDIT_RECONCILE_INTERVAL', 3600))
+# Credit alert sweep interval in seconds (0 disables the background sweep)
+CREDIT_ALERT_SWEEP_INTERVAL = float(os.environ.get('CREDIT_ALERT_SWEEP_INTERVAL', 900))
+# Overdue transition / due-date reminder job interval in seconds (0 disables it)
+INVOICE_STATUS_INTERVAL = float(os.environ.get('INVOICE_STATUS_INTERVAL', 3600))
+# Days before the due date on which open invoices get a reminder
+INVOICE_REMINDER_DAYS = [int(days) for days in os.environ.get('INVOICE_REMINDER_DAYS', '3,1').split(',') if days.strip()]
+
+# Fuel limit windows roll over at local midnight in the stations' timezone
+LIMITS_TIMEZONE = ZoneInfo(os.environ.get('LIMITS_TIMEZONE', 'America/Sao_Paulo'))
+# Limit reset job interval in seconds (0 disables the background job)
+LIMIT_RESET_INTERVAL = float(os.environ.get('LIMIT_RESET_INTERVAL', 60))
+# Seconds an authorization may stay unclaimed before its reservations are released (0 keeps them)
+AUTHORIZATION_RESERVATION_TTL = float(os.environ.get('AUTHORIZATION_RESERVATION_TTL', 4 * 3600))
+
+# Bulk transaction ingestion (stations authenticate with X-Ingest-Key)
+INGEST_API_KEY = os.environ.get('INGEST_API_KEY', '')
+INGEST_MAX_BATCH_SIZE = int(os.environ.get('INGEST_MAX_BATCH_SIZE', 5000))
+
+# Payment status updates from the billing back office (authenticate with X-Billing-Key)
+BILLING_API_KEY = os.environ.get('BILLING_API_KEY', '')
+
+# Billing run: days from the end of the cycle until an invoice is due, and
+# how long a run may go without renewing its lock before another can take over
+INVOICE_DUE_DAYS = int(os.environ.get('INVOICE_DUE_DAYS', 15))
+BILLING_RUN_LEASE_SECONDS = int(os.environ.get('BILLING_RUN_LEASE_SECONDS', 600))
+
+# Password hashing pool configuration
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_MAX_IN_FLIGHT = int(os.environ.get('PASSWORD_HASH_MAX_IN_FLIGHT', 32))
+
+# Notification outbox configuration
+NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 4))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+NOTIFICATION_RETRY_BACKOFF = float(os.environ.get('NOTIFICATION_RETRY_BACKOFF', 2))
+NOTIFICATION_POLL_INTERVAL = float(os.environ.get('NOTIFICATION_POLL_INTERVAL', 5))
+NOTIFICATION_LEASE_SECONDS = int(os.environ.get('NOTIFICATION_LEASE_SECONDS', 60))
+
+# Authenticated client cache configuration
+CLIENT_CACHE_SIZE = int(os.environ.get('CLIENT_CACHE_SIZE', 1024))
+CLIENT_CACHE_TTL = float(os.environ.get('CLIENT_CACHE_TTL', 30))
+
+# Per-client response cache for dashboard and credit endpoints
+RESPONSE_CACHE_MAX_CLIENTS = int(os.environ.get('RESPONSE_CACHE_MAX_CLIENTS', 2048))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 15))
 
 # Utility functions
 def verify_password(plain_password, hashed_password):
@@ -59,6 +497,80 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHashPool:
+    """Runs bcrypt in a bounded thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    At most max_in_flight operations are queued or running; further callers
+    wait on the semaphore without holding up other requests.
+    """
+
+    def __init__(self, workers: int, max_in_flight: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.workers = workers
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_in_flight = max_in_flight
+        self.completed = 0
+        self.in_flight = 0
+        self._queue_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+
+    async def run(self, func, *args):
+        with tracer.start_as_current_span(f"bcrypt.{func.__name__}") as span:
+            return await self._run(span, func, *args)
+
+    async def _run(self, span, func, *args):
+        submitted = time.perf_counter()
+        async with self._semaphore:
+            self.in_flight += 1
+            started = None
+
+            def timed():
+                nonlocal started
+                started = time.perf_counter()
+                return func(*args)
+
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, timed)
+            finally:
+                finished = time.perf_counter()
+                self.in_flight -= 1
+                self.completed += 1
+                if started is not None:
+                    self._queue_times.append(started - submitted)
+                    self._run_times.append(finished - started)
+                    span.set_attribute("bcrypt.queue_seconds", started - submitted)
+
+    def stats(self) -> Dict[str, Any]:
+        def percentile(samples, fraction):
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+        return {
+            "workers": self.workers,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "queue_seconds": {
+                "p50": percentile(self._queue_times, 0.5),
+                "p99": percentile(self._queue_times, 0.99)
+            },
+            "run_seconds": {
+                "p50": percentile(self._run_times, 0.5),
+                "p99": percentile(self._run_times, 0.99)
+            }
+        }
+
+password_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_IN_FLIGHT)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await password_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -69,15 +581,144 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class ClientCache:
+    """In-process TTL + LRU cache of client documents keyed by CNPJ"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, cnpj: str) -> Optional[dict]:
+        entry = self._entries.get(cnpj)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[cnpj]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(cnpj)
+        self.hits += 1
+        # Handlers mutate the client document they receive, so hand out copies
+        return copy.deepcopy(entry[1])
+
+    def set(self, cnpj: str, client_doc: dict):
+        if self.max_size <= 0:
+            return
+        self._entries[cnpj] = (time.monotonic() + self.ttl, copy.deepcopy(client_doc))
+        self._entries.move_to_end(cnpj)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, cnpj: str):
+        self._entries.pop(cnpj, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+client_cache = ClientCache(CLIENT_CACHE_SIZE, CLIENT_CACHE_TTL)
+
+class ResponseCache:
+    """Short-lived cache of serialized responses, grouped per client.
+
+    Entries are keyed by endpoint + filter inside each client's bucket, so a
+    write for one client drops only that client's responses. The TTL bounds
+    staleness across processes, which never see each other's invalidations.
+    """
+
+    def __init__(self, max_clients: int, ttl: float):
+        self.max_clients = max_clients
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self._clients: "OrderedDict[str, Dict[str, tuple]]" = OrderedDict()
+
+    def get(self, client_id: str, key: str) -> Optional[tuple]:
+        entries = self._clients.get(client_id)
+        entry = entries.get(key) if entries else None
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del entries[key]
+            self.misses += 1
+            return None
+        self._clients.move_to_end(client_id)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def set(self, client_id: str, key: str, etag: str, body: bytes):
+        if self.max_clients <= 0:
+            return
+        self._clients.setdefault(client_id, {})[key] = (time.monotonic() + self.ttl, etag, body)
+        self._clients.move_to_end(client_id)
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last=False)
+
+    def invalidate(self, client_id: str):
+        if self._clients.pop(client_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._clients.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "clients": len(self._clients),
+            "entries": sum(len(entries) for entries in self._clients.values()),
+            "max_clients": self.max_clients,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_CLIENTS, RESPONSE_CACHE_TTL)
+
+async def cached_response(request: Request, client_id: str, key: str, compute) -> Response:
+    """Serve a per-client cached JSON response with an ETag, or 304 if unchanged"""
+    entry = response_cache.get(client_id, key)
+    if entry is None:
+        body = orjson.dumps(await compute(), default=jsonable_encoder)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        response_cache.set(client_id, key, etag, body)
+    else:
+        etag, body = entry
+    
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         cnpj: str = payload.get("sub")
         if cnpj is None:
             raise HTTPException(status_code=401, detail="Invalid authentication")
-        user = await db.clients.find_one({"cnpj": cnpj})
+        user = client_cache.get(cnpj)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            user = await db.clients.find_one({"cnpj": cnpj})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            client_cache.set(cnpj, user)
+        trace.get_current_span().set_attribute("portal.client_id", user["id"])
         return user
     except jwt.JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication")
@@ -87,52 +728,224 @@ def generate_verification_code() -> str:
     """Generate a 6-digit verification code"""
     return str(random.randint(100000, 999999))
 
-async def send_email_code(email: str, code: str) -> bool:
-    """Send verification code via email"""
-    try:
-        if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
-            logger.warning("Email credentials not configured")
+# Pooled SMTP connections: connect, STARTTLS and AUTH once per connection
+# instead of once per message.
+class PooledSMTPConnection:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+class SMTPConnectionPool:
+    """Bounded pool of authenticated SMTP connections with health checks"""
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str,
+        password: str,
+        start_tls: bool,
+        size: int,
+        max_messages_per_connection: int,
+        idle_check_seconds: float,
+        timeout: float
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.size = size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_check_seconds = idle_check_seconds
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(size)
+        self._idle: List[PooledSMTPConnection] = []
+        self.connections_opened = 0
+
+    async def _connect(self) -> PooledSMTPConnection:
+        with tracer.start_as_current_span("smtp.connect", kind=trace.SpanKind.CLIENT, attributes={
+            "server.address": self.hostname, "server.port": self.port
+        }):
+            smtp = aiosmtplib.SMTP(
+                hostname=self.hostname,
+                port=self.port,
+                start_tls=self.start_tls,
+                timeout=self.timeout
+            )
+            await smtp.connect()
+            if self.username and self.password:
+                await smtp.login(self.username, self.password)
+        self.connections_opened += 1
+        return PooledSMTPConnection(smtp)
+
+    async def _discard(self, connection: PooledSMTPConnection):
+        try:
+            if connection.smtp.is_connected:
+                await connection.smtp.quit()
+        except Exception:
+            connection.smtp.close()
+
+    async def _is_healthy(self, connection: PooledSMTPConnection) -> bool:
+        if not connection.smtp.is_connected:
             return False
-            
-        message = MIMEMultipart("alternative")
-        message["Subject"] = "Código de Verificação - Portal do Cliente"
-        message["From"] = EMAIL_ADDRESS
-        message["To"] = email
-
-        html_content = f"""
-        <html>
-          <body>
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-              <h2 style="color: #2563eb;">Portal do Cliente - Código de Verificação</h2>
-              <p>Seu código de verificação é:</p>
-              <div style="background-color: #f3f4f6; padding: 20px; text-align: center; margin: 20px 0;">
-                <h1 style="color: #1f2937; font-size: 32px; margin: 0;">{code}</h1>
-              </div>
-              <p>Este código expira em 5 minutos.</p>
-              <p style="color: #6b7280; font-size: 12px;">Se você não solicitou este código, ignore este email.</p>
-            </div>
-          </body>
-        </html>
-        """
-        
-        part = MIMEText(html_content, "html")
-        message.attach(part)
-
-        await aiosmtplib.send(
-            message,
-            hostname=SMTP_SERVER,
-            port=SMTP_PORT,
-            start_tls=True,
-            username=EMAIL_ADDRESS,
-            password=EMAIL_PASSWORD,
+        if time.monotonic() - connection.last_used < self.idle_check_seconds:
+            return True
+        try:
+            await connection.smtp.noop()
+            return True
+        except Exception:
+            return False
+
+    async def acquire(self) -> PooledSMTPConnection:
+        await self._semaphore.acquire()
+        try:
+            while self._idle:
+                connection = self._idle.pop()
+                if await self._is_healthy(connection):
+                    return connection
+                await self._discard(connection)
+            return await self._connect()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def release(self, connection: PooledSMTPConnection, broken: bool = False):
+        try:
+            if broken or connection.messages_sent >= self.max_messages_per_connection:
+                await self._discard(connection)
+            else:
+                connection.last_used = time.monotonic()
+                self._idle.append(connection)
+        finally:
+            self._semaphore.release()
+
+    async def send(self, message: MIMEMultipart):
+        """Send one message, reconnecting once if the pooled connection was dropped"""
+        with tracer.start_as_current_span("smtp.send", kind=trace.SpanKind.CLIENT, attributes={
+            "server.address": self.hostname, "server.port": self.port
+        }) as span:
+            await self._send(span, message)
+
+    async def _send(self, span, message: MIMEMultipart):
+        for attempt in range(2):
+            span.set_attribute("smtp.attempts", attempt + 1)
+            connection = await self.acquire()
+            try:
+                await connection.smtp.send_message(message)
+            except (aiosmtplib.SMTPServerDisconnected, ConnectionError) as e:
+                await self.release(connection, broken=True)
+                if attempt:
+                    raise
+                logger.warning(f"SMTP connection dropped, reconnecting: {e}")
+                continue
+            except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPNotSupported):
+                # The server answered and aiosmtplib has already sent RSET, so the
+                # session is still usable; only this message failed
+                await self.release(connection)
+                raise
+            except BaseException:
+                await self.release(connection, broken=True)
+                raise
+            connection.messages_sent += 1
+            await self.release(connection)
+            return
+
+    async def send_batch(self, messages: List[MIMEMultipart]) -> List[bool]:
+        """Send many messages over the pool's connections; returns per-message success"""
+        async def send_one(message):
+            try:
+                await self.send(message)
+                return True
+            except Exception as e:
+                logger.error(f"Error sending email to {message['To']}: {e}")
+                return False
+
+        return await asyncio.gather(*(send_one(message) for message in messages))
+
+    async def close(self):
+        while self._idle:
+            await self._discard(self._idle.pop())
+
+smtp_pool = SMTPConnectionPool(
+    hostname=SMTP_SERVER,
+    port=SMTP_PORT,
+    username=EMAIL_ADDRESS,
+    password=EMAIL_PASSWORD,
+    start_tls=SMTP_START_TLS,
+    size=SMTP_POOL_SIZE,
+    max_messages_per_connection=SMTP_MAX_MESSAGES_PER_CONNECTION,
+    idle_check_seconds=SMTP_IDLE_CHECK_SECONDS,
+    timeout=SMTP_TIMEOUT
+)
+
+# Shared HTTP client for Z-API, created lazily so it binds to the running event loop
+zapi_http_client: Optional[httpx.AsyncClient] = None
+
+def get_zapi_http_client() -> httpx.AsyncClient:
+    global zapi_http_client
+    if zapi_http_client is None or zapi_http_client.is_closed:
+        zapi_http_client = httpx.AsyncClient(
+            base_url=ZAPI_BASE_URL,
+            timeout=httpx.Timeout(ZAPI_TIMEOUT, connect=min(ZAPI_TIMEOUT, 3.0)),
+            limits=httpx.Limits(
+                max_connections=ZAPI_MAX_CONNECTIONS,
+                max_keepalive_connections=ZAPI_MAX_CONNECTIONS,
+                keepalive_expiry=30
+            ),
+            headers={'Content-Type': 'application/json'}
         )
-        return True
-    except Exception as e:
-        logger.error(f"Error sending email: {e}")
-        return False
+    return zapi_http_client
+
+# Only failures where Z-API cannot have accepted the message are retried: the
+# request never left the pool or the connection was never established, or the
+# server explicitly asked us to come back later. A read timeout after the POST
+# went out may still have delivered the message, so it is not retried.
+ZAPI_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+ZAPI_RETRYABLE_STATUSES = {429, 503}
+
+async def zapi_post(path: str, payload: dict) -> Optional[httpx.Response]:
+    """POST to Z-API, retrying connection failures, 429 and 503 with backoff"""
+    # Each HTTP attempt gets its own httpx span under this one
+    with tracer.start_as_current_span("zapi.post", attributes={"zapi.path": path}) as span:
+        response = await zapi_post_with_retries(span, path, payload)
+        if response is not None:
+            span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+async def zapi_post_with_retries(span, path: str, payload: dict) -> Optional[httpx.Response]:
+    http_client = get_zapi_http_client()
+    headers = {'Client-Token': ZAPI_SECURITY_TOKEN}
+    
+    for attempt in range(ZAPI_MAX_RETRIES + 1):
+        span.set_attribute("zapi.attempts", attempt + 1)
+        try:
+            response = await http_client.post(path, json=payload, headers=headers)
+            if response.status_code not in ZAPI_RETRYABLE_STATUSES:
+                return response
+            logger.warning(f"Z-API returned {response.status_code} (attempt {attempt + 1})")
+        except ZAPI_RETRYABLE_ERRORS as e:
+            response = None
+            logger.warning(f"Z-API connection failed (attempt {attempt + 1}): {e!r}")
+        except httpx.TransportError as e:
+            logger.error(f"Z-API request failed after it was sent, not retrying: {e!r}")
+            return None
+        
+        if attempt < ZAPI_MAX_RETRIES:
+            await asyncio.sleep(ZAPI_RETRY_BACKOFF * (2 ** attempt))
+    
+    return response
+
+def whatsapp_code_message(code: str) -> str:
+    return f"🔐 *Portal do Cliente*\n\nSeu código de verificação é: *{code}*\n\n⏰ Este código expira em 5 minutos.\n\nSe você não solicitou este código, ignore esta mensagem."
 
 async def send_whatsapp_code(phone: str, code: str) -> bool:
     """Send verification code via WhatsApp using Z-API"""
+    return await send_whatsapp_message(phone, whatsapp_code_message(code))
+
+async def send_whatsapp_message(phone: str, message: str) -> bool:
+    """Send a text message via WhatsApp using Z-API"""
     try:
         if not ZAPI_TOKEN or not ZAPI_INSTANCE_ID:
             logger.warning("Z-API credentials not configured")
@@ -141,19 +954,18 @@ async def send_whatsapp_code(phone: str, code: str) -> bool:
         # Use fixed phone number for now
         clean_phone = "5534999402367"  # Fixed number: +5534999402367
             
-        url = f"{ZAPI_BASE_URL}/instances/{ZAPI_INSTANCE_ID}/token/{ZAPI_TOKEN}/send-text"
+        path = f"/instances/{ZAPI_INSTANCE_ID}/token/{ZAPI_TOKEN}/send-text"
         
         payload = {
             "phone": clean_phone,
-            "message": f"🔐 *Portal do Cliente*\n\nSeu código de verificação é: *{code}*\n\n⏰ Este código expira em 5 minutos.\n\nSe você não solicitou este código, ignore esta mensagem."
+            "message": message
         }
 
-        headers = {
-            'Content-Type': 'application/json',
-            'Client-Token': ZAPI_SECURITY_TOKEN
-        }
-
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = await zapi_post(path, payload)
+        
+        if response is None:
+            logger.error("WhatsApp API unreachable")
+            return False
         
         logger.info(f"WhatsApp API Response: {response.status_code} - {response.text}")
         
@@ -219,79 +1031,311 @@ async def verify_code(cnpj: str, code: str) -> bool:
     return False
 
 # Credit and notification functions
+# Invoice statuses that count against the client's credit limit. The running
+# total is kept in clients.current_credit_usage and adjusted with $inc on every
+# invoice change; reconcile_credit_usage repairs any drift from raw invoices.
+CREDIT_USAGE_STATUSES = ["open", "overdue"]
+
 async def calculate_client_credit_usage(client_id: str) -> float:
-    """Calculate current credit usage from open invoices"""
-    open_invoices = await db.invoices.find({
-        "client_id": client_id,
-        "status": {"$in": ["open", "overdue"]}
-    }).to_list(None)
+    """Current credit usage from the client's maintained balance"""
+    client_doc = await db.clients.find_one({"id": client_id}, {"_id": 0, "current_credit_usage": 1})
+    return client_doc.get("current_credit_usage", 0.0) if client_doc else 0.0
+
+async def record_invoice_created(invoice: dict):
+    """Add a newly inserted invoice to the client's credit usage"""
+    if invoice["status"] in CREDIT_USAGE_STATUSES:
+        await db.clients.update_one(
+            {"id": invoice["client_id"]},
+            {"$inc": {"current_credit_usage": invoice["total_amount"]}}
+        )
+        request_credit_evaluation(invoice["client_id"])
+    response_cache.invalidate(invoice["client_id"])
+
+async def set_invoice_status(invoice_id: str, new_status: str) -> Optional[dict]:
+    """Change an invoice's status and move its amount in or out of credit usage.
+
+    The status flip is a single find_one_and_update guarded on the old status,
+    so concurrent callers can only apply a given transition once.
+    """
+    previous = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "status": {"$ne": new_status}},
+        {"$set": {"status": new_status}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        return None
+    response_cache.invalidate(previous["client_id"])
+    
+    was_counted = previous["status"] in CREDIT_USAGE_STATUSES
+    is_counted = new_status in CREDIT_USAGE_STATUSES
+    if was_counted != is_counted:
+        delta = previous["total_amount"] if is_counted else -previous["total_amount"]
+        await db.clients.update_one(
+            {"id": previous["client_id"]},
+            {"$inc": {"current_credit_usage": delta}}
+        )
+        request_credit_evaluation(previous["client_id"])
     
-    return sum(invoice["total_amount"] for invoice in open_invoices)
+    previous["status"] = new_status
+    return previous
 
-async def check_credit_alerts(client_id: str, client_data: dict):
-    """Check if client has reached credit limit thresholds and send alerts"""
-    credit_limit = client_data.get("credit_limit", 10000.0)
-    current_usage = await calculate_client_credit_usage(client_id)
+async def reconcile_credit_usage(batch_size: int = 500, tolerance: float = 0.01) -> Dict[str, int]:
+    """Recompute credit usage from invoices and repair clients whose balance drifted.
+
+    Each batch of balances is read before the invoices behind them are summed,
+    and corrections are compare-and-set on the balance that was read. An
+    invoice created mid-run is then either in neither value or its $inc makes
+    the compare-and-set miss, and that client is retried next run. The one
+    remaining gap is an invoice inserted but not yet $inc'ed when its balance
+    is read, which can be counted twice until the next run.
+    """
+    checked, repaired = 0, 0
+    batch = []
+    cursor = db.clients.find({}, {"_id": 0, "id": 1, "current_credit_usage": 1}).batch_size(batch_size)
+    async for client_doc in cursor:
+        batch.append(client_doc)
+        if len(batch) >= batch_size:
+            checked += len(batch)
+            repaired += await reconcile_credit_batch(batch, tolerance)
+            batch = []
+    
+    if batch:
+        checked += len(batch)
+        repaired += await reconcile_credit_batch(batch, tolerance)
+    
+    if repaired:
+        logger.warning(f"Credit usage reconciliation repaired {repaired} of {checked} clients")
+    return {"checked": checked, "repaired": repaired}
+
+async def reconcile_credit_batch(clients: List[dict], tolerance: float) -> int:
+    """Compare already-read balances against their invoices and fix the ones that drifted"""
+    expected = {
+        row["_id"]: row["usage"]
+        for row in await db.invoices.aggregate([
+            {"$match": {
+                "client_id": {"$in": [client_doc["id"] for client_doc in clients]},
+                "status": {"$in": CREDIT_USAGE_STATUSES}
+            }},
+            {"$group": {"_id": "$client_id", "usage": {"$sum": "$total_amount"}}}
+        ]).to_list(None)
+    }
+    
+    operations = []
+    for client_doc in clients:
+        recorded = client_doc.get("current_credit_usage", 0.0)
+        usage = expected.get(client_doc["id"], 0.0)
+        if abs(recorded - usage) > tolerance:
+            response_cache.invalidate(client_doc["id"])
+            operations.append(UpdateOne(
+                {"id": client_doc["id"], "current_credit_usage": client_doc.get("current_credit_usage")},
+                {"$set": {"current_credit_usage": usage}}
+            ))
     
+    if not operations:
+        return 0
+    return (await db.clients.bulk_write(operations, ordered=False)).modified_count
+
+# Alert thresholds (percent of credit limit) and how long before the same
+# threshold may alert again
+CREDIT_ALERT_COOLDOWNS = {
+    "70": timedelta(days=1),
+    "80": timedelta(days=1),
+    "90": timedelta(days=1),
+    "100": timedelta(hours=6),  # More frequent for 100%
+}
+
+# Fields the evaluator needs from a client document
+CREDIT_ALERT_PROJECTION = {
+    "_id": 0, "id": 1, "cnpj": 1, "company_name": 1, "email": 1, "phone": 1, "whatsapp": 1,
+    "credit_limit": 1, "current_credit_usage": 1, "email_notifications": 1, "whatsapp_notifications": 1,
+    "notification_email": 1, "notification_whatsapp": 1
+}
+
+def credit_alert_threshold(percentage: float) -> Optional[str]:
+    """The highest threshold reached, or None below 70%"""
+    for threshold in ("100", "90", "80", "70"):
+        if percentage >= int(threshold):
+            return threshold
+    return None
+
+async def claim_credit_alert(client_id: str, alert_type: str, now: datetime) -> bool:
+    """Atomically stamp last_<type>_alert if the cooldown has passed.
+
+    Only one evaluator can win the update, so concurrent workers never send
+    the same threshold alert twice.
+    """
+    field = f"last_{alert_type}_alert"
+    result = await db.clients.update_one(
+        {
+            "id": client_id,
+            "$or": [
+                {field: None},
+                {field: {"$lte": now - CREDIT_ALERT_COOLDOWNS[alert_type]}}
+            ]
+        },
+        {"$set": {field: now}}
+    )
+    return result.modified_count == 1
+
+async def evaluate_client_credit(client_data: dict):
+    """Alert a client whose maintained credit usage has crossed a threshold"""
+    credit_limit = client_data.get("credit_limit", 10000.0)
     if credit_limit <= 0:
         return
     
+    current_usage = client_data.get("current_credit_usage", 0.0)
     percentage = (current_usage / credit_limit) * 100
+    alert_type = credit_alert_threshold(percentage)
+    if alert_type is None:
+        return
     
-    # Update client's current usage
-    await db.clients.update_one(
-        {"id": client_id},
-        {"$set": {"current_credit_usage": current_usage}}
+    if not await claim_credit_alert(client_data["id"], alert_type, datetime.now(timezone.utc)):
+        return
+    client_cache.invalidate(client_data["cnpj"])
+    
+    # Store alert in database
+    alert = CreditAlert(
+        client_id=client_data["id"],
+        alert_type=alert_type,
+        current_usage=current_usage,
+        credit_limit=credit_limit,
+        percentage=percentage
     )
+    await db.credit_alerts.insert_one(alert.dict())
+    response_cache.invalidate(client_data["id"])
+    
+    await send_credit_alert(client_data, alert.id, alert_type, percentage, current_usage, credit_limit)
+
+async def check_credit_alerts(client_id: str):
+    """Check if client has reached credit limit thresholds and send alerts"""
+    client_data = await db.clients.find_one({"id": client_id, "is_active": True}, CREDIT_ALERT_PROJECTION)
+    if client_data:
+        await evaluate_client_credit(client_data)
+
+# Event-driven credit alert evaluation: invoice and transaction writes call
+# request_credit_evaluation, and a background evaluator drains the queue.
+# Pending clients map to the trace context of the first write that asked.
+credit_evaluation_queue: "asyncio.Queue[str]" = asyncio.Queue()
+credit_evaluation_pending: Dict[str, Any] = {}
+
+def request_credit_evaluation(client_id: str):
+    if client_id not in credit_evaluation_pending:
+        credit_evaluation_pending[client_id] = otel_context.get_current()
+        credit_evaluation_queue.put_nowait(client_id)
+
+async def credit_evaluator():
+    while True:
+        client_id = await credit_evaluation_queue.get()
+        parent = credit_evaluation_pending.pop(client_id, None)
+        try:
+            with tracer.start_as_current_span(
+                "credit.evaluate", context=parent, attributes={"portal.client_id": client_id}
+            ):
+                await check_credit_alerts(client_id)
+        except Exception as e:
+            logger.error(f"Error evaluating credit alerts for {client_id}: {e}")
+
+async def drain_credit_evaluations(concurrency: int = 8) -> int:
+    """Evaluate every client still queued, for processes that run no credit_evaluator (the CLI)"""
+    client_ids = []
+    while not credit_evaluation_queue.empty():
+        client_id = credit_evaluation_queue.get_nowait()
+        credit_evaluation_pending.pop(client_id, None)
+        client_ids.append(client_id)
+    
+    slots = asyncio.Semaphore(concurrency)
     
-    # Check alert thresholds
+    async def evaluate(client_id: str):
+        async with slots:
+            try:
+                await check_credit_alerts(client_id)
+            except Exception as e:
+                logger.error(f"Error evaluating credit alerts for {client_id}: {e}")
+    
+    await asyncio.gather(*(evaluate(client_id) for client_id in client_ids))
+    return len(client_ids)
+
+def credit_alert_on_cooldown(client_data: dict, alert_type: str, now: datetime) -> bool:
+    """Cheap pre-check against the last_<type>_alert already read with the client"""
+    last_alert = client_data.get(f"last_{alert_type}_alert")
+    if last_alert is None:
+        return False
+    if last_alert.tzinfo is None:
+        last_alert = last_alert.replace(tzinfo=timezone.utc)
+    return now - last_alert < CREDIT_ALERT_COOLDOWNS[alert_type]
+
+async def sweep_credit_alerts(concurrency: int = 32, batch_size: int = 1000) -> Dict[str, Any]:
+    """Evaluate alert thresholds for the whole fleet.
+
+    One aggregation over clients returns only active clients at or above the
+    lowest threshold, and the evaluations (claim, alert insert, outbox
+    enqueue) run through a fixed number of workers fed by a bounded queue.
+    """
+    started = time.perf_counter()
     now = datetime.now(timezone.utc)
-    alerts_to_send = []
-    
-    # Check 70% threshold
-    if percentage >= 70 and percentage < 80:
-        last_alert = client_data.get("last_70_alert")
-        if not last_alert or (now - last_alert).days >= 1:
-            alerts_to_send.append("70")
-            await db.clients.update_one({"id": client_id}, {"$set": {"last_70_alert": now}})
-    
-    # Check 80% threshold
-    elif percentage >= 80 and percentage < 90:
-        last_alert = client_data.get("last_80_alert")
-        if not last_alert or (now - last_alert).days >= 1:
-            alerts_to_send.append("80")
-            await db.clients.update_one({"id": client_id}, {"$set": {"last_80_alert": now}})
-    
-    # Check 90% threshold
-    elif percentage >= 90 and percentage < 100:
-        last_alert = client_data.get("last_90_alert")
-        if not last_alert or (now - last_alert).days >= 1:
-            alerts_to_send.append("90")
-            await db.clients.update_one({"id": client_id}, {"$set": {"last_90_alert": now}})
-    
-    # Check 100% threshold
-    elif percentage >= 100:
-        last_alert = client_data.get("last_100_alert")
-        if not last_alert or (now - last_alert).hours >= 6:  # More frequent for 100%
-            alerts_to_send.append("100")
-            await db.clients.update_one({"id": client_id}, {"$set": {"last_100_alert": now}})
-    
-    # Send alerts
-    for alert_type in alerts_to_send:
-        await send_credit_alert(client_data, alert_type, percentage, current_usage, credit_limit)
-        
-        # Store alert in database
-        alert = CreditAlert(
-            client_id=client_id,
-            alert_type=alert_type,
-            current_usage=current_usage,
-            credit_limit=credit_limit,
-            percentage=percentage
-        )
-        await db.credit_alerts.insert_one(alert.dict())
+    lowest_threshold = min(int(threshold) for threshold in CREDIT_ALERT_COOLDOWNS)
+    
+    cursor = db.clients.aggregate([
+        {"$match": {"is_active": True, "credit_limit": {"$gt": 0}}},
+        {"$match": {"$expr": {"$gte": [
+            {"$multiply": [{"$divide": [{"$ifNull": ["$current_credit_usage", 0]}, "$credit_limit"]}, 100]},
+            lowest_threshold
+        ]}}},
+        {"$project": {
+            **CREDIT_ALERT_PROJECTION,
+            **{f"last_{threshold}_alert": 1 for threshold in CREDIT_ALERT_COOLDOWNS}
+        }}
+    ], batchSize=batch_size)
+    
+    stats = {"at_risk": 0, "skipped_cooldown": 0, "evaluated": 0, "errors": 0}
+    queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(maxsize=concurrency * 2)
+    
+    async def worker():
+        while True:
+            client_data = await queue.get()
+            if client_data is None:
+                return
+            try:
+                await evaluate_client_credit(client_data)
+                stats["evaluated"] += 1
+            except Exception as e:
+                stats["errors"] += 1
+                logger.error(f"Error evaluating credit alerts for {client_data['id']}: {e}")
+    
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for client_data in cursor:
+            stats["at_risk"] += 1
+            percentage = client_data.get("current_credit_usage", 0.0) / client_data["credit_limit"] * 100
+            if credit_alert_on_cooldown(client_data, credit_alert_threshold(percentage), now):
+                stats["skipped_cooldown"] += 1
+                continue
+            await queue.put(client_data)
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    
+    elapsed = time.perf_counter() - started
+    stats["elapsed_seconds"] = elapsed
+    stats["clients_per_second"] = stats["at_risk"] / elapsed if elapsed > 0 else 0.0
+    return stats
 
-async def send_credit_alert(client_data: dict, alert_type: str, percentage: float, usage: float, limit: float):
-    """Send credit limit alert via email and/or WhatsApp"""
+async def run_periodically(name: str, interval: float, job, run_at_start: bool = False):
+    """Run job every interval seconds until cancelled, logging failures"""
+    delay = 0 if run_at_start else interval
+    while True:
+        await asyncio.sleep(delay)
+        delay = interval
+        try:
+            # Each run is its own trace; work it enqueues carries this context
+            with tracer.start_as_current_span(f"job.{name}", context=otel_context.Context()):
+                await job()
+        except Exception as e:
+            logger.error(f"Error in periodic job {name}: {e}")
+
+async def send_credit_alert(client_data: dict, alert_id: str, alert_type: str, percentage: float, usage: float, limit: float):
+    """Queue credit limit alert via email and/or WhatsApp"""
     try:
         message = f"""🔴 *ALERTA DE LIMITE DE CRÉDITO*
 
@@ -312,13 +1356,19 @@ Portal do Cliente - Rede de Postos"""
         if client_data.get("email_notifications", True):
             email = client_data.get("notification_email") or client_data.get("email")
             if email:
-                await send_email_code(email, f"ALERTA: {alert_type}% do limite de crédito atingido", message)
+                await enqueue_notification(
+                    "email",
+                    email,
+                    f"credit-alert:{alert_id}:email",
+                    message=message,
+                    subject=f"ALERTA: {alert_type}% do limite de crédito atingido"
+                )
         
         # Send WhatsApp if configured  
         if client_data.get("whatsapp_notifications", True):
             phone = client_data.get("notification_whatsapp") or client_data.get("whatsapp") or client_data.get("phone")
             if phone:
-                await send_whatsapp_code(phone, message)
+                await enqueue_notification("whatsapp", phone, f"credit-alert:{alert_id}:whatsapp", message=message)
                 
     except Exception as e:
         logger.error(f"Error sending credit alert: {e}")
@@ -370,19 +1420,552 @@ async def send_email_code(email: str, subject: str, message: str = None, code: s
         part = MIMEText(html_content, "html")
         email_message.attach(part)
 
-        await aiosmtplib.send(
-            email_message,
-            hostname=SMTP_SERVER,
-            port=SMTP_PORT,
-            start_tls=True,
-            username=EMAIL_ADDRESS,
-            password=EMAIL_PASSWORD,
-        )
+        await smtp_pool.send(email_message)
         return True
     except Exception as e:
         logger.error(f"Error sending email: {e}")
         return False
 
+# Notification outbox
+# Outbound emails and WhatsApp messages are written to notification_outbox and
+# delivered by background workers, so request latency no longer depends on
+# the providers and failed deliveries are retried instead of lost.
+notification_wakeup = asyncio.Event()
+notification_workers: List[asyncio.Task] = []
+
+async def enqueue_notification(
+    channel: str,
+    recipient: str,
+    idempotency_key: str,
+    message: Optional[str] = None,
+    subject: Optional[str] = None,
+    code: Optional[str] = None,
+    expires_at: Optional[datetime] = None
+) -> bool:
+    """Queue an email or WhatsApp message; returns False if the key was already queued"""
+    try:
+        await db.notification_outbox.insert_one(notification_document(
+            channel, recipient, idempotency_key, message, subject, code, expires_at
+        ))
+    except DuplicateKeyError:
+        return False
+    
+    notification_wakeup.set()
+    return True
+
+def notification_document(
+    channel: str,
+    recipient: str,
+    idempotency_key: str,
+    message: Optional[str] = None,
+    subject: Optional[str] = None,
+    code: Optional[str] = None,
+    expires_at: Optional[datetime] = None
+) -> dict:
+    now = datetime.now(timezone.utc)
+    # Carries the enqueuing request's trace into the delivery worker
+    trace_context = {}
+    propagate.inject(trace_context)
+    return {
+        "id": str(uuid.uuid4()),
+        "idempotency_key": idempotency_key,
+        "channel": channel,
+        "recipient": recipient,
+        "subject": subject,
+        "message": message,
+        "code": code,
+        "status": "pending",
+        "attempts": 0,
+        "last_error": None,
+        "created_at": now,
+        "next_attempt_at": now,
+        "expires_at": expires_at,
+        "sent_at": None,
+        "trace_context": trace_context
+    }
+
+async def enqueue_notifications(documents: List[dict]) -> int:
+    """Queue many notification_document()s with one insert; returns how many were new"""
+    if not documents:
+        return 0
+    try:
+        inserted = len((await db.notification_outbox.insert_many(documents, ordered=False)).inserted_ids)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        inserted = e.details["nInserted"]
+    
+    if inserted:
+        notification_wakeup.set()
+    return inserted
+
+async def deliver_notification(notification: dict) -> bool:
+    if notification["channel"] == "email":
+        return await send_email_code(
+            notification["recipient"],
+            notification["subject"],
+            notification["message"],
+            notification["code"]
+        )
+    if notification["channel"] == "whatsapp":
+        return await send_whatsapp_message(notification["recipient"], notification["message"])
+    
+    logger.error(f"Unknown notification channel: {notification['channel']}")
+    return False
+
+async def claim_notification() -> Optional[dict]:
+    """Lease the next due notification, including ones whose worker died mid-delivery"""
+    now = datetime.now(timezone.utc)
+    return await db.notification_outbox.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "processing", "locked_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {"status": "processing", "locked_until": now + timedelta(seconds=NOTIFICATION_LEASE_SECONDS)},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def process_notification(notification: dict):
+    with tracer.start_as_current_span(
+        "notification.deliver",
+        context=propagate.extract(notification.get("trace_context") or {}),
+        attributes={"notification.channel": notification["channel"], "notification.attempt": notification["attempts"]}
+    ):
+        await deliver_and_record(notification)
+
+async def deliver_and_record(notification: dict):
+    now = datetime.now(timezone.utc)
+    expires_at = notification.get("expires_at")
+    if expires_at and expires_at.replace(tzinfo=timezone.utc) < now:
+        await db.notification_outbox.update_one(
+            {"id": notification["id"]},
+            {"$set": {"status": "dead", "last_error": "expired before delivery"}, "$unset": {"code": ""}}
+        )
+        return
+    
+    try:
+        delivered = await deliver_notification(notification)
+        error = None if delivered else "provider rejected or not configured"
+    except Exception as e:
+        delivered = False
+        error = repr(e)
+    
+    if delivered:
+        await db.notification_outbox.update_one(
+            {"id": notification["id"]},
+            {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc), "last_error": None}, "$unset": {"code": ""}}
+        )
+    elif notification["attempts"] >= NOTIFICATION_MAX_ATTEMPTS:
+        logger.error(f"Notification {notification['id']} dead after {notification['attempts']} attempts: {error}")
+        await db.notification_outbox.update_one(
+            {"id": notification["id"]},
+            {"$set": {"status": "dead", "last_error": error}, "$unset": {"code": ""}}
+        )
+    else:
+        delay = NOTIFICATION_RETRY_BACKOFF * (2 ** (notification["attempts"] - 1))
+        await db.notification_outbox.update_one(
+            {"id": notification["id"]},
+            {"$set": {
+                "status": "pending",
+                "last_error": error,
+                "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay)
+            }}
+        )
+
+async def notification_worker(worker_id: int):
+    """Drain the outbox until cancelled, sleeping until woken or the poll interval passes"""
+    while True:
+        try:
+            # Clear before claiming: an enqueue that lands after this point
+            # either gets claimed now or sets the event again, so it is never missed
+            notification_wakeup.clear()
+            notification = await claim_notification()
+            if notification is None:
+                try:
+                    await asyncio.wait_for(notification_wakeup.wait(), timeout=NOTIFICATION_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await process_notification(notification)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification worker {worker_id} error: {e}")
+            await asyncio.sleep(NOTIFICATION_POLL_INTERVAL)
+
+def start_notification_workers(concurrency: int = NOTIFICATION_WORKERS):
+    for worker_id in range(concurrency):
+        notification_workers.append(asyncio.create_task(notification_worker(worker_id)))
+
+async def stop_notification_workers():
+    for task in notification_workers:
+        task.cancel()
+    await asyncio.gather(*notification_workers, return_exceptions=True)
+    notification_workers.clear()
+
+async def get_outbox_metrics(window: timedelta = timedelta(hours=1)) -> Dict[str, Any]:
+    """Queue depth by status and delivery latency of messages sent within the window"""
+    depth = {"pending": 0, "processing": 0, "sent": 0, "dead": 0}
+    for row in await db.notification_outbox.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]).to_list(None):
+        depth[row["_id"]] = row["count"]
+    
+    latencies = await db.notification_outbox.aggregate([
+        {"$match": {"status": "sent", "sent_at": {"$gte": datetime.now(timezone.utc) - window}}},
+        {"$project": {"_id": 0, "latency": {"$subtract": ["$sent_at", "$created_at"]}}},
+        {"$sort": {"latency": 1}}
+    ]).to_list(None)
+    latencies = [row["latency"] / 1000 for row in latencies]
+    
+    def percentile(fraction: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+    
+    oldest_pending = await db.notification_outbox.find_one(
+        {"status": "pending"}, sort=[("created_at", ASCENDING)]
+    )
+    return {
+        "depth": depth,
+        "oldest_pending_age_seconds": (
+            (datetime.now(timezone.utc) - oldest_pending["created_at"].replace(tzinfo=timezone.utc)).total_seconds()
+            if oldest_pending else 0
+        ),
+        "delivered_in_window": len(latencies),
+        "latency_seconds": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)}
+    }
+
+async def get_outbox_backlog() -> Dict[str, Any]:
+    """Unfinished outbox rows by status and the age of the oldest pending one, for /metrics.
+
+    Counts go through the (status, ...) indexes, so a scrape never scans the
+    sent history the way get_outbox_metrics does.
+    """
+    depth = {
+        status: await db.notification_outbox.count_documents({"status": status})
+        for status in ("pending", "processing", "dead")
+    }
+    oldest_pending = await db.notification_outbox.find_one(
+        {"status": "pending"}, {"_id": 0, "created_at": 1}, sort=[("created_at", ASCENDING)]
+    )
+    return {
+        "depth": depth,
+        "oldest_pending_age_seconds": (
+            (datetime.now(timezone.utc) - oldest_pending["created_at"].replace(tzinfo=timezone.utc)).total_seconds()
+            if oldest_pending else 0
+        )
+    }
+
+# Daily rollup functions
+def rollup_day(moment: datetime) -> datetime:
+    """Truncate a timestamp to the start of its UTC day (naive values are taken as UTC)"""
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_key(transaction: dict) -> str:
+    """Build the rollup document id for a transaction"""
+    day = rollup_day(transaction["transaction_date"])
+    return ":".join([
+        transaction["client_id"],
+        transaction["vehicle_id"],
+        transaction["fuel_type"],
+        transaction["station_id"],
+        day.strftime("%Y-%m-%d")
+    ])
+
+async def apply_transaction_rollups(transactions: List[dict]):
+    """Incrementally add new transactions to the fuel_daily_rollups collection"""
+    if not transactions:
+        return
+    
+    operations = [
+        UpdateOne(
+            {"_id": rollup_key(transaction)},
+            {
+                "$inc": {
+                    "liters": transaction["liters"],
+                    "amount": transaction["total_amount"],
+                    "count": 1
+                },
+                "$setOnInsert": {
+                    "client_id": transaction["client_id"],
+                    "vehicle_id": transaction["vehicle_id"],
+                    "fuel_type": transaction["fuel_type"],
+                    "station_id": transaction["station_id"],
+                    "day": rollup_day(transaction["transaction_date"])
+                }
+            },
+            upsert=True
+        )
+        for transaction in transactions
+    ]
+    await db.fuel_daily_rollups.bulk_write(operations, ordered=False)
+    
+    for client_id in {transaction["client_id"] for transaction in transactions}:
+        response_cache.invalidate(client_id)
+        request_credit_evaluation(client_id)
+
+async def backfill_daily_rollups(client_id: Optional[str] = None):
+    """Rebuild fuel_daily_rollups from completed raw transactions (optionally for one client)"""
+    match = {"client_id": client_id} if client_id else {}
+    if client_id:
+        await db.fuel_daily_rollups.delete_many({"client_id": client_id})
+    else:
+        await db.fuel_daily_rollups.delete_many({})
+    
+    day_expr = {"$dateFromParts": {
+        "year": {"$year": "$transaction_date"},
+        "month": {"$month": "$transaction_date"},
+        "day": {"$dayOfMonth": "$transaction_date"}
+    }}
+    await db.fuel_transactions.aggregate([
+        {"$match": {**match, "status": "completed"}},
+        {"$group": {
+            "_id": {
+                "client_id": "$client_id",
+                "vehicle_id": "$vehicle_id",
+                "fuel_type": "$fuel_type",
+                "station_id": "$station_id",
+                "day": day_expr
+            },
+            "liters": {"$sum": "$liters"},
+            "amount": {"$sum": "$total_amount"},
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": {"$concat": [
+                "$_id.client_id", ":",
+                "$_id.vehicle_id", ":",
+                "$_id.fuel_type", ":",
+                "$_id.station_id", ":",
+                {"$dateToString": {"format": "%Y-%m-%d", "date": "$_id.day"}}
+            ]},
+            "client_id": "$_id.client_id",
+            "vehicle_id": "$_id.vehicle_id",
+            "fuel_type": "$_id.fuel_type",
+            "station_id": "$_id.station_id",
+            "day": "$_id.day",
+            "liters": 1,
+            "amount": 1,
+            "count": 1
+        }},
+        {"$merge": {"into": "fuel_daily_rollups", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]).to_list(None)
+    
+    return await db.fuel_daily_rollups.count_documents(match)
+
+async def summarize_raw_transactions(client_id: str, start_date: datetime, end_date: datetime) -> List[dict]:
+    """Per-fuel totals straight from fuel_transactions (used for partial days)"""
+    return await db.fuel_transactions.aggregate([
+        {"$match": {
+            "client_id": client_id,
+            "transaction_date": {"$gte": start_date, "$lt": end_date},
+            "status": "completed"
+        }},
+        {"$group": {
+            "_id": "$fuel_type",
+            "liters": {"$sum": "$liters"},
+            "amount": {"$sum": "$total_amount"},
+            "count": {"$sum": 1}
+        }}
+    ]).to_list(None)
+
+async def summarize_period_transactions(client_id: str, start_date: datetime, end_date: datetime) -> Dict[str, dict]:
+    """Per-fuel liters/amount/count for a period, merged from daily rollups.
+
+    Whole days are read from fuel_daily_rollups; only the partial days at
+    either edge of the period are aggregated from raw transactions.
+    """
+    # Rollup days are UTC days, so edges must be truncated in UTC
+    start_date = start_date.astimezone(timezone.utc) if start_date.tzinfo else start_date.replace(tzinfo=timezone.utc)
+    end_date = end_date.astimezone(timezone.utc) if end_date.tzinfo else end_date.replace(tzinfo=timezone.utc)
+    
+    first_full_day = rollup_day(start_date)
+    if first_full_day < start_date:
+        first_full_day += timedelta(days=1)
+    
+    # The day containing end_date is only complete in the rollup when end_date is "now"
+    rollup_end = rollup_day(end_date)
+    if end_date >= datetime.now(timezone.utc):
+        rollup_end += timedelta(days=1)
+    
+    # end_date is inclusive; BSON dates keep milliseconds, so the raw edges stop
+    # 1ms after it (a microsecond would be truncated away)
+    raw_end = end_date + timedelta(milliseconds=1)
+    rows = []
+    if first_full_day < rollup_end:
+        rows += await db.fuel_daily_rollups.aggregate([
+            {"$match": {
+                "client_id": client_id,
+                "day": {"$gte": first_full_day, "$lt": rollup_end}
+            }},
+            {"$group": {
+                "_id": "$fuel_type",
+                "liters": {"$sum": "$liters"},
+                "amount": {"$sum": "$amount"},
+                "count": {"$sum": "$count"}
+            }}
+        ]).to_list(None)
+        if start_date < first_full_day:
+            rows += await summarize_raw_transactions(client_id, start_date, first_full_day)
+        if rollup_end <= end_date:
+            rows += await summarize_raw_transactions(client_id, rollup_end, raw_end)
+    else:
+        rows += await summarize_raw_transactions(client_id, start_date, raw_end)
+    
+    breakdown = {}
+    for row in rows:
+        fuel = breakdown.setdefault(row["_id"], {"liters": 0, "amount": 0, "count": 0})
+        fuel["liters"] += row["liters"]
+        fuel["amount"] += row["amount"]
+        fuel["count"] += row["count"]
+    return breakdown
+
+# Index management
+# Every index the portal relies on, by collection. Names are explicit so that
+# ensure_indexes can tell a changed definition apart from a missing one.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "clients": [
+        IndexModel([("cnpj", ASCENDING)], name="cnpj_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "vehicles": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("client_id", ASCENDING), ("is_active", ASCENDING)], name="client_active"),
+        IndexModel([("client_id", ASCENDING), ("license_plate", ASCENDING)], name="client_plate"),
+    ],
+    "limits": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("client_id", ASCENDING), ("is_active", ASCENDING)], name="client_active"),
+        IndexModel(
+            [("is_active", ASCENDING), ("limit_type", ASCENDING), ("reset_date", ASCENDING)],
+            name="active_type_reset"
+        ),
+    ],
+    "fuel_authorizations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("client_id", ASCENDING), ("created_at", DESCENDING)], name="client_created"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created"),
+    ],
+    "fuel_transactions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("external_id", ASCENDING)],
+            name="external_id_unique",
+            unique=True,
+            partialFilterExpression={"external_id": {"$exists": True}}
+        ),
+        IndexModel(
+            [("client_id", ASCENDING), ("transaction_date", DESCENDING), ("id", DESCENDING)],
+            name="client_date"
+        ),
+        IndexModel(
+            [("client_id", ASCENDING), ("vehicle_id", ASCENDING), ("transaction_date", DESCENDING), ("id", DESCENDING)],
+            name="client_vehicle_date"
+        ),
+        IndexModel([("invoice_id", ASCENDING), ("transaction_date", ASCENDING)], name="invoice_date"),
+        IndexModel(
+            [("billing_cycle", ASCENDING), ("invoice_id", ASCENDING)],
+            name="billing_cycle_invoice",
+            partialFilterExpression={"billing_cycle": {"$exists": True}}
+        ),
+    ],
+    "fuel_daily_rollups": [
+        IndexModel([("client_id", ASCENDING), ("day", ASCENDING)], name="client_day"),
+    ],
+    "invoices": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("client_id", ASCENDING), ("created_at", DESCENDING)], name="client_created"),
+        IndexModel(
+            [("client_id", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING)],
+            name="client_status_due"
+        ),
+        IndexModel([("status", ASCENDING), ("due_date", ASCENDING)], name="status_due"),
+    ],
+    "credit_alerts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("client_id", ASCENDING), ("dismissed", ASCENDING), ("created_at", DESCENDING)],
+            name="client_dismissed_created"
+        ),
+    ],
+    "notification_outbox": [
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created"),
+        IndexModel([("sent_at", ASCENDING)], name="sent_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+        # 2FA messages carry their code; drop them, whatever their status, once the code expires
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "verification_codes": [
+        IndexModel([("cnpj", ASCENDING), ("code", ASCENDING)], name="cnpj_code"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+INDEX_OPTIONS = ("unique", "expireAfterSeconds", "partialFilterExpression", "sparse")
+
+def index_matches(existing: dict, declared: dict) -> bool:
+    """Compare an index_information() entry with a declared IndexModel document"""
+    if list(existing["key"]) != list(declared["key"].items()):
+        return False
+    return all(existing.get(option) == declared.get(option) for option in INDEX_OPTIONS)
+
+async def ensure_indexes(drop_unknown: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """Create missing indexes, rebuild changed ones and optionally drop undeclared ones"""
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        created, rebuilt, dropped = [], [], []
+        
+        to_create = []
+        for model in models:
+            declared = model.document
+            name = declared["name"]
+            if name not in existing:
+                to_create.append(model)
+                created.append(name)
+            elif not index_matches(existing[name], declared):
+                await collection.drop_index(name)
+                to_create.append(model)
+                rebuilt.append(name)
+        
+        if to_create:
+            await collection.create_indexes(to_create)
+        
+        if drop_unknown:
+            declared_names = {model.document["name"] for model in models}
+            for name in existing:
+                if name != "_id_" and name not in declared_names:
+                    await collection.drop_index(name)
+                    dropped.append(name)
+        
+        report[collection_name] = {"created": created, "rebuilt": rebuilt, "dropped": dropped}
+    return report
+
+async def get_index_usage() -> Dict[str, List[dict]]:
+    """Per-index access counters from $indexStats for every managed collection"""
+    usage = {}
+    for collection_name in INDEXES:
+        stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        usage[collection_name] = [
+            {
+                "name": stat["name"],
+                "ops": stat["accesses"]["ops"],
+                "since": stat["accesses"]["since"]
+            }
+            for stat in sorted(stats, key=lambda stat: stat["name"])
+        ]
+    return usage
+
 # Pydantic Models
 class Contact(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -513,6 +2096,19 @@ class LimitCreate(BaseModel):
     limit_value: float
     limit_unit: str
 
+class FuelAuthorizationRequest(BaseModel):
+    vehicle_id: Optional[str] = None
+    license_plate: Optional[str] = None  # Alternative to vehicle_id at the pump
+    fuel_type: str
+    liters: float
+    amount: float
+
+    @validator('liters', 'amount')
+    def validate_positive(cls, v):
+        if v <= 0:
+            raise ValueError('Must be greater than zero')
+        return v
+
 class FuelTransaction(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_id: str
@@ -526,6 +2122,36 @@ class FuelTransaction(BaseModel):
     station_name: str
     transaction_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     status: str = "completed"  # "pending", "completed", "cancelled"
+    invoice_id: Optional[str] = None  # Set by the billing run
+
+class TransactionIngest(BaseModel):
+    external_id: str  # Station-side id, used to drop duplicate submissions
+    client_id: str
+    vehicle_id: str
+    license_plate: str
+    fuel_type: str
+    liters: float
+    price_per_liter: float
+    total_amount: Optional[float] = None
+    station_id: str
+    station_name: str
+    transaction_date: datetime
+    status: str = "completed"
+    authorization_id: Optional[str] = None  # Set when the fueling went through /fuel/authorize
+
+    @validator('liters', 'price_per_liter')
+    def validate_positive(cls, v):
+        if v <= 0:
+            raise ValueError('Must be greater than zero')
+        return v
+
+    @validator('transaction_date')
+    def validate_timezone(cls, v):
+        # Stations send local offsets; everything downstream works in UTC
+        return v.astimezone(timezone.utc) if v.tzinfo else v.replace(tzinfo=timezone.utc)
+
+class IngestBatch(BaseModel):
+    transactions: List[Dict[str, Any]]
 
 class FuelLimit(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -548,8 +2174,24 @@ class Invoice(BaseModel):
     due_date: datetime
     status: str = "open"  # "open", "paid", "overdue"
     transactions: List[str] = []  # List of transaction IDs
+    billing_cycle: Optional[str] = None  # "YYYY-MM" for invoices from the billing run
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class InvoiceStatusUpdate(BaseModel):
+    status: str  # "open", "paid", "overdue"
+
+# Read paths return documents straight from Mongo: they were validated by the
+# models on the way in, so lists are projected to the model's fields and
+# serialized with orjson instead of being rebuilt as model instances.
+def model_projection(model) -> dict:
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+VEHICLE_PROJECTION = model_projection(Vehicle)
+LIMIT_PROJECTION = model_projection(Limit)
+TRANSACTION_PROJECTION = model_projection(FuelTransaction)
+INVOICE_PROJECTION = model_projection(Invoice)
+CREDIT_ALERT_LIST_PROJECTION = model_projection(CreditAlert)
+
 # Authentication Routes
 @api_router.post("/auth/request-2fa")
 async def request_two_factor(request_data: TwoFactorRequest):
@@ -557,7 +2199,7 @@ async def request_two_factor(request_data: TwoFactorRequest):
     cnpj = re.sub(r'[^0-9]', '', request_data.cnpj)
     client = await db.clients.find_one({"cnpj": cnpj})
     
-    if not client or not verify_password(request_data.password, client["password_hash"]):
+    if not client or not await verify_password_async(request_data.password, client["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid CNPJ or password"
@@ -572,34 +2214,52 @@ async def request_two_factor(request_data: TwoFactorRequest):
     # Generate verification code
     code = generate_verification_code()
     
-    # Send code based on method using primary contacts
-    success = False
+    # Queue code based on method using primary contacts
     if request_data.method == "email":
         email = await get_primary_contact(client, "email")
-        if email:
-            success = await send_email_code(email, code)
-        else:
+        if not email:
             raise HTTPException(status_code=400, detail="No email configured")
+        channel_configured = bool(EMAIL_ADDRESS and EMAIL_PASSWORD)
+        recipient = email
     elif request_data.method == "whatsapp":
         phone = await get_primary_contact(client, "whatsapp")
-        if phone:
-            success = await send_whatsapp_code(phone, code)
-        else:
+        if not phone:
             raise HTTPException(status_code=400, detail="No WhatsApp number configured")
+        channel_configured = bool(ZAPI_TOKEN and ZAPI_INSTANCE_ID)
+        recipient = phone
     else:
         raise HTTPException(status_code=400, detail="Invalid method. Use 'email' or 'whatsapp'")
     
-    if success:
-        await store_verification_code(cnpj, code, request_data.method)
-        return {
-            "message": f"Verification code sent via {request_data.method}",
-            "method": request_data.method
-        }
+    if not channel_configured:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Failed to send verification code via {request_data.method}"
+        )
+    
+    await store_verification_code(cnpj, code, request_data.method)
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    if request_data.method == "email":
+        await enqueue_notification(
+            "email",
+            recipient,
+            f"2fa:{cnpj}:{code}",
+            subject="Código de Verificação - Portal do Cliente",
+            code=code,
+            expires_at=expires_at
+        )
     else:
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Failed to send verification code via {request_data.method}"
+        await enqueue_notification(
+            "whatsapp",
+            recipient,
+            f"2fa:{cnpj}:{code}",
+            message=whatsapp_code_message(code),
+            expires_at=expires_at
         )
+    
+    return {
+        "message": f"Verification code sent via {request_data.method}",
+        "method": request_data.method
+    }
 
 @api_router.post("/auth/verify-2fa")
 async def verify_two_factor(verify_data: TwoFactorVerify):
@@ -632,7 +2292,7 @@ async def login(client_data: ClientLogin):
     cnpj = re.sub(r'[^0-9]', '', client_data.cnpj)
     client = await db.clients.find_one({"cnpj": cnpj})
     
-    if not client or not verify_password(client_data.password, client["password_hash"]):
+    if not client or not await verify_password_async(client_data.password, client["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid CNPJ or password"
@@ -687,7 +2347,7 @@ async def login_dev(client_data: ClientLogin):
     cnpj = re.sub(r'[^0-9]', '', client_data.cnpj)
     client = await db.clients.find_one({"cnpj": cnpj})
     
-    if not client or not verify_password(client_data.password, client["password_hash"]):
+    if not client or not await verify_password_async(client_data.password, client["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid CNPJ or password"
@@ -714,14 +2374,16 @@ async def login_dev(client_data: ClientLogin):
 
 @api_router.post("/auth/change-password")
 async def change_password(password_data: PasswordChange, current_user: dict = Depends(get_current_user)):
-    if not verify_password(password_data.current_password, current_user["password_hash"]):
+    if not await verify_password_async(password_data.current_password, current_user["password_hash"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
-    new_hash = get_password_hash(password_data.new_password)
+    new_hash = await get_password_hash_async(password_data.new_password)
     await db.clients.update_one(
         {"cnpj": current_user["cnpj"]},
         {"$set": {"password_hash": new_hash}}
     )
+    client_cache.invalidate(current_user["cnpj"])
+    
     return {"message": "Password changed successfully"}
 
 # Configuration Routes
@@ -742,6 +2404,8 @@ async def update_settings(settings: NotificationSettings, current_user: dict = D
         {"$set": {"contacts": [contact.dict() for contact in settings.contacts]}}
     )
     
+    client_cache.invalidate(current_user["cnpj"])
+    
     return {"message": "Settings updated successfully"}
 
 @api_router.post("/contacts")
@@ -767,6 +2431,8 @@ async def add_contact(contact_data: ContactCreate, current_user: dict = Depends(
         {"$push": {"contacts": contact.dict()}}
     )
     
+    client_cache.invalidate(current_user["cnpj"])
+    
     return {"message": "Contact added successfully", "contact": contact}
 
 @api_router.delete("/contacts/{contact_id}")
@@ -777,6 +2443,8 @@ async def delete_contact(contact_id: str, current_user: dict = Depends(get_curre
         {"$pull": {"contacts": {"id": contact_id}}}
     )
     
+    client_cache.invalidate(current_user["cnpj"])
+    
     return {"message": "Contact deleted successfully"}
 
 @api_router.put("/contacts/{contact_id}/primary")
@@ -798,19 +2466,22 @@ async def set_primary_contact(contact_id: str, current_user: dict = Depends(get_
         {"$set": {"contacts": contacts}}
     )
     
+    client_cache.invalidate(current_user["cnpj"])
+    
     return {"message": "Primary contact updated successfully"}
 
 # Credit Alert Routes
-@api_router.get("/credit-alerts")
-async def get_credit_alerts(current_user: dict = Depends(get_current_user)):
+@api_router.get("/credit-alerts", response_model=List[CreditAlert])
+async def get_credit_alerts(request: Request, current_user: dict = Depends(get_current_user)):
     """Get active credit alerts for client"""
-    alerts = await db.credit_alerts.find({
-        "client_id": current_user["id"],
-        "dismissed": False,
-        "created_at": {"$gte": datetime.now(timezone.utc) - timedelta(days=7)}
-    }).sort("created_at", -1).to_list(10)
+    async def compute():
+        return await db.credit_alerts.find({
+            "client_id": current_user["id"],
+            "dismissed": False,
+            "created_at": {"$gte": datetime.now(timezone.utc) - timedelta(days=7)}
+        }, CREDIT_ALERT_LIST_PROJECTION).sort("created_at", -1).to_list(10)
     
-    return [CreditAlert(**alert) for alert in alerts]
+    return await cached_response(request, current_user["id"], "credit-alerts", compute)
 
 @api_router.post("/credit-alerts/{alert_id}/dismiss")
 async def dismiss_credit_alert(alert_id: str, current_user: dict = Depends(get_current_user)):
@@ -822,14 +2493,17 @@ async def dismiss_credit_alert(alert_id: str, current_user: dict = Depends(get_c
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Alert not found")
+    response_cache.invalidate(current_user["id"])
     
     return {"message": "Alert dismissed"}
 
 # Vehicle Routes
 @api_router.get("/vehicles", response_model=List[Vehicle])
 async def get_vehicles(current_user: dict = Depends(get_current_user)):
-    vehicles = await db.vehicles.find({"client_id": current_user["id"], "is_active": True}).to_list(None)
-    return [Vehicle(**vehicle) for vehicle in vehicles]
+    vehicles = await db.vehicles.find(
+        {"client_id": current_user["id"], "is_active": True}, VEHICLE_PROJECTION
+    ).to_list(None)
+    return ORJSONResponse(vehicles)
 
 @api_router.post("/vehicles", response_model=Vehicle, status_code=201)
 async def create_vehicle(vehicle_data: VehicleCreate, current_user: dict = Depends(get_current_user)):
@@ -846,6 +2520,7 @@ async def create_vehicle(vehicle_data: VehicleCreate, current_user: dict = Depen
     vehicle_dict["client_id"] = current_user["id"]
     vehicle = Vehicle(**vehicle_dict)
     await db.vehicles.insert_one(vehicle.dict())
+    response_cache.invalidate(current_user["id"])
     return vehicle
 
 @api_router.put("/vehicles/{vehicle_id}", response_model=Vehicle)
@@ -871,13 +2546,16 @@ async def delete_vehicle(vehicle_id: str, current_user: dict = Depends(get_curre
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    response_cache.invalidate(current_user["id"])
     return {"message": "Vehicle deleted successfully"}
 
 # Limits Routes
 @api_router.get("/limits", response_model=List[Limit])
 async def get_limits(current_user: dict = Depends(get_current_user)):
-    limits = await db.limits.find({"client_id": current_user["id"], "is_active": True}).to_list(None)
-    return [Limit(**limit) for limit in limits]
+    limits = await db.limits.find(
+        {"client_id": current_user["id"], "is_active": True}, LIMIT_PROJECTION
+    ).to_list(None)
+    return ORJSONResponse(limits)
 
 @api_router.post("/limits", response_model=Limit, status_code=201)
 async def create_limit(limit_data: LimitCreate, current_user: dict = Depends(get_current_user)):
@@ -885,18 +2563,7 @@ async def create_limit(limit_data: LimitCreate, current_user: dict = Depends(get
     limit_dict["client_id"] = current_user["id"]
     
     # Calculate reset date based on limit type
-    now = datetime.now(timezone.utc)
-    if limit_data.limit_type == "daily":
-        reset_date = now + timedelta(days=1)
-    elif limit_data.limit_type == "weekly":
-        reset_date = now + timedelta(weeks=1)
-    else:  # monthly
-        if now.month == 12:
-            reset_date = now.replace(year=now.year + 1, month=1, day=1)
-        else:
-            reset_date = now.replace(month=now.month + 1, day=1)
-    
-    limit_dict["reset_date"] = reset_date
+    limit_dict["reset_date"] = next_limit_reset(limit_data.limit_type, datetime.now(timezone.utc))
     limit = Limit(**limit_dict)
     await db.limits.insert_one(limit.dict())
     return limit
@@ -912,95 +2579,1085 @@ async def delete_limit(limit_id: str, current_user: dict = Depends(get_current_u
         raise HTTPException(status_code=404, detail="Limit not found")
     return {"message": "Limit deleted successfully"}
 
-# Transactions Routes
-@api_router.get("/transactions")
-async def get_transactions(current_user: dict = Depends(get_current_user)):
-    transactions = await db.fuel_transactions.find({"client_id": current_user["id"]}).sort("transaction_date", -1).to_list(100)
-    return [FuelTransaction(**transaction) for transaction in transactions]
-
-@api_router.get("/transactions/vehicle/{vehicle_id}")
-async def get_vehicle_transactions(vehicle_id: str, current_user: dict = Depends(get_current_user)):
-    transactions = await db.fuel_transactions.find({
+# Limit window functions
+def next_limit_reset(limit_type: str, now: datetime) -> datetime:
+    """Start of the next daily/weekly/monthly window after now, in UTC.
+
+    Windows follow the local calendar in LIMITS_TIMEZONE: days start at
+    local midnight, weeks on Monday and months on the 1st.
+    """
+    local_now = now.astimezone(LIMITS_TIMEZONE)
+    if limit_type == "daily":
+        next_date = local_now.date() + timedelta(days=1)
+    elif limit_type == "weekly":
+        next_date = local_now.date() + timedelta(days=7 - local_now.weekday())
+    else:  # monthly
+        if local_now.month == 12:
+            next_date = local_now.date().replace(year=local_now.year + 1, month=1, day=1)
+        else:
+            next_date = local_now.date().replace(month=local_now.month + 1, day=1)
+    
+    local_midnight = datetime(next_date.year, next_date.month, next_date.day, tzinfo=LIMITS_TIMEZONE)
+    return local_midnight.astimezone(timezone.utc)
+
+async def reset_expired_limits(batch_size: int = 1000) -> Dict[str, int]:
+    """Zero the usage of limits whose window has passed and schedule their next reset.
+
+    Expired limits are found through the (is_active, reset_date) index and
+    reset with one update_many per batch of ids, so each run only touches
+    limits that are actually due. Authorizations left unclaimed past
+    AUTHORIZATION_RESERVATION_TTL are expired first.
+    """
+    await expire_stale_authorizations(batch_size)
+    now = datetime.now(timezone.utc)
+    processed = {"daily": 0, "weekly": 0, "monthly": 0}
+    
+    for limit_type in processed:
+        next_reset = next_limit_reset(limit_type, now)
+        while True:
+            due = await db.limits.find(
+                {"is_active": True, "limit_type": limit_type, "reset_date": {"$lte": now}},
+                {"_id": 0, "id": 1}
+            ).sort("reset_date", ASCENDING).limit(batch_size).to_list(batch_size)
+            if not due:
+                break
+            
+            result = await db.limits.update_many(
+                {"id": {"$in": [limit["id"] for limit in due]}, "reset_date": {"$lte": now}},
+                {"$set": {"current_usage": 0.0, "reset_date": next_reset, "last_reset_at": now}}
+            )
+            processed[limit_type] += result.modified_count
+            if len(due) < batch_size:
+                break
+    
+    total = sum(processed.values())
+    if total:
+        logger.info(f"Reset {total} expired limits: {processed}")
+    return processed
+
+# Fuel Authorization Routes
+def limit_increment(limit: dict, liters: float, amount: float) -> float:
+    """How much a fueling counts against a limit, in the limit's own unit"""
+    return liters if limit["limit_unit"] == "liters" else amount
+
+async def reserve_limit(limit: dict, increment: float) -> Optional[dict]:
+    """Add increment to a limit's usage only if it stays within limit_value.
+
+    Returns the limit's reset_date at the time of the $inc, which identifies
+    the window the usage was charged to, or None if the limit refused it.
+    """
+    return await db.limits.find_one_and_update(
+        {"id": limit["id"], "is_active": True, "current_usage": {"$lte": limit["limit_value"] - increment}},
+        {"$inc": {"current_usage": increment}},
+        projection={"_id": 0, "reset_date": 1}
+    )
+
+def reservation_filter(reservation: dict) -> dict:
+    """Match the reserved limit only while the window it was charged to is current"""
+    if "reset_date" in reservation:
+        return {"id": reservation["limit_id"], "reset_date": reservation["reset_date"]}
+    # Reservations made before reset_date was recorded: never go below zero
+    return {"id": reservation["limit_id"], "current_usage": {"$gte": reservation["amount"]}}
+
+async def release_limit_reservations(reservations: List[dict]):
+    """Give reserved usage back, skipping limits that were reset since the reservation"""
+    await asyncio.gather(*(
+        db.limits.update_one(reservation_filter(reservation), {"$inc": {"current_usage": -reservation["amount"]}})
+        for reservation in reservations
+    ))
+
+@api_router.post("/fuel/authorize")
+async def authorize_fueling(request_data: FuelAuthorizationRequest, current_user: dict = Depends(get_current_user)):
+    """Check a pending fueling against every applicable limit and reserve the usage.
+
+    Each limit is reserved with a conditional $inc, so concurrent pumps can
+    never push a limit past its value; if any limit refuses, the
+    reservations already made are rolled back and the fueling is denied.
+    """
+    if request_data.vehicle_id:
+        vehicle_query = {"id": request_data.vehicle_id}
+    elif request_data.license_plate:
+        vehicle_query = {"license_plate": request_data.license_plate.upper().strip()}
+    else:
+        raise HTTPException(status_code=400, detail="vehicle_id or license_plate is required")
+    
+    vehicle = await db.vehicles.find_one(
+        {**vehicle_query, "client_id": current_user["id"], "is_active": True},
+        {"_id": 0, "id": 1, "license_plate": 1}
+    )
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    
+    limits = await db.limits.find(
+        {
+            "client_id": current_user["id"],
+            "is_active": True,
+            "vehicle_id": {"$in": [vehicle["id"], None]},
+            "fuel_type": {"$in": [request_data.fuel_type, None]}
+        },
+        {"_id": 0, "id": 1, "vehicle_id": 1, "fuel_type": 1, "limit_type": 1, "limit_value": 1, "limit_unit": 1}
+    ).to_list(None)
+    
+    increments = [limit_increment(limit, request_data.liters, request_data.amount) for limit in limits]
+    reserved = await asyncio.gather(*(
+        reserve_limit(limit, increment) for limit, increment in zip(limits, increments)
+    ))
+    reservations = [
+        {"limit_id": limit["id"], "amount": increment, "reset_date": window["reset_date"]}
+        for limit, increment, window in zip(limits, increments, reserved) if window
+    ]
+    denied_by = [limit for limit, window in zip(limits, reserved) if not window]
+    
+    if denied_by:
+        await release_limit_reservations(reservations)
+        return {
+            "authorized": False,
+            "vehicle_id": vehicle["id"],
+            "license_plate": vehicle["license_plate"],
+            "denied_by": denied_by
+        }
+    
+    authorization = {
+        "id": str(uuid.uuid4()),
         "client_id": current_user["id"],
-        "vehicle_id": vehicle_id
-    }).sort("transaction_date", -1).to_list(100)
-    return [FuelTransaction(**transaction) for transaction in transactions]
+        "vehicle_id": vehicle["id"],
+        "license_plate": vehicle["license_plate"],
+        "fuel_type": request_data.fuel_type,
+        "liters": request_data.liters,
+        "amount": request_data.amount,
+        "reservations": reservations,
+        "status": "reserved",
+        "created_at": datetime.now(timezone.utc)
+    }
+    await db.fuel_authorizations.insert_one(authorization)
+    
+    return {
+        "authorized": True,
+        "authorization_id": authorization["id"],
+        "vehicle_id": vehicle["id"],
+        "license_plate": vehicle["license_plate"],
+        "reservations": reservations
+    }
+
+@api_router.post("/fuel/authorizations/{authorization_id}/release")
+async def release_fuel_authorization(authorization_id: str, current_user: dict = Depends(get_current_user)):
+    """Cancel an authorized fueling that did not happen and give the reserved usage back"""
+    authorization = await db.fuel_authorizations.find_one_and_update(
+        {"id": authorization_id, "client_id": current_user["id"], "status": "reserved"},
+        {"$set": {"status": "released", "released_at": datetime.now(timezone.utc)}}
+    )
+    if not authorization:
+        raise HTTPException(status_code=404, detail="Authorization not found or already released")
+    
+    await release_limit_reservations(authorization["reservations"])
+    return {"message": "Authorization released"}
+
+async def expire_stale_authorizations(batch_size: int = 1000) -> int:
+    """Release the reservations of authorizations never claimed or released.
+
+    Each authorization is flipped from reserved to expired on its own, so a
+    concurrent claim or release wins or loses it as a whole, and its
+    reservations are given back only for limits still in the same window.
+    """
+    if AUTHORIZATION_RESERVATION_TTL <= 0:
+        return 0
+    
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=AUTHORIZATION_RESERVATION_TTL)
+    expired = 0
+    while True:
+        stale = await db.fuel_authorizations.find(
+            {"status": "reserved", "created_at": {"$lt": cutoff}}, {"_id": 0, "id": 1}
+        ).sort("created_at", ASCENDING).limit(batch_size).to_list(batch_size)
+        for candidate in stale:
+            authorization = await db.fuel_authorizations.find_one_and_update(
+                {"id": candidate["id"], "status": "reserved"},
+                {"$set": {"status": "expired", "expired_at": now}},
+                projection={"_id": 0, "reservations": 1}
+            )
+            if authorization:
+                await release_limit_reservations(authorization["reservations"])
+                expired += 1
+        if len(stale) < batch_size:
+            break
+    
+    if expired:
+        logger.info(f"Expired {expired} unclaimed fuel authorizations")
+    return expired
+
+# Ingestion Routes
+async def claim_transaction_authorizations(transactions: List[dict]) -> Dict[str, dict]:
+    """Complete the authorizations these fuelings reference and return the ones claimed.
+
+    An authorization is only claimed while it is still reserved and belongs to
+    the same client and vehicle as the fueling. The update is stamped with a
+    per-call claim id so a concurrent ingest of the same authorization cannot
+    both count it as its own.
+    """
+    referenced = {}
+    for transaction in transactions:
+        if transaction.get("authorization_id"):
+            referenced.setdefault(transaction["authorization_id"], transaction)
+    if not referenced:
+        return {}
+    
+    claim_id = str(uuid.uuid4())
+    await db.fuel_authorizations.update_many(
+        {"status": "reserved", "$or": [
+            {"id": authorization_id, "client_id": transaction["client_id"], "vehicle_id": transaction["vehicle_id"]}
+            for authorization_id, transaction in referenced.items()
+        ]},
+        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc), "claim_id": claim_id}}
+    )
+    claimed = await db.fuel_authorizations.find(
+        {"id": {"$in": list(referenced)}, "claim_id": claim_id},
+        {"_id": 0, "id": 1, "reservations": 1}
+    ).to_list(None)
+    
+    if len(claimed) < len(referenced):
+        logger.warning(f"{len(referenced) - len(claimed)} ingested fuelings referenced an unusable authorization")
+    return {authorization["id"]: authorization for authorization in claimed}
+
+async def apply_transaction_limit_usage(transactions: List[dict]):
+    """Count ingested fuelings against every applicable limit with one bulk write.
+
+    Every fueling is charged in full. For fuelings authorized through
+    /fuel/authorize, the authorization is claimed and its reservations are
+    released in the same write, so only the difference between the fueled
+    and the reserved amount is added. A reservation whose limit was reset
+    in the meantime is not released, as the reset already cleared it.
+    """
+    claimed = await claim_transaction_authorizations(transactions)
+    
+    limits = await db.limits.find(
+        {"client_id": {"$in": list({t["client_id"] for t in transactions})}, "is_active": True},
+        {"_id": 0, "id": 1, "client_id": 1, "vehicle_id": 1, "fuel_type": 1, "limit_unit": 1}
+    ).to_list(None)
+    
+    increments = {}
+    for transaction in transactions:
+        for limit in limits:
+            if (
+                limit["client_id"] == transaction["client_id"]
+                and limit.get("vehicle_id") in (None, transaction["vehicle_id"])
+                and limit.get("fuel_type") in (None, transaction["fuel_type"])
+            ):
+                increments[limit["id"]] = increments.get(limit["id"], 0.0) + limit_increment(
+                    limit, transaction["liters"], transaction["total_amount"]
+                )
+    
+    operations = [
+        UpdateOne({"id": limit_id}, {"$inc": {"current_usage": amount}}) for limit_id, amount in increments.items()
+    ]
+    operations += [
+        UpdateOne(reservation_filter(reservation), {"$inc": {"current_usage": -reservation["amount"]}})
+        for authorization in claimed.values()
+        for reservation in authorization["reservations"]
+    ]
+    if operations:
+        await db.limits.bulk_write(operations, ordered=False)
+
+async def ingest_transactions(rows: List[dict]) -> Dict[str, Any]:
+    """Validate, dedupe and bulk insert station transactions.
+
+    Rows are validated individually, checked against the vehicles they
+    reference, deduplicated by external_id (within the batch and against the
+    unique index) and written with one unordered insert_many. Only completed
+    rows that were actually inserted feed the daily rollups, limit usage and
+    credit alert evaluation.
+    """
+    started = time.perf_counter()
+    invalid = []
+    candidates = []
+    seen_external_ids = set()
+    duplicates = 0
+    
+    for index, row in enumerate(rows):
+        try:
+            item = TransactionIngest(**row)
+        except ValidationError as e:
+            invalid.append({
+                "index": index,
+                "error": "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            })
+            continue
+        if item.external_id in seen_external_ids:
+            duplicates += 1
+            continue
+        seen_external_ids.add(item.external_id)
+        candidates.append((index, item))
+    
+    vehicles = {
+        vehicle["id"]: vehicle
+        for vehicle in await db.vehicles.find(
+            {"id": {"$in": list({item.vehicle_id for _, item in candidates})}},
+            {"_id": 0, "id": 1, "client_id": 1}
+        ).to_list(None)
+    }
+    
+    documents = []
+    for index, item in candidates:
+        vehicle = vehicles.get(item.vehicle_id)
+        if vehicle is None or vehicle["client_id"] != item.client_id:
+            invalid.append({"index": index, "error": "Unknown vehicle for this client"})
+            continue
+        data = item.dict(exclude={"external_id", "authorization_id"})
+        if data["total_amount"] is None:
+            data["total_amount"] = item.liters * item.price_per_liter
+        document = FuelTransaction(**data).dict()
+        document["external_id"] = item.external_id
+        document["authorization_id"] = item.authorization_id
+        documents.append(document)
+    
+    inserted = documents
+    if documents:
+        try:
+            await db.fuel_transactions.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details["writeErrors"]}
+            other_errors = [error for error in e.details["writeErrors"] if error["code"] != 11000]
+            duplicates += len(failed) - len(other_errors)
+            for error in other_errors:
+                invalid.append({"external_id": documents[error["index"]]["external_id"], "error": error["errmsg"]})
+            inserted = [document for index, document in enumerate(documents) if index not in failed]
+    
+    # Only completed fuelings count towards the dashboard and the limits
+    completed = [document for document in inserted if document["status"] == "completed"]
+    if completed:
+        await apply_transaction_rollups(completed)
+        await apply_transaction_limit_usage(completed)
+    
+    elapsed = time.perf_counter() - started
+    return {
+        "received": len(rows),
+        "inserted": len(inserted),
+        "duplicates": duplicates,
+        "invalid": invalid,
+        "elapsed_seconds": elapsed,
+        "rows_per_second": len(rows) / elapsed if elapsed > 0 else 0.0
+    }
+
+async def verify_ingest_key(x_ingest_key: str = Header(default="")):
+    if not INGEST_API_KEY:
+        raise HTTPException(status_code=503, detail="Ingestion is not configured")
+    if x_ingest_key != INGEST_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid ingest key")
+
+@api_router.post("/ingest/transactions", dependencies=[Depends(verify_ingest_key)])
+async def ingest_transactions_batch(batch: IngestBatch):
+    """Bulk ingest fuel transactions from stations"""
+    if len(batch.transactions) > INGEST_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch larger than {INGEST_MAX_BATCH_SIZE} transactions")
+    return await ingest_transactions(batch.transactions)
+
+# Transactions Routes
+TRANSACTIONS_PAGE_SIZE = 50
+TRANSACTIONS_MAX_PAGE_SIZE = 200
+
+def encode_transaction_cursor(transaction: dict) -> str:
+    """Opaque keyset cursor pointing just after the given transaction"""
+    position = {"d": transaction["transaction_date"].isoformat(), "i": transaction["id"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_transaction_cursor(cursor: str) -> dict:
+    """Turn a cursor back into a query for the rows that follow it"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        last_date = datetime.fromisoformat(position["d"])
+        last_id = position["i"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return {"$or": [
+        {"transaction_date": {"$lt": last_date}},
+        {"transaction_date": last_date, "id": {"$lt": last_id}}
+    ]}
+
+async def paginate_transactions(
+    query: dict,
+    cursor: Optional[str],
+    limit: int,
+    fuel_type: Optional[str],
+    station_id: Optional[str],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> Response:
+    """Keyset-paginate transactions by (transaction_date, id), newest first.
+
+    The cursor for the next page is returned in the X-Next-Cursor header so
+    the response body stays a plain list of transactions.
+    """
+    if fuel_type:
+        query["fuel_type"] = fuel_type
+    if station_id:
+        query["station_id"] = station_id
+    if start_date or end_date:
+        query["transaction_date"] = {}
+        if start_date:
+            query["transaction_date"]["$gte"] = start_date
+        if end_date:
+            query["transaction_date"]["$lte"] = end_date
+    if cursor:
+        query = {"$and": [query, decode_transaction_cursor(cursor)]}
+    
+    transactions = await db.fuel_transactions.find(query, TRANSACTION_PROJECTION).sort(
+        [("transaction_date", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    headers = {}
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        headers["X-Next-Cursor"] = encode_transaction_cursor(transactions[-1])
+    
+    return ORJSONResponse(transactions, headers=headers)
+
+@api_router.get("/transactions", response_model=List[FuelTransaction])
+async def get_transactions(
+    cursor: Optional[str] = None,
+    limit: int = Query(TRANSACTIONS_PAGE_SIZE, ge=1, le=TRANSACTIONS_MAX_PAGE_SIZE),
+    vehicle_id: Optional[str] = None,
+    fuel_type: Optional[str] = None,
+    station_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    query = {"client_id": current_user["id"]}
+    if vehicle_id:
+        query["vehicle_id"] = vehicle_id
+    return await paginate_transactions(query, cursor, limit, fuel_type, station_id, start_date, end_date)
+
+@api_router.get("/transactions/vehicle/{vehicle_id}", response_model=List[FuelTransaction])
+async def get_vehicle_transactions(
+    vehicle_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(TRANSACTIONS_PAGE_SIZE, ge=1, le=TRANSACTIONS_MAX_PAGE_SIZE),
+    fuel_type: Optional[str] = None,
+    station_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    query = {"client_id": current_user["id"], "vehicle_id": vehicle_id}
+    return await paginate_transactions(query, cursor, limit, fuel_type, station_id, start_date, end_date)
+
+# Export Routes
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = [
+    "id", "transaction_date", "vehicle_id", "license_plate", "fuel_type", "liters",
+    "price_per_liter", "total_amount", "station_id", "station_name", "status"
+]
+
+async def stream_transactions_export(query: dict, export_format: str):
+    """Yield CSV or NDJSON chunks straight from a Motor cursor, one batch at a time"""
+    cursor = db.fuel_transactions.find(
+        query, {field: 1 for field in EXPORT_FIELDS} | {"_id": 0}
+    ).sort([("transaction_date", -1), ("id", -1)]).batch_size(EXPORT_BATCH_SIZE)
+    
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    if export_format == "csv":
+        writer.writeheader()
+    
+    rows = 0
+    async for transaction in cursor:
+        if export_format == "csv":
+            writer.writerow({**transaction, "transaction_date": transaction["transaction_date"].isoformat()})
+        else:
+            # orjson writes datetimes as ISO 8601, matching the CSV column
+            buffer.write(orjson.dumps(transaction, option=orjson.OPT_APPEND_NEWLINE).decode())
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_response(query: dict, export_format: str, filename: str) -> StreamingResponse:
+    if export_format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'csv' or 'ndjson'")
+    
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_transactions_export(query, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+@api_router.get("/transactions/export")
+async def export_transactions(
+    format: str = "csv",
+    vehicle_id: Optional[str] = None,
+    fuel_type: Optional[str] = None,
+    station_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream all matching transactions as CSV or NDJSON"""
+    query = {"client_id": current_user["id"]}
+    if vehicle_id:
+        query["vehicle_id"] = vehicle_id
+    if fuel_type:
+        query["fuel_type"] = fuel_type
+    if station_id:
+        query["station_id"] = station_id
+    if start_date or end_date:
+        query["transaction_date"] = {}
+        if start_date:
+            query["transaction_date"]["$gte"] = start_date
+        if end_date:
+            query["transaction_date"]["$lte"] = end_date
+    
+    return export_response(query, format, "transacoes")
+
+@api_router.get("/invoices/{invoice_id}/export")
+async def export_invoice(invoice_id: str, format: str = "csv", current_user: dict = Depends(get_current_user)):
+    """Stream the transactions of an invoice as CSV or NDJSON"""
+    invoice = await db.invoices.find_one(
+        {"id": invoice_id, "client_id": current_user["id"]},
+        {"_id": 0, "client_id": 1, "invoice_number": 1, "transactions": 1, "created_at": 1}
+    )
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    return export_response(invoice_transactions_query(invoice), format, f"fatura-{invoice['invoice_number']}")
+
+# Billing run
+# Month-end close turns a cycle's uninvoiced transactions into one invoice per
+# client. Invoice ids are derived from (client, cycle) and transactions are
+# claimed by setting their invoice_id, so rerunning a cycle after a crash
+# only bills what is left and never duplicates an invoice. A crash between
+# the claim and the invoice write leaves claimed transactions without an
+# invoice; the next run finds those clients and writes their invoices.
+# Late transactions only amend a cycle invoice while it is still open; once it
+# is paid or overdue they go on an adjustment invoice for the same cycle.
+BILLING_NAMESPACE = uuid.UUID("6f1c2d4e-8a3b-4c5d-9e7f-0a1b2c3d4e5f")
+
+def billing_cycle_window(cycle: str) -> tuple:
+    """UTC bounds [start, end) of a "YYYY-MM" cycle in the stations' timezone"""
+    try:
+        year, month = (int(part) for part in cycle.split("-"))
+        start = datetime(year, month, 1, tzinfo=LIMITS_TIMEZONE)
+    except ValueError:
+        raise ValueError(f"Invalid billing cycle {cycle!r}, expected YYYY-MM")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+def previous_billing_cycle(now: Optional[datetime] = None) -> str:
+    local_now = (now or datetime.now(timezone.utc)).astimezone(LIMITS_TIMEZONE)
+    return (local_now.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+def billing_invoice_id(client_id: str, cycle: str, adjustment: int = 0) -> str:
+    """Deterministic id of a client's cycle invoice, or of its nth adjustment invoice"""
+    name = f"{client_id}:{cycle}" if not adjustment else f"{client_id}:{cycle}:adjustment:{adjustment}"
+    return str(uuid.uuid5(BILLING_NAMESPACE, name))
+
+def billing_target_invoice_id(client_id: str, cycle: str, invoices: Dict[str, dict]) -> str:
+    """The first invoice in the client's cycle chain that is not written yet or still open"""
+    adjustment = 0
+    while True:
+        invoice_id = billing_invoice_id(client_id, cycle, adjustment)
+        invoice = invoices.get(invoice_id)
+        if invoice is None or invoice["status"] == "open":
+            return invoice_id
+        adjustment += 1
+
+async def claim_billing_run(cycle: str) -> bool:
+    """Take the cycle's run lock unless another run holds an unexpired lease"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.billing_runs.update_one(
+            {"_id": cycle, "$or": [{"status": "completed"}, {"lease_until": {"$lte": now}}]},
+            {"$set": {
+                "status": "running",
+                "started_at": now,
+                "lease_until": now + timedelta(seconds=BILLING_RUN_LEASE_SECONDS)
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def orphaned_billing_clients(cycle: str) -> set:
+    """Clients with cycle transactions claimed for an invoice that was never written"""
+    # Claims carry billing_cycle, so this is a distinct scan over the cycle's
+    # invoice ids in the (billing_cycle, invoice_id) index, not over its rows
+    claimed_ids = await db.fuel_transactions.distinct("invoice_id", {"billing_cycle": cycle})
+    if not claimed_ids:
+        return set()
+    
+    written = {
+        invoice["id"]
+        for invoice in await db.invoices.find({"id": {"$in": claimed_ids}}, {"_id": 0, "id": 1}).to_list(None)
+    }
+    missing = [invoice_id for invoice_id in claimed_ids if invoice_id not in written]
+    if not missing:
+        return set()
+    
+    return {
+        row["_id"]
+        for row in await db.fuel_transactions.aggregate([
+            {"$match": {"invoice_id": {"$in": missing}}},
+            {"$group": {"_id": "$client_id"}}
+        ]).to_list(None)
+    }
+
+async def bill_client_batch(cycle: str, rows: List[dict], due_date: datetime) -> Dict[str, int]:
+    """Claim each client's transactions for its open cycle invoice and write the invoices"""
+    cycle_invoices = {
+        invoice["id"]: invoice
+        for invoice in await db.invoices.find(
+            {"client_id": {"$in": [row["_id"] for row in rows]}, "billing_cycle": cycle},
+            {"_id": 0, "id": 1, "total_amount": 1, "status": 1}
+        ).to_list(None)
+    }
+    invoice_ids = {row["_id"]: billing_target_invoice_id(row["_id"], cycle, cycle_invoices) for row in rows}
+    clients_by_invoice = {invoice_id: client_id for client_id, invoice_id in invoice_ids.items()}
+    claimed_ids = {row["_id"]: row["ids"] for row in rows}
+    
+    await db.fuel_transactions.bulk_write([
+        UpdateMany(
+            {"id": {"$in": row["ids"]}, "invoice_id": None},
+            {"$set": {"invoice_id": invoice_ids[row["_id"]], "billing_cycle": cycle}}
+        )
+        for row in rows
+    ], ordered=False)
+    
+    # Totals over everything claimed for these invoices, including claims an
+    # interrupted run made before it could write the invoice
+    totals = await db.fuel_transactions.aggregate([
+        {"$match": {"invoice_id": {"$in": list(clients_by_invoice)}}},
+        {"$group": {"_id": "$invoice_id", "ids": {"$push": "$id"}, "amount": {"$sum": "$total_amount"}}}
+    ], allowDiskUse=True).to_list(None)
+    
+    invoice_operations, usage_operations = [], []
+    amended, billed = 0, 0
+    for row in totals:
+        client_id = clients_by_invoice[row["_id"]]
+        amount = round(row["amount"], 2)
+        existing = cycle_invoices.get(row["_id"])
+        if existing:
+            # Only an invoice that is still open may grow; if it was paid or
+            # went overdue since it was read, give the new claims back so the
+            # next run bills them on an adjustment invoice
+            result = await db.invoices.update_one(
+                {"id": row["_id"], "status": "open"},
+                {"$set": {"total_amount": amount, "transactions": row["ids"]}}
+            )
+            if not result.matched_count:
+                await db.fuel_transactions.update_many(
+                    {"id": {"$in": claimed_ids[client_id]}, "invoice_id": row["_id"]},
+                    {"$set": {"invoice_id": None}, "$unset": {"billing_cycle": ""}}
+                )
+                continue
+            amended += 1
+            delta = amount - existing["total_amount"]
+        else:
+            invoice = Invoice(
+                id=row["_id"],
+                client_id=client_id,
+                invoice_number=f"INV-{cycle.replace('-', '')}-{row['_id'][:8].upper()}",
+                total_amount=amount,
+                due_date=due_date,
+                billing_cycle=cycle
+            ).dict(exclude={"total_amount", "transactions"})
+            invoice_operations.append(UpdateOne(
+                {"id": row["_id"]},
+                {"$set": {"total_amount": amount, "transactions": row["ids"]}, "$setOnInsert": invoice},
+                upsert=True
+            ))
+            delta = amount
+        
+        billed += len(row["ids"])
+        # Billed invoices start open, so the change in their total moves the credit ledger
+        if delta:
+            usage_operations.append(UpdateOne({"id": client_id}, {"$inc": {"current_credit_usage": delta}}))
+    
+    if invoice_operations:
+        await db.invoices.bulk_write(invoice_operations, ordered=False)
+    if usage_operations:
+        await db.clients.bulk_write(usage_operations, ordered=False)
+    for client_id in invoice_ids:
+        response_cache.invalidate(client_id)
+        request_credit_evaluation(client_id)
+    
+    return {
+        "invoices": amended + len(invoice_operations),
+        "created": len(invoice_operations),
+        "transactions": billed
+    }
+
+async def run_billing(cycle: str, concurrency: int = 8, batch_size: int = 200) -> Dict[str, Any]:
+    """Invoice every client's uninvoiced completed transactions for a cycle.
+
+    One aggregation groups the cycle's uninvoiced transactions per client;
+    clients are billed in batches of batch_size, with up to concurrency
+    batches in flight. Clients left with claimed but uninvoiced transactions
+    by an interrupted run are billed along with them. A lease in billing_runs
+    keeps two runs of the same cycle from overlapping.
+    """
+    start, end = billing_cycle_window(cycle)
+    if not await claim_billing_run(cycle):
+        raise RuntimeError(f"A billing run for {cycle} is already in progress")
+    orphaned = await orphaned_billing_clients(cycle)
+    
+    started = time.perf_counter()
+    due_date = end + timedelta(days=INVOICE_DUE_DAYS)
+    stats = {"cycle": cycle, "clients": 0, "invoices": 0, "created": 0, "transactions": 0, "errors": 0}
+    slots = asyncio.Semaphore(concurrency)
+    tasks = []
+    
+    async def bill(rows: List[dict]):
+        try:
+            result = await bill_client_batch(cycle, rows, due_date)
+            for key in ("invoices", "created", "transactions"):
+                stats[key] += result[key]
+        except Exception as e:
+            stats["errors"] += len(rows)
+            logger.error(f"Billing run {cycle}: batch of {len(rows)} clients failed: {e}")
+        finally:
+            slots.release()
+    
+    async def dispatch(rows: List[dict]):
+        await slots.acquire()
+        tasks.append(asyncio.create_task(bill(rows)))
+        await db.billing_runs.update_one(
+            {"_id": cycle},
+            {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=BILLING_RUN_LEASE_SECONDS)}}
+        )
+    
+    rows = []
+    pipeline = [
+        {"$match": {
+            "invoice_id": None,
+            "transaction_date": {"$gte": start, "$lt": end},
+            "status": "completed"
+        }},
+        {"$group": {"_id": "$client_id", "ids": {"$push": "$id"}}}
+    ]
+    async for row in db.fuel_transactions.aggregate(pipeline, allowDiskUse=True):
+        stats["clients"] += 1
+        orphaned.discard(row["_id"])
+        rows.append(row)
+        if len(rows) >= batch_size:
+            await dispatch(rows)
+            rows = []
+    # Nothing new to claim for these; bill_client_batch totals what they already claimed
+    for client_id in orphaned:
+        stats["clients"] += 1
+        rows.append({"_id": client_id, "ids": []})
+        if len(rows) >= batch_size:
+            await dispatch(rows)
+            rows = []
+    if rows:
+        await dispatch(rows)
+    await asyncio.gather(*tasks)
+    
+    elapsed = time.perf_counter() - started
+    stats["elapsed_seconds"] = elapsed
+    stats["clients_per_second"] = stats["clients"] / elapsed if elapsed else 0.0
+    await db.billing_runs.update_one(
+        {"_id": cycle},
+        {"$set": {
+            "status": "failed" if stats["errors"] else "completed",
+            "finished_at": datetime.now(timezone.utc),
+            "lease_until": datetime.now(timezone.utc),
+            "stats": stats
+        }}
+    )
+    logger.info(f"Billing run {cycle}: {stats}")
+    return stats
+
+async def link_invoice_transactions(batch_size: int = 500) -> Dict[str, int]:
+    """Set invoice_id on transactions billed by invoices that predate the billing run.
+
+    Older invoices only list their transactions in Invoice.transactions (or,
+    without a list, cover the month they were created in), so the billing run
+    would see those transactions as uninvoiced and bill them again. Each batch
+    of invoices is linked with one unordered bulk write; transactions that
+    already carry an invoice_id are left alone, so the command is safe to rerun.
+    """
+    linked, invoices = 0, 0
+    operations = []
+    cursor = db.invoices.find(
+        {"billing_cycle": None},
+        {"_id": 0, "id": 1, "client_id": 1, "transactions": 1, "created_at": 1}
+    ).batch_size(batch_size)
+    async for invoice in cursor:
+        invoices += 1
+        operations.append(UpdateMany(
+            {**invoice_transactions_query(invoice), "invoice_id": None},
+            {"$set": {"invoice_id": invoice["id"]}}
+        ))
+        if len(operations) >= batch_size:
+            linked += (await db.fuel_transactions.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    
+    if operations:
+        linked += (await db.fuel_transactions.bulk_write(operations, ordered=False)).modified_count
+    
+    logger.info(f"Linked {linked} transactions to {invoices} pre-billing-run invoices")
+    return {"invoices": invoices, "transactions": linked}
+
+# Invoice status functions
+def reminder_when(days: int) -> str:
+    return "amanhã" if days == 1 else f"em {days} dias"
+
+def invoice_reminder_message(client_data: dict, invoice: dict, days: int) -> str:
+    due_date = invoice["due_date"].replace(tzinfo=timezone.utc).astimezone(LIMITS_TIMEZONE)
+    return f"""📄 *LEMBRETE DE VENCIMENTO*
+
+Empresa: {client_data['company_name']}
+Fatura: {invoice['invoice_number']}
+
+💰 Valor: R$ {invoice['total_amount']:,.2f}
+📅 Vencimento: {due_date.strftime('%d/%m/%Y')} ({reminder_when(days)})
+
+Portal do Cliente - Rede de Postos"""
+
+def invoice_reminder_notifications(client_data: dict, invoice: dict, days: int) -> List[dict]:
+    """Outbox documents for one invoice reminder on the client's enabled channels"""
+    message = invoice_reminder_message(client_data, invoice, days)
+    key = f"invoice-reminder:{invoice['id']}:{days}"
+    documents = []
+    if client_data.get("email_notifications", True):
+        email = client_data.get("notification_email") or client_data.get("email")
+        if email:
+            documents.append(notification_document(
+                "email", email, f"{key}:email",
+                message=message, subject=f"Lembrete: fatura {invoice['invoice_number']} vence {reminder_when(days)}"
+            ))
+    if client_data.get("whatsapp_notifications", True):
+        phone = client_data.get("notification_whatsapp") or client_data.get("whatsapp") or client_data.get("phone")
+        if phone:
+            documents.append(notification_document("whatsapp", phone, f"{key}:whatsapp", message=message))
+    return documents
+
+async def send_invoice_reminders(days: int, batch_size: int = 500) -> Dict[str, int]:
+    """Queue reminders for open invoices due on the local day `days` from today.
+
+    Invoices are marked in reminders_sent once queued, so each run only reads
+    invoices that still need this reminder; the outbox idempotency keys cover
+    a crash between queueing and marking.
+    """
+    today = datetime.now(LIMITS_TIMEZONE).date() + timedelta(days=days)
+    start = datetime(today.year, today.month, today.day, tzinfo=LIMITS_TIMEZONE)
+    end = start + timedelta(days=1)
+    stats = {"invoices": 0, "notifications": 0}
+    
+    cursor = db.invoices.find(
+        {
+            "status": "open",
+            "due_date": {"$gte": start.astimezone(timezone.utc), "$lt": end.astimezone(timezone.utc)},
+            "reminders_sent": {"$ne": days}
+        },
+        {"_id": 0, "id": 1, "client_id": 1, "invoice_number": 1, "total_amount": 1, "due_date": 1}
+    ).batch_size(batch_size)
+    
+    async def flush(invoices: List[dict]):
+        clients = {
+            client_doc["id"]: client_doc
+            for client_doc in await db.clients.find(
+                {"id": {"$in": list({invoice["client_id"] for invoice in invoices})}, "is_active": True},
+                CREDIT_ALERT_PROJECTION
+            ).to_list(None)
+        }
+        documents = []
+        for invoice in invoices:
+            if invoice["client_id"] in clients:
+                documents.extend(invoice_reminder_notifications(clients[invoice["client_id"]], invoice, days))
+        stats["notifications"] += await enqueue_notifications(documents)
+        await db.invoices.update_many(
+            {"id": {"$in": [invoice["id"] for invoice in invoices]}},
+            {"$addToSet": {"reminders_sent": days}}
+        )
+        stats["invoices"] += len(invoices)
+    
+    batch = []
+    async for invoice in cursor:
+        batch.append(invoice)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    return stats
+
+async def update_invoice_statuses(batch_size: int = 500) -> Dict[str, Any]:
+    """Flip open invoices past their due date to overdue, then queue due-date reminders.
+
+    Both steps read only open invoices through the (status, due_date) index,
+    so paid history does not add to the cost of a run. Overdue invoices stay
+    in credit usage, so the ledger is untouched, but the affected clients'
+    cached invoice and dashboard responses are dropped.
+    """
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    past_due = {"status": "open", "due_date": {"$lt": now}}
+    client_ids = await db.invoices.distinct("client_id", past_due)
+    result = await db.invoices.update_many(past_due, {"$set": {"status": "overdue", "overdue_at": now}})
+    for client_id in client_ids:
+        response_cache.invalidate(client_id)
+    stats = {"overdue": result.modified_count, "reminded_invoices": 0, "notifications": 0}
+    
+    for days in INVOICE_REMINDER_DAYS:
+        reminders = await send_invoice_reminders(days, batch_size)
+        stats["reminded_invoices"] += reminders["invoices"]
+        stats["notifications"] += reminders["notifications"]
+    
+    stats["elapsed_seconds"] = time.perf_counter() - started
+    if stats["overdue"] or stats["reminded_invoices"]:
+        logger.info(f"Invoice status run: {stats}")
+    return stats
 
 # Invoices Routes
-@api_router.get("/invoices")
-async def get_invoices(current_user: dict = Depends(get_current_user)):
-    invoices = await db.invoices.find({"client_id": current_user["id"]}).sort("created_at", -1).to_list(100)
+def invoice_transactions_query(invoice: dict) -> dict:
+    """Query for the transactions billed on an invoice"""
+    if invoice.get("transactions"):
+        return {"client_id": invoice["client_id"], "id": {"$in": invoice["transactions"]}}
     
-    # Check credit alerts after invoice operations
-    await check_credit_alerts(current_user["id"], current_user)
+    # If no specific transactions linked, get transactions by date range (fallback)
+    invoice_date = invoice["created_at"]
+    start_date = invoice_date.replace(day=1)  # First day of the month
+    end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)  # Last day of the month
+    return {
+        "client_id": invoice["client_id"],
+        "transaction_date": {"$gte": start_date, "$lte": end_date}
+    }
+
+@api_router.get("/invoices", response_model=List[Invoice])
+async def get_invoices(current_user: dict = Depends(get_current_user)):
+    invoices = await db.invoices.find(
+        {"client_id": current_user["id"]}, INVOICE_PROJECTION
+    ).sort("created_at", -1).to_list(100)
     
-    return [Invoice(**invoice) for invoice in invoices]
+    return ORJSONResponse(invoices)
 
-@api_router.get("/invoices/open")
+@api_router.get("/invoices/open", response_model=List[Invoice])
 async def get_open_invoices(current_user: dict = Depends(get_current_user)):
     invoices = await db.invoices.find({
         "client_id": current_user["id"],
         "status": {"$in": ["open", "overdue"]}
-    }).sort("due_date", 1).to_list(100)
-    
-    # Check credit alerts
-    await check_credit_alerts(current_user["id"], current_user)
+    }, INVOICE_PROJECTION).sort("due_date", 1).to_list(100)
     
-    return [Invoice(**invoice) for invoice in invoices]
+    return ORJSONResponse(invoices)
+
+INVOICE_LINES_PAGE_SIZE = 100
+INVOICE_LINES_MAX_PAGE_SIZE = 500
+
+# Only the fields the invoice details view displays
+INVOICE_LINE_PROJECTION = {
+    "_id": 0, "id": 1, "license_plate": 1, "fuel_type": 1, "liters": 1, "price_per_liter": 1,
+    "total_amount": 1, "station_name": 1, "transaction_date": 1, "status": 1
+}
+
+def invoice_lines_facet(offset: int, limit: int) -> dict:
+    """Totals over all of an invoice's transactions plus one page of line items"""
+    return {"$facet": {
+        "totals": [
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "liters": {"$sum": "$liters"},
+                "amount": {"$sum": "$total_amount"}
+            }}
+        ],
+        "items": [
+            {"$sort": {"transaction_date": -1, "id": -1}},
+            {"$skip": offset},
+            {"$limit": limit},
+            {"$project": INVOICE_LINE_PROJECTION}
+        ]
+    }}
 
 @api_router.get("/invoices/{invoice_id}/details")
-async def get_invoice_details(invoice_id: str, current_user: dict = Depends(get_current_user)):
-    """Get detailed invoice information including all transactions"""
-    invoice = await db.invoices.find_one({"id": invoice_id, "client_id": current_user["id"]})
-    
+async def get_invoice_details(
+    invoice_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(INVOICE_LINES_PAGE_SIZE, ge=1, le=INVOICE_LINES_MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get invoice information, transaction totals and one page of its transactions"""
+    # Two round trips that work on every backend: the invoice, then totals
+    # and the requested page of its transactions computed by MongoDB
+    invoice = await db.invoices.find_one(
+        {"id": invoice_id, "client_id": current_user["id"]},
+        {"_id": 0, "id": 1, "client_id": 1, "invoice_number": 1, "total_amount": 1,
+         "due_date": 1, "status": 1, "created_at": 1, "transactions": 1}
+    )
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # Get transactions for this invoice
-    transactions = []
-    if invoice.get("transactions"):
-        transactions = await db.fuel_transactions.find({
-            "id": {"$in": invoice["transactions"]}
-        }).sort("transaction_date", -1).to_list(None)
-    else:
-        # If no specific transactions linked, get transactions by date range (fallback)
-        invoice_date = invoice["created_at"]
-        start_date = invoice_date.replace(day=1)  # First day of the month
-        end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)  # Last day of the month
-        
-        transactions = await db.fuel_transactions.find({
-            "client_id": current_user["id"],
-            "transaction_date": {"$gte": start_date, "$lte": end_date}
-        }).sort("transaction_date", -1).to_list(None)
+    # Legacy invoices without linked transactions cover their month
+    query = invoice_transactions_query(invoice)
+    invoice.pop("transactions", None)
+    results = await db.fuel_transactions.aggregate([
+        {"$match": query},
+        invoice_lines_facet(offset, limit)
+    ]).to_list(1)
+    lines = results[0] if results else {"totals": [], "items": []}
     
+    totals = lines["totals"][0] if lines["totals"] else {"count": 0, "liters": 0, "amount": 0}
     return {
-        "invoice": Invoice(**invoice),
-        "transactions": [FuelTransaction(**t) for t in transactions],
-        "transaction_count": len(transactions),
-        "total_liters": sum(t["liters"] for t in transactions),
-        "total_amount": sum(t["total_amount"] for t in transactions)
+        "invoice": invoice,
+        "transactions": lines["items"],
+        "transaction_count": totals["count"],
+        "total_liters": totals["liters"],
+        "total_amount": totals["amount"],
+        "offset": offset,
+        "limit": limit
     }
 
+INVOICE_STATUSES = ["open", "paid", "overdue"]
+
+async def verify_billing_key(x_billing_key: str = Header(default="")):
+    if not BILLING_API_KEY:
+        raise HTTPException(status_code=503, detail="Billing updates are not configured")
+    if x_billing_key != BILLING_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid billing key")
+
+@api_router.post("/invoices/{invoice_id}/status", dependencies=[Depends(verify_billing_key)])
+async def update_invoice_status(invoice_id: str, update: InvoiceStatusUpdate):
+    """Record a payment (or reopen an invoice) from the billing back office"""
+    if update.status not in INVOICE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Use one of: {', '.join(INVOICE_STATUSES)}")
+    
+    invoice = await set_invoice_status(invoice_id, update.status)
+    if invoice is None:
+        # Either unknown or already in that status; repeating an update is a no-op
+        invoice = await db.invoices.find_one({"id": invoice_id}, INVOICE_PROJECTION)
+        if invoice is None:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    invoice.pop("_id", None)
+    return ORJSONResponse(invoice)
+
 @api_router.get("/credit-status")
-async def get_credit_status(current_user: dict = Depends(get_current_user)):
+async def get_credit_status(request: Request, current_user: dict = Depends(get_current_user)):
     """Get current credit status and limits"""
-    credit_limit = current_user.get("credit_limit", 10000.0)
-    current_usage = await calculate_client_credit_usage(current_user["id"])
-    available_credit = max(0, credit_limit - current_usage)
-    usage_percentage = (current_usage / credit_limit * 100) if credit_limit > 0 else 0
+    async def compute():
+        credit_limit = current_user.get("credit_limit", 10000.0)
+        current_usage = await calculate_client_credit_usage(current_user["id"])
+        available_credit = max(0, credit_limit - current_usage)
+        usage_percentage = (current_usage / credit_limit * 100) if credit_limit > 0 else 0
+        
+        return {
+            "credit_limit": credit_limit,
+            "current_usage": current_usage,
+            "available_credit": available_credit,
+            "usage_percentage": usage_percentage,
+            "status": "critical" if usage_percentage >= 100 else "warning" if usage_percentage >= 90 else "normal"
+        }
     
-    return {
-        "credit_limit": credit_limit,
-        "current_usage": current_usage,
-        "available_credit": available_credit,
-        "usage_percentage": usage_percentage,
-        "status": "critical" if usage_percentage >= 100 else "warning" if usage_percentage >= 90 else "normal"
-    }
+    return await cached_response(request, current_user["id"], "credit-status", compute)
 
 # Dashboard Routes
-@api_router.post("/dashboard/stats")
-async def get_dashboard_stats(filter_data: DashboardFilter, current_user: dict = Depends(get_current_user)):
-    """Get dashboard statistics with time filters"""
+async def compute_dashboard_stats(filter_data: DashboardFilter, current_user: dict) -> dict:
+    """Dashboard statistics for the filter's date range"""
     # Calculate date range based on filter
     now = datetime.now(timezone.utc)
     
@@ -1027,60 +3684,87 @@ async def get_dashboard_stats(filter_data: DashboardFilter, current_user: dict =
     # Get basic stats
     vehicles_count = await db.vehicles.count_documents({"client_id": current_user["id"], "is_active": True})
     
-    # Get transactions for the period
-    period_transactions = await db.fuel_transactions.find({
-        "client_id": current_user["id"],
-        "transaction_date": {"$gte": start_date, "$lte": end_date}
-    }).to_list(None)
+    # Period totals and fuel breakdown merged from the daily rollups
+    fuel_summary = await summarize_period_transactions(current_user["id"], start_date, end_date)
     
-    total_period_amount = sum(t["total_amount"] for t in period_transactions)
-    total_period_liters = sum(t["liters"] for t in period_transactions)
+    recent_transactions = await db.fuel_transactions.find(
+        {
+            "client_id": current_user["id"],
+            "transaction_date": {"$gte": start_date, "$lte": end_date}
+        },
+        TRANSACTION_PROJECTION
+    ).sort("transaction_date", -1).to_list(10)
     
     # Open invoices
-    open_invoices = await db.invoices.find({
-        "client_id": current_user["id"],
-        "status": {"$in": ["open", "overdue"]}
-    }).to_list(None)
-    
-    total_open_amount = sum(inv["total_amount"] for inv in open_invoices)
+    open_totals = await db.invoices.aggregate([
+        {"$match": {
+            "client_id": current_user["id"],
+            "status": {"$in": ["open", "overdue"]}
+        }},
+        {"$group": {"_id": None, "amount": {"$sum": "$total_amount"}, "count": {"$sum": 1}}}
+    ]).to_list(1)
+    open_summary = open_totals[0] if open_totals else {"amount": 0, "count": 0}
     
     # Fuel type breakdown for the period
-    fuel_breakdown = {}
-    for transaction in period_transactions:
-        fuel_type = transaction["fuel_type"]
-        if fuel_type not in fuel_breakdown:
-            fuel_breakdown[fuel_type] = {"liters": 0, "amount": 0}
-        fuel_breakdown[fuel_type]["liters"] += transaction["liters"]
-        fuel_breakdown[fuel_type]["amount"] += transaction["total_amount"]
+    fuel_breakdown = {
+        fuel_type: {"liters": totals["liters"], "amount": totals["amount"]}
+        for fuel_type, totals in fuel_summary.items()
+    }
     
     return {
         "period": filter_data.period,
         "start_date": start_date.isoformat(),
         "end_date": end_date.isoformat(),
         "vehicles_count": vehicles_count,
-        "period_total_amount": total_period_amount,
-        "period_total_liters": total_period_liters,
-        "open_invoices_count": len(open_invoices),
-        "total_open_amount": total_open_amount,
+        "period_total_amount": sum(f["amount"] for f in fuel_summary.values()),
+        "period_total_liters": sum(f["liters"] for f in fuel_summary.values()),
+        "open_invoices_count": open_summary["count"],
+        "total_open_amount": open_summary["amount"],
         "fuel_breakdown": fuel_breakdown,
-        "recent_transactions": [FuelTransaction(**t).dict() for t in period_transactions[-10:]] if period_transactions else [],
-        "total_transactions": len(period_transactions)
+        "recent_transactions": recent_transactions,
+        "total_transactions": sum(f["count"] for f in fuel_summary.values())
     }
 
+def dashboard_cache_key(filter_data: DashboardFilter) -> str:
+    return "dashboard:" + ":".join([
+        filter_data.period,
+        filter_data.start_date.isoformat() if filter_data.start_date else "",
+        filter_data.end_date.isoformat() if filter_data.end_date else ""
+    ])
+
+@api_router.post("/dashboard/stats")
+async def get_dashboard_stats(filter_data: DashboardFilter, request: Request, current_user: dict = Depends(get_current_user)):
+    """Get dashboard statistics with time filters"""
+    return await cached_response(
+        request, current_user["id"], dashboard_cache_key(filter_data),
+        lambda: compute_dashboard_stats(filter_data, current_user)
+    )
+
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats_get(current_user: dict = Depends(get_current_user)):
+async def get_dashboard_stats_get(request: Request, current_user: dict = Depends(get_current_user)):
     """Get dashboard statistics - default monthly view"""
     filter_data = DashboardFilter(period="monthly")
-    return await get_dashboard_stats(filter_data, current_user)
+    return await get_dashboard_stats(filter_data, request, current_user)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Hit rates of this process's in-memory caches"""
+    return {
+        "responses": response_cache.stats(),
+        "clients": client_cache.stats()
+    }
 
 # Test data creation (remove in production)
 @api_router.post("/create-test-data")
 async def create_test_data():
     # Clear existing test data first
     await db.clients.delete_many({"cnpj": "12345678901234"})
+    client_cache.invalidate("12345678901234")
+    response_cache.clear()
     await db.vehicles.delete_many({"license_plate": {"$in": ["ABC1234", "DEF5678", "GHI9012", "JKL3456", "MNO7890"]}})
     await db.limits.delete_many({})
     await db.fuel_transactions.delete_many({})
+    await db.fuel_daily_rollups.delete_many({})
     await db.invoices.delete_many({})
     await db.credit_alerts.delete_many({})
     
@@ -1116,7 +3800,7 @@ async def create_test_data():
                 label="Operacional"
             )
         ],
-        password_hash=get_password_hash("123456"),
+        password_hash=await get_password_hash_async("123456"),
         credit_limit=15000.0,
         current_credit_usage=0.0
     )
@@ -1242,6 +3926,7 @@ async def create_test_data():
         {"id": "station_004", "name": "Posto Monte Carlo Leste"}
     ]
     
+    test_transactions = []
     for i in range(50):  # Increased number of transactions
         vehicle = vehicles[random.randint(0, 4)]
         fuel_type = vehicle.fuel_type
@@ -1262,6 +3947,9 @@ async def create_test_data():
         transaction.total_amount = transaction.liters * transaction.price_per_liter
         await db.fuel_transactions.insert_one(transaction.dict())
         transaction_ids.append(transaction.id)
+        test_transactions.append(transaction.dict())
+    
+    await apply_transaction_rollups(test_transactions)
     
     # Create multiple test invoices with more variety
     invoices = [
@@ -1309,6 +3997,11 @@ async def create_test_data():
     
     for invoice in invoices:
         await db.invoices.insert_one(invoice.dict())
+        await db.fuel_transactions.update_many(
+            {"id": {"$in": invoice.transactions}},
+            {"$set": {"invoice_id": invoice.id}}
+        )
+        await record_invoice_created(invoice.dict())
     
     # Create test credit alert (90% usage)
     alert = CreditAlert(
@@ -1338,6 +4031,69 @@ async def dev_login():
         "requires_2fa": False
     }
 
+def render_metrics(outbox: Optional[Dict[str, Any]] = None) -> str:
+    lines = []
+    for metric in (
+        http_requests_total, http_request_seconds, http_request_db_seconds, http_request_db_commands,
+        mongo_command_seconds, mongo_command_failures_total, mongo_checkout_seconds, mongo_checkout_failures_total
+    ):
+        lines += metric.render()
+    lines += mongo_pool_metrics.render()
+    for name, cache in (("response", response_cache), ("client", client_cache)):
+        stats = cache.stats()
+        lines += [
+            f"# TYPE portal_{name}_cache_hits_total counter",
+            f"portal_{name}_cache_hits_total {stats['hits']}",
+            f"# TYPE portal_{name}_cache_misses_total counter",
+            f"portal_{name}_cache_misses_total {stats['misses']}",
+        ]
+    lines += render_password_pool_metrics(password_pool.stats())
+    if outbox:
+        lines += render_outbox_metrics(outbox)
+    return "\n".join(lines) + "\n"
+
+def render_outbox_metrics(outbox: Dict[str, Any]) -> List[str]:
+    lines = ["# TYPE portal_notification_outbox_depth gauge"]
+    lines += [
+        f'portal_notification_outbox_depth{{status="{status}"}} {count}'
+        for status, count in outbox["depth"].items()
+    ]
+    lines += [
+        "# TYPE portal_notification_outbox_oldest_pending_seconds gauge",
+        f"portal_notification_outbox_oldest_pending_seconds {outbox['oldest_pending_age_seconds']}",
+    ]
+    return lines
+
+def render_password_pool_metrics(stats: Dict[str, Any]) -> List[str]:
+    lines = [
+        "# TYPE portal_password_hash_workers gauge",
+        f"portal_password_hash_workers {stats['workers']}",
+        "# TYPE portal_password_hash_max_in_flight gauge",
+        f"portal_password_hash_max_in_flight {stats['max_in_flight']}",
+        "# TYPE portal_password_hash_in_flight gauge",
+        f"portal_password_hash_in_flight {stats['in_flight']}",
+        "# TYPE portal_password_hash_completed_total counter",
+        f"portal_password_hash_completed_total {stats['completed']}",
+    ]
+    # Quantiles over the last 1000 operations; omitted until there is a sample
+    for name in ("queue_seconds", "run_seconds"):
+        lines.append(f"# TYPE portal_password_hash_{name} summary")
+        for quantile, key in (("0.5", "p50"), ("0.99", "p99")):
+            if stats[name][key] is not None:
+                lines.append(f'portal_password_hash_{name}{{quantile="{quantile}"}} {stats[name][key]}')
+    return lines
+
+# Prometheus scrape endpoint; served outside /api so it is not routed publicly
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    try:
+        outbox = await get_outbox_backlog()
+    except Exception as e:
+        # The in-process metrics are still worth serving when Mongo is unreachable
+        logger.error(f"Could not read outbox backlog for /metrics: {e}")
+        outbox = None
+    return Response(render_metrics(outbox), media_type="text/plain; version=0.0.4")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -1347,7 +4103,9 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -1356,6 +4114,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    try:
+        report = await ensure_indexes()
+        for collection_name, changes in report.items():
+            if changes["created"] or changes["rebuilt"]:
+                logger.info(f"Indexes on {collection_name}: {changes}")
+    except Exception as e:
+        logger.error(f"Error ensuring indexes: {e}")
+
+background_tasks: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def start_background_workers():
+    start_notification_workers()
+    background_tasks.append(asyncio.create_task(credit_evaluator()))
+    if CREDIT_RECONCILE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            # Repair any drift left by a previous process before the first interval passes
+            run_periodically(
+                "reconcile_credit_usage", CREDIT_RECONCILE_INTERVAL, reconcile_credit_usage, run_at_start=True
+            )
+        ))
+    if LIMIT_RESET_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically("reset_expired_limits", LIMIT_RESET_INTERVAL, reset_expired_limits)
+        ))
+    if CREDIT_ALERT_SWEEP_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically("sweep_credit_alerts", CREDIT_ALERT_SWEEP_INTERVAL, sweep_credit_alerts)
+        ))
+    if INVOICE_STATUS_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically("update_invoice_statuses", INVOICE_STATUS_INTERVAL, update_invoice_statuses)
+        ))
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await stop_notification_workers()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    if zapi_http_client is not None:
+        await zapi_http_client.aclose()
+    await smtp_pool.close()
+    password_pool.executor.shutdown(wait=False)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for the list endpoints' serialization path.
+
+Compares rebuilding every Mongo document as a pydantic model and encoding it
+with FastAPI's default JSON response against returning the projected
+documents directly through ORJSONResponse, as the read paths now do.
+
+    python bench_serialization.py --rows 200 --repeat 200
+
+No database is needed; documents are generated in memory with the same
+shape the portal stores.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "portal")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+import server  # noqa: E402
+
+
+def make_transactions(count):
+    now = datetime.utcnow().replace(microsecond=0)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "client_id": "client",
+            "vehicle_id": str(uuid.uuid4()),
+            "license_plate": "ABC1234",
+            "fuel_type": random.choice(["gasoline", "ethanol", "diesel"]),
+            "liters": round(random.uniform(10, 80), 2),
+            "price_per_liter": 5.89,
+            "total_amount": round(random.uniform(60, 480), 2),
+            "station_id": "station_001",
+            "station_name": "Posto Shell Centro",
+            "transaction_date": now - timedelta(minutes=index),
+            "status": "completed"
+        }
+        for index in range(count)
+    ]
+
+
+def make_invoices(count):
+    now = datetime.utcnow().replace(microsecond=0)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "client_id": "client",
+            "invoice_number": f"INV-{index:06d}",
+            "total_amount": round(random.uniform(500, 5000), 2),
+            "due_date": now + timedelta(days=index),
+            "status": "open",
+            "transactions": [str(uuid.uuid4()) for _ in range(20)],
+            "created_at": now
+        }
+        for index in range(count)
+    ]
+
+
+def model_path(model, documents):
+    return JSONResponse(jsonable_encoder([model(**document) for document in documents])).body
+
+
+def lean_path(model, documents):
+    return ORJSONResponse(documents).body
+
+
+def timed(function, model, documents, repeat):
+    function(model, documents)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(model, documents)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = [
+        ("transactions", server.FuelTransaction, make_transactions(args.rows)),
+        ("invoices", server.Invoice, make_invoices(args.rows)),
+    ]
+    for name, model, documents in cases:
+        before = timed(model_path, model, documents, args.repeat)
+        after = timed(lean_path, model, documents, args.repeat)
+        print(
+            f"{name:<14} rows={args.rows:<5} "
+            f"model+json={before * 1000:8.3f}ms  orjson={after * 1000:8.3f}ms  "
+            f"speedup={before / after:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Local stand-ins for the portal's outbound providers, for manual and load testing.
+
+Fake Z-API (WhatsApp):
+    uvicorn fake_providers:zapi_app --port 8081
+    ZAPI_BASE_URL=http://localhost:8081 ZAPI_TOKEN=test ZAPI_INSTANCE_ID=test
+
+Behaviour can be tuned with environment variables:
+    FAKE_ZAPI_LATENCY       seconds to wait before answering (default 0.05)
+    FAKE_ZAPI_FAILURE_RATE  fraction of requests answered with HTTP 503 (default 0)
+
+Fake SMTP server (requires ``pip install aiosmtpd``):
+    python fake_providers.py smtp --port 8025
+    SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_START_TLS=false
+    EMAIL_ADDRESS=portal@example.com EMAIL_PASSWORD=anything
+
+The SMTP stand-in accepts any login and prints one line per message and
+per connection, which makes connection reuse by the portal's pool visible.
+"""
+import argparse
+import asyncio
+import os
+import random
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FAKE_ZAPI_LATENCY = float(os.environ.get('FAKE_ZAPI_LATENCY', 0.05))
+FAKE_ZAPI_FAILURE_RATE = float(os.environ.get('FAKE_ZAPI_FAILURE_RATE', 0))
+
+zapi_app = FastAPI(title="Fake Z-API")
+zapi_app.state.messages = []
+
+
+@zapi_app.post("/instances/{instance_id}/token/{token}/send-text")
+async def fake_send_text(instance_id: str, token: str, request: Request):
+    payload = await request.json()
+    await asyncio.sleep(FAKE_ZAPI_LATENCY)
+
+    if random.random() < FAKE_ZAPI_FAILURE_RATE:
+        return JSONResponse(status_code=503, content={"error": "Service unavailable"})
+
+    if not payload.get("phone") or not payload.get("message"):
+        return JSONResponse(status_code=400, content={"error": "phone and message are required"})
+
+    message_id = str(uuid.uuid4())
+    zapi_app.state.messages.append({
+        "id": message_id,
+        "instance_id": instance_id,
+        "client_token": request.headers.get("Client-Token"),
+        **payload
+    })
+    return {"zaapId": message_id, "messageId": message_id, "id": message_id}
+
+
+@zapi_app.get("/_messages")
+async def fake_messages():
+    """Messages received so far, newest last"""
+    return zapi_app.state.messages
+
+
+@zapi_app.delete("/_messages")
+async def fake_clear_messages():
+    zapi_app.state.messages.clear()
+    return {"cleared": True}
+
+
+class FakeSMTPHandler:
+    """aiosmtpd handler that counts connections and messages instead of delivering"""
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        print(f"connection #{self.connections} from {session.peer}")
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        print(f"message #{len(self.messages)} from {envelope.mail_from} to {', '.join(envelope.rcpt_tos)}")
+        return "250 Message accepted for delivery"
+
+
+def run_fake_smtp(host: str, port: int):
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+
+    controller = Controller(
+        FakeSMTPHandler(),
+        hostname=host,
+        port=port,
+        authenticator=lambda server, session, envelope, mechanism, auth_data: AuthResult(success=True),
+        auth_require_tls=False
+    )
+    controller.start()
+    print(f"Fake SMTP listening on {host}:{port} (Ctrl+C to stop)")
+    try:
+        asyncio.run(asyncio.Event().wait())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake outbound provider")
+    parser.add_argument("provider", choices=["zapi", "smtp"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+
+    if args.provider == "smtp":
+        run_fake_smtp(args.host, args.port or 8025)
+    else:
+        import uvicorn
+        uvicorn.run(zapi_app, host=args.host, port=args.port or 8081)
@@ -88,6 +88,21 @@ const Invoices = () => {
     }
   };
 
+  const fetchMoreInvoiceLines = async () => {
+    try {
+      const response = await axios.get(`${API}/invoices/${invoiceDetails.invoice.id}/details`, {
+        params: { offset: invoiceDetails.transactions.length }
+      });
+      setInvoiceDetails({
+        ...response.data,
+        transactions: [...invoiceDetails.transactions, ...response.data.transactions]
+      });
+    } catch (error) {
+      toast.error('Erro ao carregar detalhes da fatura');
+      console.error('Error fetching invoice details:', error);
+    }
+  };
+
   const handleViewDetails = async (invoice) => {
     setSelectedInvoice(invoice);
     setShowDetails(true);
@@ -540,7 +555,7 @@ const Invoices = () => {
               {/* Transactions List */}
               <Card>
                 <CardHeader>
-                  <CardTitle className="text-lg">Cupons de Abastecimento ({invoiceDetails.transactions.length})</CardTitle>
+                  <CardTitle className="text-lg">Cupons de Abastecimento ({invoiceDetails.transaction_count})</CardTitle>
                 </CardHeader>
                 <CardContent>
                   <div className="space-y-3 max-h-96 overflow-y-auto">
@@ -579,6 +594,13 @@ const Invoices = () => {
                         </div>
                       </div>
                     ))}
+                    {invoiceDetails.transactions.length < invoiceDetails.transaction_count && (
+                      <div className="flex justify-center pt-2">
+                        <Button onClick={fetchMoreInvoiceLines} variant="outline" size="sm">
+                          Carregar mais cupons
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 </CardContent>
               </Card>
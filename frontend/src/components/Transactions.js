@@ -42,27 +42,81 @@ const Transactions = () => {
   const [filterFuel, setFilterFuel] = useState('all');
   const [dateRange, setDateRange] = useState({ from: null, to: null });
   const [showCalendar, setShowCalendar] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
-    fetchData();
+    fetchVehicles();
   }, []);
 
-  const fetchData = async () => {
+  useEffect(() => {
+    fetchTransactions();
+  }, [filterVehicle, filterFuel, dateRange]);
+
+  const fetchVehicles = async () => {
+    try {
+      const response = await axios.get(`${API}/vehicles`);
+      setVehicles(response.data);
+    } catch (error) {
+      console.error('Error fetching vehicles:', error);
+    }
+  };
+
+  const buildTransactionParams = (cursor) => {
+    const params = {};
+    if (filterVehicle !== 'all') params.vehicle_id = filterVehicle;
+    if (filterFuel !== 'all') params.fuel_type = filterFuel;
+    if (dateRange?.from) params.start_date = dateRange.from.toISOString();
+    if (dateRange?.to) {
+      const endOfDay = new Date(dateRange.to);
+      endOfDay.setHours(23, 59, 59, 999);
+      params.end_date = endOfDay.toISOString();
+    }
+    if (cursor) params.cursor = cursor;
+    return params;
+  };
+
+  const fetchTransactions = async (cursor = null) => {
+    if (cursor) {
+      setLoadingMore(true);
+    } else {
+      setLoading(true);
+    }
     try {
-      const [transactionsResponse, vehiclesResponse] = await Promise.all([
-        axios.get(`${API}/transactions`),
-        axios.get(`${API}/vehicles`)
-      ]);
-      setTransactions(transactionsResponse.data);
-      setVehicles(vehiclesResponse.data);
+      const response = await axios.get(`${API}/transactions`, { params: buildTransactionParams(cursor) });
+      setTransactions(cursor ? [...transactions, ...response.data] : response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Erro ao carregar dados');
       console.error('Error fetching data:', error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
+  const exportTransactions = async () => {
+    try {
+      const params = buildTransactionParams(null);
+      params.format = 'csv';
+      const response = await axios.get(`${API}/transactions/export`, { params, responseType: 'blob' });
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = 'transacoes.csv';
+      link.click();
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      toast.error('Erro ao exportar transações');
+      console.error('Error exporting transactions:', error);
+    }
+  };
+
+  const fetchData = () => {
+    fetchVehicles();
+    fetchTransactions();
+  };
+
   const formatCurrency = (value) => {
     return new Intl.NumberFormat('pt-BR', {
       style: 'currency',
@@ -85,26 +139,10 @@ const Transactions = () => {
     return vehicle ? `${vehicle.license_plate} - ${vehicle.model}` : 'Veículo não encontrado';
   };
 
+  // Vehicle, fuel and date filters are applied by the API; only the text search is local
   const filteredTransactions = transactions.filter(transaction => {
-    const matchesSearch = transaction.license_plate.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         transaction.station_name.toLowerCase().includes(searchTerm.toLowerCase());
-    
-    const matchesVehicle = filterVehicle === 'all' || transaction.vehicle_id === filterVehicle;
-    const matchesFuel = filterFuel === 'all' || transaction.fuel_type === filterFuel;
-    
-    let matchesDate = true;
-    if (dateRange.from || dateRange.to) {
-      const transactionDate = new Date(transaction.transaction_date);
-      if (dateRange.from && dateRange.to) {
-        matchesDate = transactionDate >= dateRange.from && transactionDate <= dateRange.to;
-      } else if (dateRange.from) {
-        matchesDate = transactionDate >= dateRange.from;
-      } else if (dateRange.to) {
-        matchesDate = transactionDate <= dateRange.to;
-      }
-    }
-    
-    return matchesSearch && matchesVehicle && matchesFuel && matchesDate;
+    return transaction.license_plate.toLowerCase().includes(searchTerm.toLowerCase()) ||
+           transaction.station_name.toLowerCase().includes(searchTerm.toLowerCase());
   });
 
   const totalAmount = filteredTransactions.reduce((sum, t) => sum + t.total_amount, 0);
@@ -149,7 +187,7 @@ const Transactions = () => {
             <RefreshCw className="w-4 h-4" />
             Atualizar
           </Button>
-          <Button variant="outline" className="flex items-center gap-2">
+          <Button onClick={exportTransactions} variant="outline" className="flex items-center gap-2">
             <Download className="w-4 h-4" />
             Exportar
           </Button>
@@ -348,6 +386,19 @@ const Transactions = () => {
               </CardContent>
             </Card>
           ))}
+          {nextCursor && (
+            <div className="flex justify-center">
+              <Button
+                onClick={() => fetchTransactions(nextCursor)}
+                variant="outline"
+                disabled={loadingMore}
+                className="flex items-center gap-2"
+              >
+                <RefreshCw className={`w-4 h-4 ${loadingMore ? 'animate-spin' : ''}`} />
+                Carregar mais
+              </Button>
+            </div>
+          )}
         </div>
       ) : (
         <Card>
@@ -0,0 +1,585 @@
+"""
+Load benchmark for the Fuel Station Client Portal API.
+
+Scenarios run against a server seeded with /create-test-data, or with the
+synthetic fleet written by ``--seed`` (see below).
+
+Scenario ``login-storm`` measures how a burst of logins (bcrypt work) affects
+the latency of other endpoints: it first probes a cheap authenticated
+endpoint on its own, then probes it again while login workers hammer
+/auth/login-dev, and prints p50/p95/p99 for both phases.
+
+    python load_test.py --base-url http://localhost:8001/api login-storm --concurrency 50
+
+Scenario ``authorize`` simulates concurrent pumps calling /fuel/authorize
+for the test fleet and reports latency plus authorized/denied counts.
+
+    python load_test.py authorize --concurrency 100
+
+Scenarios ``dashboard``, ``invoice-details`` and ``export`` drive the read
+paths clients hit most: the dashboard and credit widgets, invoice details
+pages and CSV downloads. Each endpoint gets its own throughput and
+p50/p95/p99 line.
+
+Seeding and a self-hosted server
+--------------------------------
+``--seed`` writes a synthetic fleet into the database named by MONGO_URL /
+DB_NAME before the scenario runs (``seed`` alone only seeds). Volumes are set
+with --seed-clients, --seed-vehicles (per client), --seed-transactions and
+--seed-months; the defaults match production scale (1k clients, 50k
+vehicles, 10M transactions), so pass smaller numbers for quick runs.
+Seeded clients log in with CNPJ 90000000000000 + n and the test password;
+``--clients N`` spreads the load over the first N of them.
+
+``--serve`` starts the app in a background thread of this process, and
+``--in-memory`` backs it with mongomock-motor instead of a real MongoDB
+(``pip install mongomock-motor``). The in-memory store is single-threaded, so
+use it to exercise the harness, not for numbers worth comparing. It starts
+empty, so only the scenarios that run on ``--seed`` data (dashboard,
+invoice-details, export) are accepted; login-storm and authorize need the
+/create-test-data client and are refused.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=portal_bench \\
+        python load_test.py --serve --seed --seed-clients 50 --seed-transactions 200000 \\
+        --clients 50 dashboard --concurrency 20
+
+Baselines
+---------
+``--save-baseline FILE`` stores the per-endpoint results as JSON and
+``--baseline FILE`` compares against a stored run: an endpoint whose p95
+grew, or whose throughput fell, by more than --tolerance (default 25%) is
+flagged as a regression and the exit status is 1. Saved baselines record
+the backend they were taken on ("mongodb", or "in-memory" for --in-memory),
+and a run is never compared against a baseline from the other backend.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+TEST_CNPJ = "12345678901234"
+TEST_PASSWORD = "123456"
+SEED_CNPJ_BASE = 90000000000000
+
+STATIONS = [
+    ("station_001", "Posto Shell Centro"),
+    ("station_002", "Posto Ipiranga Norte"),
+    ("station_003", "Posto BR Sul"),
+    ("station_004", "Posto Monte Carlo Leste"),
+]
+FUEL_PRICES = {"gasoline": 5.89, "ethanol": 3.99, "diesel": 5.45}
+VEHICLE_MODELS = ["Mercedes Sprinter", "Volkswagen Delivery", "Ford Cargo", "Iveco Daily", "Fiat Ducato"]
+
+# Per-endpoint results of this run, keyed by the report line's name
+RESULTS = {}
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(name, latencies, errors, elapsed):
+    RESULTS[name] = {
+        "n": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+    print(
+        f"{name:<28} n={len(latencies):<6} err={errors:<4} "
+        f"rps={len(latencies) / elapsed:8.1f}  "
+        f"p50={percentile(latencies, 0.50) * 1000:7.1f}ms  "
+        f"p95={percentile(latencies, 0.95) * 1000:7.1f}ms  "
+        f"p99={percentile(latencies, 0.99) * 1000:7.1f}ms  "
+        f"mean={statistics.fmean(latencies) * 1000 if latencies else float('nan'):7.1f}ms"
+    )
+
+
+def seed_cnpj(index):
+    return str(SEED_CNPJ_BASE + index)
+
+
+async def get_token(http: httpx.AsyncClient, cnpj: str = TEST_CNPJ) -> str:
+    response = await http.post("/auth/login-dev", json={"cnpj": cnpj, "password": TEST_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def get_auth_headers(http: httpx.AsyncClient, clients: int):
+    """Authorization headers for the test client, or for the first `clients` seeded clients"""
+    cnpjs = [seed_cnpj(index) for index in range(clients)] if clients else [TEST_CNPJ]
+    tokens = await asyncio.gather(*(get_token(http, cnpj) for cnpj in cnpjs))
+    return [{"Authorization": f"Bearer {token}"} for token in tokens]
+
+
+async def run_mix(count, duration, requests):
+    """Run `count` workers that each pick a random request from `requests` for `duration` seconds.
+
+    Returns {name: (latencies, errors)} plus the elapsed time.
+    """
+    results = {name: ([], [0]) for name in requests}
+    names = list(requests)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            name = random.choice(names)
+            latencies, errors = results[name]
+            started = time.perf_counter()
+            try:
+                response = await requests[name]()
+                if response.status_code >= 400:
+                    errors[0] += 1
+                    continue
+            except httpx.HTTPError:
+                errors[0] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(count)))
+    elapsed = time.perf_counter() - started
+    return {name: (latencies, errors[0]) for name, (latencies, errors) in results.items()}, elapsed
+
+
+async def run_workers(count, duration, request):
+    """Run `count` workers that repeat `request` for `duration` seconds"""
+    results, elapsed = await run_mix(count, duration, {"request": request})
+    latencies, errors = results["request"]
+    return latencies, errors, elapsed
+
+
+def report_mix(results, elapsed):
+    for name, (latencies, errors) in results.items():
+        report(name, latencies, errors, elapsed)
+
+
+async def login_storm(args):
+    limits = httpx.Limits(max_connections=args.concurrency + args.probes + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as http:
+        token = await get_token(http)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def probe():
+            return http.get(args.probe_path, headers=headers)
+
+        def login():
+            return http.post("/auth/login-dev", json={"cnpj": TEST_CNPJ, "password": TEST_PASSWORD})
+
+        print(f"Baseline: {args.probes} probe workers on {args.probe_path} for {args.duration}s")
+        latencies, errors, elapsed = await run_workers(args.probes, args.duration, probe)
+        report(f"GET {args.probe_path} (idle)", latencies, errors, elapsed)
+
+        print(f"Storm: {args.concurrency} login workers alongside the probes for {args.duration}s")
+        (probe_latencies, probe_errors, probe_elapsed), (login_latencies, login_errors, login_elapsed) = (
+            await asyncio.gather(
+                run_workers(args.probes, args.duration, probe),
+                run_workers(args.concurrency, args.duration, login),
+            )
+        )
+        report(f"GET {args.probe_path} (storm)", probe_latencies, probe_errors, probe_elapsed)
+        report("POST /auth/login-dev", login_latencies, login_errors, login_elapsed)
+
+
+async def authorize(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as http:
+        token = await get_token(http)
+        headers = {"Authorization": f"Bearer {token}"}
+        vehicles = (await http.get("/vehicles", headers=headers)).json()
+        if not vehicles:
+            print("No vehicles found; run /create-test-data first")
+            return
+
+        outcomes = {"authorized": 0, "denied": 0}
+        next_vehicle = 0
+
+        async def pump():
+            nonlocal next_vehicle
+            vehicle = vehicles[next_vehicle % len(vehicles)]
+            next_vehicle += 1
+            response = await http.post("/fuel/authorize", headers=headers, json={
+                "vehicle_id": vehicle["id"],
+                "fuel_type": vehicle["fuel_type"],
+                "liters": args.liters,
+                "amount": args.liters * 5.5,
+            })
+            if response.status_code == 200:
+                outcomes["authorized" if response.json()["authorized"] else "denied"] += 1
+            return response
+
+        print(f"{args.concurrency} pump workers for {args.duration}s")
+        latencies, errors, elapsed = await run_workers(args.concurrency, args.duration, pump)
+        report("POST /fuel/authorize", latencies, errors, elapsed)
+        print(f"authorized={outcomes['authorized']} denied={outcomes['denied']}")
+
+
+async def dashboard(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as http:
+        headers = await get_auth_headers(http, args.clients)
+
+        requests = {
+            "GET /dashboard/stats": lambda: http.get("/dashboard/stats", headers=random.choice(headers)),
+            "POST /dashboard/stats weekly": lambda: http.post(
+                "/dashboard/stats", json={"period": "weekly"}, headers=random.choice(headers)
+            ),
+            "GET /credit-status": lambda: http.get("/credit-status", headers=random.choice(headers)),
+            "GET /credit-alerts": lambda: http.get("/credit-alerts", headers=random.choice(headers)),
+        }
+        print(f"{args.concurrency} dashboard workers over {len(headers)} clients for {args.duration}s")
+        report_mix(*await run_mix(args.concurrency, args.duration, requests))
+
+
+async def client_invoices(http, headers):
+    """(headers, invoice id) pairs for every invoice of the given clients"""
+    pairs = []
+    for client_headers in headers:
+        invoices = (await http.get("/invoices", headers=client_headers)).json()
+        pairs.extend((client_headers, invoice["id"]) for invoice in invoices)
+    return pairs
+
+
+async def invoice_details(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as http:
+        invoices = await client_invoices(http, await get_auth_headers(http, args.clients))
+        if not invoices:
+            print("No invoices found; seed data first")
+            return
+
+        def details():
+            headers, invoice_id = random.choice(invoices)
+            return http.get(f"/invoices/{invoice_id}/details", headers=headers)
+
+        print(f"{args.concurrency} workers over {len(invoices)} invoices for {args.duration}s")
+        latencies, errors, elapsed = await run_workers(args.concurrency, args.duration, details)
+        report("GET /invoices/{id}/details", latencies, errors, elapsed)
+
+
+async def export(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as http:
+        headers = await get_auth_headers(http, args.clients)
+        invoices = await client_invoices(http, headers)
+        downloaded = [0]
+        since = (datetime.now(timezone.utc) - timedelta(days=args.export_days)).isoformat()
+
+        async def download(path, client_headers, params=None):
+            # Read the whole body: export latency is time to the last byte
+            async with http.stream("GET", path, headers=client_headers, params=params) as response:
+                async for chunk in response.aiter_bytes():
+                    downloaded[0] += len(chunk)
+            return response
+
+        requests = {
+            "GET /transactions/export": lambda: download(
+                "/transactions/export", random.choice(headers), {"start_date": since}
+            ),
+        }
+        if invoices:
+            def invoice_export():
+                client_headers, invoice_id = random.choice(invoices)
+                return download(f"/invoices/{invoice_id}/export", client_headers)
+            requests["GET /invoices/{id}/export"] = invoice_export
+
+        print(f"{args.concurrency} export workers for {args.duration}s (last {args.export_days} days)")
+        results, elapsed = await run_mix(args.concurrency, args.duration, requests)
+        report_mix(results, elapsed)
+        print(f"downloaded {downloaded[0] / 1e6:.1f} MB ({downloaded[0] / 1e6 / elapsed:.1f} MB/s)")
+
+
+async def seed_only(args):
+    """Nothing to drive: `seed` only writes data"""
+
+
+def make_plate(index):
+    letters = ""
+    for _ in range(3):
+        index, remainder = divmod(index, 26)
+        letters += chr(ord("A") + remainder)
+    index, digits = divmod(index, 1000)
+    return f"{letters}{digits // 100}{chr(ord('A') + index % 26)}{digits % 100:02d}"
+
+
+async def seed(args):
+    """Write a synthetic fleet (clients, vehicles, transactions, invoices) into server.db"""
+    import server
+
+    db = server.db
+    started = time.perf_counter()
+    cnpjs = [seed_cnpj(index) for index in range(args.seed_clients)]
+
+    existing = [doc["id"] for doc in await db.clients.find({"cnpj": {"$in": cnpjs}}, {"id": 1}).to_list(None)]
+    if existing:
+        print(f"Removing {len(existing)} previously seeded clients")
+        for collection in (db.vehicles, db.limits, db.fuel_transactions, db.fuel_daily_rollups, db.invoices, db.credit_alerts):
+            await collection.delete_many({"client_id": {"$in": existing}})
+        await db.clients.delete_many({"id": {"$in": existing}})
+    server.client_cache.clear()
+    server.response_cache.clear()
+
+    password_hash = await server.get_password_hash_async(TEST_PASSWORD)
+    clients = [
+        server.Client(
+            cnpj=cnpj,
+            company_name=f"Transportadora Benchmark {index}",
+            email=f"frota{index}@example.com",
+            phone="11999990000",
+            password_hash=password_hash,
+            credit_limit=float(random.choice([50000, 100000, 250000, 500000])),
+        ).dict()
+        for index, cnpj in enumerate(cnpjs)
+    ]
+    await db.clients.insert_many(clients)
+
+    fleets = {}
+    vehicles = []
+    for client_doc in clients:
+        fleet = [
+            server.Vehicle(
+                client_id=client_doc["id"],
+                license_plate=make_plate(len(vehicles) + offset),
+                model=random.choice(VEHICLE_MODELS),
+                year=random.randint(2015, 2024),
+                fuel_type=random.choice(list(FUEL_PRICES)),
+            ).dict()
+            for offset in range(args.seed_vehicles)
+        ]
+        fleets[client_doc["id"]] = fleet
+        vehicles.extend(fleet)
+    for offset in range(0, len(vehicles), args.seed_batch_size):
+        await db.vehicles.insert_many(vehicles[offset:offset + args.seed_batch_size])
+    print(f"Seeded {len(clients)} clients and {len(vehicles)} vehicles")
+
+    # Transactions are spread uniformly over the last `seed_months` months
+    now = datetime.now(timezone.utc)
+    window = timedelta(days=30 * args.seed_months).total_seconds()
+    client_ids = list(fleets)
+    written = 0
+    while written < args.seed_transactions and client_ids:
+        batch = []
+        for _ in range(min(args.seed_batch_size, args.seed_transactions - written)):
+            client_id = random.choice(client_ids)
+            vehicle = random.choice(fleets[client_id])
+            station_id, station_name = random.choice(STATIONS)
+            liters = round(random.uniform(20, 200), 2)
+            price = FUEL_PRICES[vehicle["fuel_type"]]
+            transaction_date = now - timedelta(seconds=random.uniform(0, window))
+            batch.append({
+                "id": str(uuid.uuid4()),
+                "client_id": client_id,
+                "vehicle_id": vehicle["id"],
+                "license_plate": vehicle["license_plate"],
+                "fuel_type": vehicle["fuel_type"],
+                "liters": liters,
+                "price_per_liter": price,
+                "total_amount": round(liters * price, 2),
+                "station_id": station_id,
+                "station_name": station_name,
+                "transaction_date": transaction_date,
+                "status": "completed",
+                "invoice_id": None,
+            })
+        await db.fuel_transactions.insert_many(batch, ordered=False)
+        await server.apply_transaction_rollups(batch)
+        written += len(batch)
+        print(f"  {written}/{args.seed_transactions} transactions ({written / (time.perf_counter() - started):.0f}/s)", end="\r")
+    if written:
+        print()
+
+    # Bill every month the transactions span through the real billing run, so
+    # invoices list their transactions and transactions carry their invoice_id.
+    local_now = now.astimezone(server.LIMITS_TIMEZONE)
+    year, month = local_now.year, local_now.month
+    cycles = []
+    for _ in range(args.seed_months + 2):
+        cycles.append(f"{year}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    invoice_count = 0
+    for cycle in reversed(cycles):
+        stats = await server.run_billing(cycle)
+        invoice_count += stats["created"]
+
+    # The current and previous months stay open, one in ten older invoices is
+    # overdue and the rest are paid.
+    older = [
+        invoice["id"]
+        for invoice in await db.invoices.find(
+            {"client_id": {"$in": list(fleets)}, "billing_cycle": {"$in": cycles[2:]}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+    ]
+    overdue = [invoice_id for invoice_id in older if random.random() < 0.1]
+    await db.invoices.update_many({"id": {"$in": overdue}}, {"$set": {"status": "overdue"}})
+    await db.invoices.update_many(
+        {"id": {"$in": older}, "status": "open"}, {"$set": {"status": "paid"}}
+    )
+    await server.reconcile_credit_usage()
+    print(f"Seeded {written} transactions and {invoice_count} invoices in {time.perf_counter() - started:.1f}s")
+
+
+class ServerThread:
+    """Run the portal app with uvicorn on a background thread and event loop"""
+
+    def __init__(self, port, in_memory):
+        import server
+        import uvicorn
+
+        if in_memory:
+            from mongomock_motor import AsyncMongoMockClient
+            server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+            # mongomock ignores partialFilterExpression, which would turn the
+            # partial unique index on external_id into a plain unique one
+            server.app.router.on_startup.remove(server.create_db_indexes)
+        config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.server.serve(),), daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.05)
+
+    def run(self, coroutine):
+        """Run a coroutine on the server's loop, so it shares the app's database client"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def compare_baseline(path, tolerance, backend):
+    """Print regressions against a stored baseline; returns True if any were found"""
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("backend") != backend:
+        print(f"Baseline {path} was taken on {baseline.get('backend', 'an unknown backend')}, "
+              f"this run used {backend}; not comparing")
+        return True
+
+    regressed = False
+    for name, current in RESULTS.items():
+        previous = baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        problems = []
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            problems.append(f"p95 {previous['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            problems.append(f"rps {previous['rps']:.1f} -> {current['rps']:.1f}")
+        if problems:
+            regressed = True
+            print(f"REGRESSION {name}: {', '.join(problems)}")
+    if not regressed:
+        print(f"No regressions against {path} (tolerance {tolerance:.0%})")
+    return regressed
+
+
+SCENARIOS = {
+    "login-storm": login_storm,
+    "authorize": authorize,
+    "dashboard": dashboard,
+    "invoice-details": invoice_details,
+    "export": export,
+    "seed": seed_only,
+}
+
+# Scenarios that only need --seed data; the others log in as the
+# /create-test-data client, which an empty in-memory store does not have
+IN_MEMORY_SCENARIOS = {"dashboard", "invoice-details", "export", "seed"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Portal API load benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8001/api")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per phase")
+    parser.add_argument("--clients", type=int, default=0, help="spread load over this many seeded clients (0 = test client)")
+    parser.add_argument("--serve", action="store_true", help="run the app in this process")
+    parser.add_argument("--port", type=int, default=8765, help="port for --serve")
+    parser.add_argument("--in-memory", action="store_true", help="back --serve with mongomock-motor")
+    parser.add_argument("--seed", action="store_true", help="seed synthetic data before the scenario")
+    parser.add_argument("--seed-clients", type=int, default=1000)
+    parser.add_argument("--seed-vehicles", type=int, default=50, help="vehicles per client")
+    parser.add_argument("--seed-transactions", type=int, default=10_000_000)
+    parser.add_argument("--seed-months", type=int, default=12)
+    parser.add_argument("--seed-batch-size", type=int, default=10_000)
+    parser.add_argument("--baseline", help="compare results against this JSON file")
+    parser.add_argument("--save-baseline", help="write results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95/throughput drift")
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    storm = subparsers.add_parser("login-storm", help="probe latency during a burst of logins")
+    storm.add_argument("--concurrency", type=int, default=50, help="concurrent login workers")
+    storm.add_argument("--probes", type=int, default=5, help="concurrent probe workers")
+    storm.add_argument("--probe-path", default="/vehicles")
+
+    pumps = subparsers.add_parser("authorize", help="concurrent fuel authorizations")
+    pumps.add_argument("--concurrency", type=int, default=50, help="concurrent pump workers")
+    pumps.add_argument("--liters", type=float, default=0.5, help="liters per authorization")
+
+    board = subparsers.add_parser("dashboard", help="dashboard and credit widgets")
+    board.add_argument("--concurrency", type=int, default=50)
+
+    details = subparsers.add_parser("invoice-details", help="invoice details pages")
+    details.add_argument("--concurrency", type=int, default=50)
+
+    exports = subparsers.add_parser("export", help="streaming CSV exports")
+    exports.add_argument("--concurrency", type=int, default=5)
+    exports.add_argument("--export-days", type=int, default=30, help="days of transactions per export")
+
+    subparsers.add_parser("seed", help="only seed data")
+
+    args = parser.parse_args(argv)
+    if args.in_memory and args.scenario not in IN_MEMORY_SCENARIOS:
+        parser.error(f"{args.scenario} cannot run --in-memory; use one of {', '.join(sorted(IN_MEMORY_SCENARIOS))}")
+    backend = "in-memory" if args.in_memory else "mongodb"
+    if args.seed or args.serve:
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ.setdefault("DB_NAME", "portal_benchmark")
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+    server_thread = None
+    if args.serve:
+        server_thread = ServerThread(args.port, args.in_memory)
+        server_thread.start()
+        args.base_url = f"http://127.0.0.1:{args.port}/api"
+    try:
+        if args.seed or args.scenario == "seed":
+            if server_thread:
+                server_thread.run(seed(args))
+            else:
+                asyncio.run(seed(args))
+        asyncio.run(SCENARIOS[args.scenario](args))
+    finally:
+        if server_thread:
+            server_thread.stop()
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({"backend": backend, "endpoints": RESULTS}, baseline_file, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.baseline and compare_baseline(args.baseline, args.tolerance, backend):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "portal")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import server  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory database swapped in for server.db"""
+    database = AsyncMongoMockClient()["portal"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
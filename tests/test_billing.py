@@ -0,0 +1,189 @@
+from datetime import datetime
+
+import pytest
+
+import server
+from tests.conftest import run
+from tests.test_pagination import make_transaction
+
+CYCLE = "2026-08"
+
+
+@pytest.fixture
+def cycle_transactions(db):
+    run(db.clients.insert_many([
+        {"id": "client-1", "current_credit_usage": 0.0},
+        {"id": "client-2", "current_credit_usage": 0.0},
+    ]))
+    transactions = [
+        make_transaction(index, datetime(2026, 8, 10 + index), client_id="client-1", total_amount=100.0)
+        for index in range(3)
+    ]
+    transactions += [
+        make_transaction(index, datetime(2026, 8, 20), client_id="client-2", total_amount=50.0)
+        for index in range(3, 5)
+    ]
+    # Outside the cycle window (September in São Paulo time)
+    transactions.append(make_transaction(9, datetime(2026, 9, 1, 3, 30), client_id="client-1", total_amount=999.0))
+    run(db.fuel_transactions.insert_many(transactions))
+    return transactions
+
+
+async def invoice_for(db, client_id):
+    return await db.invoices.find_one({"id": server.billing_invoice_id(client_id, CYCLE)})
+
+
+async def credit_usage(db, client_id):
+    return (await db.clients.find_one({"id": client_id}))["current_credit_usage"]
+
+
+def test_billing_run_invoices_each_client_once(db, cycle_transactions):
+    stats = run(server.run_billing(CYCLE, batch_size=1))
+
+    assert (stats["invoices"], stats["created"], stats["transactions"], stats["errors"]) == (2, 2, 5, 0)
+    invoice = run(invoice_for(db, "client-1"))
+    assert invoice["total_amount"] == 300.0
+    assert sorted(invoice["transactions"]) == ["tx-0000", "tx-0001", "tx-0002"]
+    assert run(credit_usage(db, "client-1")) == 300.0
+
+    rerun = run(server.run_billing(CYCLE, batch_size=1))
+    assert (rerun["clients"], rerun["invoices"]) == (0, 0)
+    assert run(credit_usage(db, "client-1")) == 300.0
+
+
+def test_rerun_bills_transactions_claimed_before_a_crash(db, cycle_transactions, monkeypatch):
+    invoice_model = server.Invoice
+
+    def crash_before_invoice_write(**fields):
+        if fields["client_id"] == "client-1":
+            raise RuntimeError("process killed")
+        return invoice_model(**fields)
+
+    monkeypatch.setattr(server, "Invoice", crash_before_invoice_write)
+    crashed = run(server.run_billing(CYCLE, batch_size=1))
+    assert crashed["errors"] == 1
+    assert run(invoice_for(db, "client-1")) is None
+    # The claim landed, so the main aggregation no longer sees these rows
+    assert run(db.fuel_transactions.count_documents({"client_id": "client-1", "invoice_id": None})) == 1
+
+    monkeypatch.setattr(server, "Invoice", invoice_model)
+    resumed = run(server.run_billing(CYCLE, batch_size=1))
+
+    assert (resumed["clients"], resumed["invoices"], resumed["created"], resumed["errors"]) == (1, 1, 1, 0)
+    invoice = run(invoice_for(db, "client-1"))
+    assert invoice["total_amount"] == 300.0
+    assert sorted(invoice["transactions"]) == ["tx-0000", "tx-0001", "tx-0002"]
+    assert run(credit_usage(db, "client-1")) == 300.0
+    assert run(credit_usage(db, "client-2")) == 100.0
+
+
+def test_legacy_invoices_are_linked_and_not_billed_again(db, cycle_transactions):
+    legacy = {
+        "id": "legacy-1",
+        "client_id": "client-1",
+        "invoice_number": "INV-2026-001",
+        "total_amount": 200.0,
+        "due_date": datetime(2026, 9, 10),
+        "status": "open",
+        "transactions": ["tx-0000", "tx-0001"],
+        "created_at": datetime(2026, 8, 31),
+    }
+    run(db.invoices.insert_one(legacy))
+
+    assert run(server.link_invoice_transactions()) == {"invoices": 1, "transactions": 2}
+    assert run(server.link_invoice_transactions()) == {"invoices": 1, "transactions": 0}
+
+    run(server.run_billing(CYCLE))
+
+    invoice = run(invoice_for(db, "client-1"))
+    assert invoice["transactions"] == ["tx-0002"]
+    assert invoice["total_amount"] == 100.0
+
+
+def add_late_transaction(db, index, amount):
+    run(db.fuel_transactions.insert_one(
+        make_transaction(index, datetime(2026, 8, 28), client_id="client-1", total_amount=amount)
+    ))
+
+
+def test_late_transactions_amend_an_invoice_that_is_still_open(db, cycle_transactions):
+    run(server.run_billing(CYCLE))
+    add_late_transaction(db, 20, 40.0)
+
+    stats = run(server.run_billing(CYCLE))
+
+    assert (stats["invoices"], stats["created"]) == (1, 0)
+    invoice = run(invoice_for(db, "client-1"))
+    assert invoice["total_amount"] == 340.0
+    assert "tx-0020" in invoice["transactions"]
+    assert run(credit_usage(db, "client-1")) == 340.0
+
+
+@pytest.mark.parametrize("status", ["paid", "overdue"])
+def test_late_transactions_after_payment_go_on_an_adjustment_invoice(db, cycle_transactions, status):
+    run(server.run_billing(CYCLE))
+    run(db.invoices.update_one({"id": server.billing_invoice_id("client-1", CYCLE)}, {"$set": {"status": status}}))
+    run(db.clients.update_one({"id": "client-1"}, {"$set": {"current_credit_usage": 300.0 if status == "overdue" else 0.0}}))
+    add_late_transaction(db, 20, 40.0)
+
+    stats = run(server.run_billing(CYCLE))
+
+    assert (stats["invoices"], stats["created"]) == (1, 1)
+    original = run(invoice_for(db, "client-1"))
+    assert original["total_amount"] == 300.0
+    assert original["status"] == status
+    adjustment = run(db.invoices.find_one({"id": server.billing_invoice_id("client-1", CYCLE, adjustment=1)}))
+    assert (adjustment["total_amount"], adjustment["transactions"], adjustment["status"]) == (40.0, ["tx-0020"], "open")
+    assert adjustment["billing_cycle"] == CYCLE
+    assert run(credit_usage(db, "client-1")) == (340.0 if status == "overdue" else 40.0)
+
+    # A later transaction amends the open adjustment, not the settled invoice
+    add_late_transaction(db, 21, 10.0)
+    run(server.run_billing(CYCLE))
+    adjustment = run(db.invoices.find_one({"id": server.billing_invoice_id("client-1", CYCLE, adjustment=1)}))
+    assert adjustment["total_amount"] == 50.0
+    assert run(invoice_for(db, "client-1"))["total_amount"] == 300.0
+
+
+def test_claims_are_returned_when_the_invoice_is_paid_mid_run(db, cycle_transactions, monkeypatch):
+    run(server.run_billing(CYCLE))
+    add_late_transaction(db, 20, 40.0)
+    invoice_id = server.billing_invoice_id("client-1", CYCLE)
+    target = server.billing_target_invoice_id
+
+    def record_payment():
+        # The hook is synchronous, so write through mongomock's underlying collection
+        db.invoices._AsyncMongoMockCollection__collection.update_one({"id": invoice_id}, {"$set": {"status": "paid"}})
+
+    def paid_after_target_was_chosen(client_id, cycle, invoices):
+        chosen = target(client_id, cycle, invoices)
+        record_payment()
+        return chosen
+
+    monkeypatch.setattr(server, "billing_target_invoice_id", paid_after_target_was_chosen)
+    run(server.run_billing(CYCLE))
+
+    assert run(invoice_for(db, "client-1"))["total_amount"] == 300.0
+    late = run(db.fuel_transactions.find_one({"id": "tx-0020"}))
+    assert late["invoice_id"] is None and "billing_cycle" not in late
+
+    monkeypatch.setattr(server, "billing_target_invoice_id", target)
+    run(server.run_billing(CYCLE))
+    adjustment = run(db.invoices.find_one({"id": server.billing_invoice_id("client-1", CYCLE, adjustment=1)}))
+    assert adjustment["transactions"] == ["tx-0020"]
+
+
+def test_invoice_details_pages_linked_transactions_with_totals(db, cycle_transactions):
+    run(server.run_billing(CYCLE, batch_size=1))
+    invoice_id = server.billing_invoice_id("client-1", CYCLE)
+    client = {"id": "client-1"}
+
+    first = run(server.get_invoice_details(invoice_id, offset=0, limit=2, current_user=client))
+    rest = run(server.get_invoice_details(invoice_id, offset=2, limit=2, current_user=client))
+
+    assert first["invoice"]["id"] == invoice_id and "transactions" not in first["invoice"]
+    assert (first["transaction_count"], first["total_amount"]) == (3, 300.0)
+    assert [line["id"] for line in first["transactions"] + rest["transactions"]] == ["tx-0002", "tx-0001", "tx-0000"]
+    with pytest.raises(server.HTTPException) as error:
+        run(server.get_invoice_details(invoice_id, offset=0, limit=2, current_user={"id": "client-2"}))
+    assert error.value.status_code == 404
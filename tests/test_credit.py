@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from tests.conftest import run
+
+
+def make_invoice(invoice_id, client_id, amount, status="open"):
+    return {
+        "id": invoice_id,
+        "client_id": client_id,
+        "invoice_number": f"INV-{invoice_id}",
+        "total_amount": amount,
+        "due_date": datetime(2026, 10, 10),
+        "status": status,
+        "transactions": [],
+        "created_at": datetime(2026, 9, 30),
+    }
+
+
+async def balance(db, client_id):
+    return (await db.clients.find_one({"id": client_id}))["current_credit_usage"]
+
+
+def test_reconcile_repairs_drifted_balances(db):
+    run(db.clients.insert_many([
+        {"id": "drifted", "current_credit_usage": 999.0},
+        {"id": "correct", "current_credit_usage": 300.0},
+        {"id": "no-invoices", "current_credit_usage": 50.0},
+    ]))
+    run(db.invoices.insert_many([
+        make_invoice("1", "drifted", 100.0),
+        make_invoice("2", "drifted", 200.0, status="overdue"),
+        make_invoice("3", "drifted", 400.0, status="paid"),
+        make_invoice("4", "correct", 300.0),
+    ]))
+
+    assert run(server.reconcile_credit_usage(batch_size=2)) == {"checked": 3, "repaired": 2}
+    assert run(balance(db, "drifted")) == 300.0
+    assert run(balance(db, "correct")) == 300.0
+    assert run(balance(db, "no-invoices")) == 0.0
+
+
+def test_reconcile_keeps_invoice_created_after_balance_was_read(db, monkeypatch):
+    run(db.clients.insert_one({"id": "client-1", "current_credit_usage": 100.0}))
+    run(db.invoices.insert_one(make_invoice("1", "client-1", 100.0)))
+    reconcile_credit_batch = server.reconcile_credit_batch
+
+    async def invoice_lands_mid_run(clients, tolerance):
+        invoice = make_invoice("2", "client-1", 250.0)
+        await db.invoices.insert_one(invoice)
+        await server.record_invoice_created(invoice)
+        return await reconcile_credit_batch(clients, tolerance)
+
+    monkeypatch.setattr(server, "reconcile_credit_batch", invoice_lands_mid_run)
+
+    assert run(server.reconcile_credit_usage())["repaired"] == 0
+    assert run(balance(db, "client-1")) == 350.0
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    monkeypatch.setattr(server, "BILLING_API_KEY", "billing-secret")
+    return TestClient(server.app)
+
+
+def test_status_route_moves_invoice_out_of_credit_usage(db, api):
+    run(db.clients.insert_one({"id": "client-1", "current_credit_usage": 300.0}))
+    run(db.invoices.insert_one(make_invoice("1", "client-1", 300.0)))
+    headers = {"X-Billing-Key": "billing-secret"}
+
+    response = api.post("/api/invoices/1/status", json={"status": "paid"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "paid"
+    assert run(balance(db, "client-1")) == 0.0
+
+    # Repeating the update does not release the amount twice
+    assert api.post("/api/invoices/1/status", json={"status": "paid"}, headers=headers).status_code == 200
+    assert run(balance(db, "client-1")) == 0.0
+
+
+def test_status_route_rejects_bad_requests(db, api):
+    run(db.invoices.insert_one(make_invoice("1", "client-1", 300.0)))
+
+    assert api.post("/api/invoices/1/status", json={"status": "paid"}).status_code == 401
+    headers = {"X-Billing-Key": "billing-secret"}
+    assert api.post("/api/invoices/1/status", json={"status": "void"}, headers=headers).status_code == 400
+    assert api.post("/api/invoices/missing/status", json={"status": "paid"}, headers=headers).status_code == 404
+
+
+def test_overdue_run_drops_cached_responses_of_affected_clients(db, monkeypatch):
+    cache = server.ResponseCache(max_clients=10, ttl=60)
+    monkeypatch.setattr(server, "response_cache", cache)
+    run(db.invoices.insert_many([
+        make_invoice("1", "late", 100.0),
+        {**make_invoice("2", "on-time", 100.0), "due_date": datetime(2099, 1, 1)},
+    ]))
+    for client_id in ("late", "on-time"):
+        cache.set(client_id, "/invoices", "etag", b"[]")
+
+    assert run(server.update_invoice_statuses())["overdue"] == 1
+
+    assert cache.get("late", "/invoices") is None
+    assert cache.get("on-time", "/invoices") is not None
+
+
+def test_billing_run_command_evaluates_the_alerts_it_queued(db):
+    from typer.testing import CliRunner
+
+    import cli
+
+    run(server.drain_credit_evaluations())
+    run(db.clients.insert_one({
+        "id": "client-1", "cnpj": "12345678901234", "company_name": "Transportadora Teste",
+        "email": "frota@example.com", "phone": "11999990000", "credit_limit": 1000.0,
+        "current_credit_usage": 0.0, "is_active": True,
+        "email_notifications": True, "whatsapp_notifications": False,
+    }))
+    run(db.fuel_transactions.insert_one({
+        "id": "tx-1", "client_id": "client-1", "vehicle_id": "vehicle-1", "license_plate": "ABC1234",
+        "fuel_type": "diesel", "liters": 150.0, "price_per_liter": 6.0, "total_amount": 950.0,
+        "station_id": "station_001", "station_name": "Posto Shell Centro",
+        "transaction_date": datetime(2026, 8, 20), "status": "completed", "invoice_id": None,
+    }))
+
+    result = CliRunner().invoke(cli.app, ["billing-run", "--cycle", "2026-08"])
+
+    assert result.exit_code == 0, result.output
+    assert server.credit_evaluation_queue.empty()
+    alert = run(db.credit_alerts.find_one({"client_id": "client-1"}))
+    assert alert["alert_type"] == "90"
+    assert run(db.notification_outbox.count_documents({"idempotency_key": f"credit-alert:{alert['id']}:email"})) == 1
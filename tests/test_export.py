@@ -0,0 +1,26 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import server
+from tests.conftest import run
+from tests.test_pagination import make_transaction
+
+
+async def collect(query, export_format):
+    return "".join([chunk async for chunk in server.stream_transactions_export(query, export_format)])
+
+
+def test_ndjson_dates_match_csv(db):
+    run(db.fuel_transactions.insert_many([
+        make_transaction(1, datetime(2026, 9, 15, 12, 30, 5)),
+        make_transaction(2, datetime(2026, 9, 14, 8, 0, 0, 250000)),
+    ]))
+
+    csv_rows = list(csv.DictReader(io.StringIO(run(collect({"client_id": "client-1"}, "csv")))))
+    ndjson_rows = [json.loads(line) for line in run(collect({"client_id": "client-1"}, "ndjson")).splitlines()]
+
+    assert [row["transaction_date"] for row in ndjson_rows] == [row["transaction_date"] for row in csv_rows]
+    assert ndjson_rows[0]["transaction_date"] == "2026-09-15T12:30:05"
+    assert ndjson_rows[1]["transaction_date"] == "2026-09-14T08:00:00.250000"
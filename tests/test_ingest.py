@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.conftest import run
+from tests.test_limits import make_limit, usage
+
+
+@pytest.fixture
+def fleet(db):
+    run(db.vehicles.insert_many([
+        {"id": "vehicle-1", "client_id": "client-1", "license_plate": "ABC1234", "is_active": True},
+        {"id": "vehicle-2", "client_id": "client-1", "license_plate": "XYZ9876", "is_active": True},
+    ]))
+    limit = make_limit("limit-1", datetime.now(timezone.utc) + timedelta(days=1), limit_value=1000.0)
+    run(db.limits.insert_one(limit))
+    return limit
+
+
+def authorize(db, limit, amount, vehicle_id="vehicle-1"):
+    """Reserve amount on the limit the way /fuel/authorize does"""
+    window = run(server.reserve_limit(limit, amount))
+    authorization = {
+        "id": f"auth-{vehicle_id}-{amount}",
+        "client_id": "client-1",
+        "vehicle_id": vehicle_id,
+        "reservations": [{"limit_id": limit["id"], "amount": amount, "reset_date": window["reset_date"]}],
+        "status": "reserved",
+    }
+    run(db.fuel_authorizations.insert_one(authorization))
+    return authorization["id"]
+
+
+def fueling(external_id, total_amount, authorization_id=None, vehicle_id="vehicle-1"):
+    return {
+        "external_id": external_id,
+        "client_id": "client-1",
+        "vehicle_id": vehicle_id,
+        "license_plate": "ABC1234",
+        "fuel_type": "gasoline",
+        "liters": total_amount / 5.0,
+        "price_per_liter": 5.0,
+        "total_amount": total_amount,
+        "station_id": "station_001",
+        "station_name": "Posto Shell Centro",
+        "transaction_date": datetime.now(timezone.utc).isoformat(),
+        "authorization_id": authorization_id,
+    }
+
+
+async def authorization_status(db, authorization_id):
+    return (await db.fuel_authorizations.find_one({"id": authorization_id}))["status"]
+
+
+def test_authorized_fueling_charges_only_the_difference(db, fleet):
+    over = authorize(db, fleet, 150.0)
+    under = authorize(db, fleet, 100.0, vehicle_id="vehicle-2")
+    assert run(usage(db, "limit-1")) == 250.0
+
+    result = run(server.ingest_transactions([
+        fueling("ext-1", 200.0, over),
+        fueling("ext-2", 60.0, under, vehicle_id="vehicle-2"),
+    ]))
+
+    assert result["inserted"] == 2
+    assert run(usage(db, "limit-1")) == 260.0
+    assert run(authorization_status(db, over)) == "completed"
+    assert run(authorization_status(db, under)) == "completed"
+
+
+def test_unknown_or_mismatched_authorization_is_charged_in_full(db, fleet):
+    other_vehicle = authorize(db, fleet, 100.0, vehicle_id="vehicle-2")
+
+    run(server.ingest_transactions([
+        fueling("ext-1", 80.0, "does-not-exist"),
+        fueling("ext-2", 50.0, other_vehicle),
+    ]))
+
+    assert run(usage(db, "limit-1")) == 230.0
+    assert run(authorization_status(db, other_vehicle)) == "reserved"
+
+
+def test_authorization_is_only_claimed_once(db, fleet):
+    authorization_id = authorize(db, fleet, 100.0)
+
+    run(server.ingest_transactions([fueling("ext-1", 100.0, authorization_id)]))
+    run(server.ingest_transactions([fueling("ext-2", 100.0, authorization_id)]))
+
+    assert run(usage(db, "limit-1")) == 200.0
+
+
+def test_reservation_cleared_by_a_reset_is_not_released_again(db, fleet):
+    authorization_id = authorize(db, fleet, 150.0)
+    run(db.limits.update_one(
+        {"id": "limit-1"},
+        {"$set": {"current_usage": 0.0, "reset_date": datetime.now(timezone.utc) + timedelta(days=2)}}
+    ))
+
+    run(server.ingest_transactions([fueling("ext-1", 120.0, authorization_id)]))
+
+    assert run(usage(db, "limit-1")) == 120.0
+
+
+def test_offset_timestamp_is_stored_and_summarized_in_utc(db, fleet):
+    row = {**fueling("ext-1", 100.0), "transaction_date": "2026-09-15T22:00:00-03:00"}
+
+    assert run(server.ingest_transactions([row]))["inserted"] == 1
+
+    stored = run(db.fuel_transactions.find_one({"external_id": "ext-1"}))
+    assert stored["transaction_date"].replace(tzinfo=timezone.utc) == datetime(2026, 9, 16, 1, 0, tzinfo=timezone.utc)
+    assert run(db.fuel_daily_rollups.find_one({}))["_id"].endswith(":2026-09-16")
+    summary = run(server.summarize_period_transactions(
+        "client-1", datetime(2026, 9, 16, tzinfo=timezone.utc), datetime(2026, 9, 16, 23, 59, tzinfo=timezone.utc)
+    ))
+    assert summary["gasoline"]["amount"] == 100.0
+
+
+def test_only_completed_rows_count_towards_rollups_and_limits(db, fleet):
+    run(server.ingest_transactions([
+        fueling("ext-1", 100.0),
+        {**fueling("ext-2", 200.0), "status": "cancelled"},
+        {**fueling("ext-3", 300.0), "status": "pending"},
+    ]))
+
+    assert run(db.fuel_transactions.count_documents({})) == 3
+    assert run(usage(db, "limit-1")) == 100.0
+    rollups = run(db.fuel_daily_rollups.find({}).to_list(None))
+    assert sum(rollup["amount"] for rollup in rollups) == 100.0
+    now = datetime.now(timezone.utc)
+    summary = run(server.summarize_period_transactions("client-1", now - timedelta(days=2), now))
+    assert summary["gasoline"] == {"liters": 20.0, "amount": 100.0, "count": 1}
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+
+import server
+from tests.conftest import run
+
+
+def make_limit(limit_id, reset_date, current_usage=0.0, **overrides):
+    return {
+        "id": limit_id,
+        "client_id": "client-1",
+        "vehicle_id": None,
+        "limit_type": "daily",
+        "fuel_type": None,
+        "limit_value": 500.0,
+        "limit_unit": "currency",
+        "current_usage": current_usage,
+        "reset_date": reset_date,
+        "is_active": True,
+        **overrides,
+    }
+
+
+async def usage(db, limit_id):
+    return (await db.limits.find_one({"id": limit_id}))["current_usage"]
+
+
+async def reserve(limit, increment):
+    window = await server.reserve_limit(limit, increment)
+    return {"limit_id": limit["id"], "amount": increment, "reset_date": window["reset_date"]}
+
+
+def test_release_gives_usage_back_within_the_same_window(db):
+    limit = make_limit("limit-1", datetime(2030, 1, 1), current_usage=100.0)
+    run(db.limits.insert_one(limit))
+
+    reservation = run(reserve(limit, 150.0))
+    assert run(usage(db, "limit-1")) == 250.0
+
+    run(server.release_limit_reservations([reservation]))
+    assert run(usage(db, "limit-1")) == 100.0
+
+
+def test_release_after_reset_does_not_go_negative(db):
+    limit = make_limit("limit-1", datetime.now(timezone.utc) - timedelta(minutes=1))
+    run(db.limits.insert_one(limit))
+    reservation = run(reserve(limit, 150.0))
+
+    run(server.reset_expired_limits())
+    assert run(usage(db, "limit-1")) == 0.0
+
+    run(server.release_limit_reservations([reservation]))
+    assert run(usage(db, "limit-1")) == 0.0
+
+
+def test_release_of_reservation_without_reset_date_never_goes_negative(db):
+    run(db.limits.insert_one(make_limit("limit-1", datetime(2030, 1, 1), current_usage=40.0)))
+
+    run(server.release_limit_reservations([{"limit_id": "limit-1", "amount": 150.0}]))
+    assert run(usage(db, "limit-1")) == 40.0
+
+    run(server.release_limit_reservations([{"limit_id": "limit-1", "amount": 30.0}]))
+    assert run(usage(db, "limit-1")) == 10.0
+
+
+def test_refused_reservation_returns_none(db):
+    limit = make_limit("limit-1", datetime(2030, 1, 1), current_usage=450.0)
+    run(db.limits.insert_one(limit))
+
+    assert run(server.reserve_limit(limit, 100.0)) is None
+    assert run(usage(db, "limit-1")) == 450.0
+
+
+def test_unclaimed_authorizations_give_their_reservations_back(db):
+    limit = make_limit("limit-1", datetime(2030, 1, 1), current_usage=100.0)
+    run(db.limits.insert_one(limit))
+    now = datetime.now(timezone.utc)
+    run(db.fuel_authorizations.insert_many([
+        {"id": "stale", "status": "reserved", "created_at": now - timedelta(hours=5),
+         "reservations": [run(reserve(limit, 150.0))]},
+        {"id": "fresh", "status": "reserved", "created_at": now, "reservations": [run(reserve(limit, 50.0))]},
+    ]))
+    assert run(usage(db, "limit-1")) == 300.0
+
+    run(server.reset_expired_limits(batch_size=1))
+    run(server.reset_expired_limits(batch_size=1))
+
+    assert run(usage(db, "limit-1")) == 150.0
+    statuses = {a["id"]: a["status"] for a in run(db.fuel_authorizations.find().to_list(None))}
+    assert statuses == {"stale": "expired", "fresh": "reserved"}
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_monthly_reset_rolls_over_december_into_january():
+    # 2026-12-31 20:00 in São Paulo is already 2027-01-01 in UTC
+    assert server.next_limit_reset("monthly", utc(2026, 12, 31, 23, 0)) == utc(2027, 1, 1, 3, 0)
+    assert server.next_limit_reset("monthly", utc(2027, 1, 1, 3, 0)) == utc(2027, 2, 1, 3, 0)
+
+
+def test_monthly_reset_from_month_end_is_the_first_of_next_month():
+    assert server.next_limit_reset("monthly", utc(2027, 1, 31, 12, 0)) == utc(2027, 2, 1, 3, 0)
+    assert server.next_limit_reset("monthly", utc(2028, 2, 29, 12, 0)) == utc(2028, 3, 1, 3, 0)
+    assert server.next_limit_reset("monthly", utc(2026, 4, 30, 12, 0)) == utc(2026, 5, 1, 3, 0)
+
+
+def test_weekly_reset_is_the_next_monday_in_local_time():
+    # Wednesday
+    assert server.next_limit_reset("weekly", utc(2026, 10, 14, 12, 0)) == utc(2026, 10, 19, 3, 0)
+    # Sunday night locally, already Monday in UTC
+    assert server.next_limit_reset("weekly", utc(2026, 10, 19, 2, 0)) == utc(2026, 10, 19, 3, 0)
+    # Monday: the window that just started ends next Monday
+    assert server.next_limit_reset("weekly", utc(2026, 10, 19, 3, 0)) == utc(2026, 10, 26, 3, 0)
+
+
+def test_daily_reset_is_local_midnight():
+    assert server.next_limit_reset("daily", utc(2026, 10, 15, 2, 59)) == utc(2026, 10, 15, 3, 0)
+    assert server.next_limit_reset("daily", utc(2026, 10, 15, 3, 0)) == utc(2026, 10, 16, 3, 0)
+
+
+def test_reset_expired_limits_works_through_every_batch(db):
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    limits = [make_limit(f"daily-{index}", past, current_usage=100.0) for index in range(5)]
+    limits += [make_limit(f"monthly-{index}", past, current_usage=100.0, limit_type="monthly") for index in range(3)]
+    limits += [
+        make_limit("not-due", future, current_usage=100.0),
+        make_limit("inactive", past, current_usage=100.0, is_active=False),
+    ]
+    run(db.limits.insert_many(limits))
+
+    assert run(server.reset_expired_limits(batch_size=2)) == {"daily": 5, "weekly": 0, "monthly": 3}
+
+    reset = run(db.limits.find({"current_usage": 0.0}).to_list(None))
+    assert sorted(limit["id"] for limit in reset) == sorted(limit["id"] for limit in limits[:8])
+    assert all(limit["reset_date"].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc) for limit in reset)
+    assert run(usage(db, "not-due")) == 100.0
+    assert run(usage(db, "inactive")) == 100.0
+
+    # A second run finds nothing left to do
+    assert run(server.reset_expired_limits(batch_size=2)) == {"daily": 0, "weekly": 0, "monthly": 0}
@@ -0,0 +1,37 @@
+import server
+from tests.conftest import run
+
+
+def test_metrics_include_password_pool_stats():
+    pool = server.PasswordHashPool(workers=2, max_in_flight=4)
+    run(pool.run(server.get_password_hash, "123456"))
+
+    lines = server.render_password_pool_metrics(pool.stats())
+
+    assert "portal_password_hash_workers 2" in lines
+    assert "portal_password_hash_max_in_flight 4" in lines
+    assert "portal_password_hash_in_flight 0" in lines
+    assert "portal_password_hash_completed_total 1" in lines
+    assert any(line.startswith('portal_password_hash_run_seconds{quantile="0.99"} ') for line in lines)
+    pool.executor.shutdown()
+
+
+def test_render_metrics_exposes_password_pool():
+    assert "# TYPE portal_password_hash_in_flight gauge" in server.render_metrics()
+
+
+def test_explained_slow_shapes_are_bounded(monkeypatch):
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(server, "SLOW_QUERY_EXPLAIN_MAX_SHAPES", 2)
+    metrics = server.MongoCommandMetrics()
+    submitted = []
+    metrics.explain_executor = SimpleNamespace(submit=lambda function, shape, *args: submitted.append(shape))
+    event = SimpleNamespace(command_name="find")
+
+    for shape in ("a", "b", "a", "c", "a", "b"):
+        metrics.log_command(event, 1.0, (shape, {}, "portal"), "test")
+
+    # "b" was the least recently seen when "c" arrived, so it is explained again
+    assert list(metrics.explained) == ["a", "b"]
+    assert submitted == ["a", "b", "c", "b"]
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.conftest import run
+
+
+def two_factor_notification(expires_at):
+    document = server.notification_document(
+        "email", "frota@example.com", "2fa:12345678901234:654321",
+        subject="Código de Verificação", code="654321", expires_at=expires_at
+    )
+    return {**document, "status": "processing", "attempts": 1}
+
+
+async def stored(db, notification):
+    return await db.notification_outbox.find_one({"id": notification["id"]})
+
+
+@pytest.mark.parametrize("delivered, attempts, status", [(True, 1, "sent"), (False, 5, "dead")])
+def test_code_is_removed_once_delivery_is_final(db, monkeypatch, delivered, attempts, status):
+    async def deliver(notification):
+        return delivered
+
+    monkeypatch.setattr(server, "deliver_notification", deliver)
+    monkeypatch.setattr(server, "NOTIFICATION_MAX_ATTEMPTS", 5)
+    notification = {**two_factor_notification(datetime.now(timezone.utc) + timedelta(minutes=5)), "attempts": attempts}
+    run(db.notification_outbox.insert_one(dict(notification)))
+
+    run(server.deliver_and_record(notification))
+
+    row = run(stored(db, notification))
+    assert row["status"] == status
+    assert "code" not in row
+
+
+def test_expired_code_is_dropped_without_delivery(db, monkeypatch):
+    async def deliver(notification):
+        raise AssertionError("expired codes must not be sent")
+
+    monkeypatch.setattr(server, "deliver_notification", deliver)
+    notification = two_factor_notification(datetime.now(timezone.utc) - timedelta(seconds=1))
+    run(db.notification_outbox.insert_one(dict(notification)))
+
+    run(server.deliver_and_record(notification))
+
+    row = run(stored(db, notification))
+    assert row["status"] == "dead"
+    assert "code" not in row
+
+
+def test_outbox_rows_expire_with_their_code():
+    ttl = {
+        index.document["name"]: index.document.get("expireAfterSeconds")
+        for index in server.INDEXES["notification_outbox"]
+    }
+    assert ttl["expires_at_ttl"] == 0
+
+
+def test_enqueue_during_an_empty_claim_wakes_the_worker(monkeypatch):
+    monkeypatch.setattr(server, "NOTIFICATION_POLL_INTERVAL", 30)
+
+    async def scenario():
+        monkeypatch.setattr(server, "notification_wakeup", server.asyncio.Event())
+        claims = []
+        second_claim = server.asyncio.get_running_loop().create_future()
+
+        async def claim_notification():
+            claims.append(None)
+            if len(claims) == 1:
+                # A message is queued while this claim is in flight and finds nothing
+                server.notification_wakeup.set()
+            elif not second_claim.done():
+                second_claim.set_result(True)
+            return None
+
+        monkeypatch.setattr(server, "claim_notification", claim_notification)
+        worker = server.asyncio.create_task(server.notification_worker(0))
+        try:
+            return await server.asyncio.wait_for(second_claim, timeout=1)
+        finally:
+            worker.cancel()
+
+    assert run(scenario()) is True
+
+
+def test_outbox_backlog_is_exported_on_metrics(db):
+    now = datetime.now(timezone.utc)
+    rows = [
+        {**server.notification_document("email", "a@example.com", f"key-{index}"), "status": status}
+        for index, status in enumerate(["pending", "pending", "processing", "dead", "sent"])
+    ]
+    rows[0]["created_at"] = now - timedelta(minutes=10)
+    run(db.notification_outbox.insert_many(rows))
+
+    backlog = run(server.get_outbox_backlog())
+    text = server.render_metrics(backlog)
+
+    assert backlog["depth"] == {"pending": 2, "processing": 1, "dead": 1}
+    assert 'portal_notification_outbox_depth{status="pending"} 2' in text
+    assert 'portal_notification_outbox_depth{status="dead"} 1' in text
+    oldest = next(line for line in text.splitlines() if line.startswith("portal_notification_outbox_oldest_pending_seconds "))
+    assert 590 < float(oldest.split()[1]) < 700
@@ -0,0 +1,106 @@
+import base64
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.conftest import run
+
+NOW = datetime(2026, 9, 15, 12, 0, 0)
+
+
+def make_transaction(index, transaction_date, **overrides):
+    return {
+        "id": f"tx-{index:04d}",
+        "client_id": "client-1",
+        "vehicle_id": "vehicle-1",
+        "license_plate": "ABC1234",
+        "fuel_type": "gasoline",
+        "liters": 40.0,
+        "price_per_liter": 5.89,
+        "total_amount": 235.6,
+        "station_id": "station_001",
+        "station_name": "Posto Shell Centro",
+        "transaction_date": transaction_date,
+        "status": "completed",
+        "invoice_id": None,
+        **overrides,
+    }
+
+
+def fetch_all(limit, **filters):
+    """Follow X-Next-Cursor until the last page and return every page"""
+    params = {"fuel_type": None, "station_id": None, "start_date": None, "end_date": None, **filters}
+    pages = []
+    cursor = None
+    while True:
+        response = run(server.paginate_transactions({"client_id": "client-1"}, cursor, limit, **params))
+        pages.append([transaction["id"] for transaction in orjson.loads(response.body)])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_pages_across_equal_timestamps_without_gaps_or_repeats(db):
+    transactions = [make_transaction(index, NOW) for index in range(7)]
+    transactions += [make_transaction(index, NOW - timedelta(minutes=1)) for index in range(7, 12)]
+    run(db.fuel_transactions.insert_many(transactions))
+
+    pages = fetch_all(limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 3, 3]
+    seen = [transaction_id for page in pages for transaction_id in page]
+    assert seen == [f"tx-{index:04d}" for index in reversed(range(7))] + [
+        f"tx-{index:04d}" for index in reversed(range(7, 12))
+    ]
+
+
+def test_filters_are_kept_when_following_the_cursor(db):
+    transactions = [
+        make_transaction(
+            index,
+            NOW - timedelta(hours=index),
+            fuel_type="diesel" if index % 2 else "gasoline",
+            station_id="station_002" if index % 3 == 0 else "station_001",
+        )
+        for index in range(20)
+    ]
+    run(db.fuel_transactions.insert_many(transactions))
+    start_date = NOW - timedelta(hours=15)
+
+    pages = fetch_all(limit=2, fuel_type="diesel", station_id="station_001", start_date=start_date)
+
+    expected = [
+        transaction["id"]
+        for transaction in transactions
+        if transaction["fuel_type"] == "diesel"
+        and transaction["station_id"] == "station_001"
+        and transaction["transaction_date"] >= start_date
+    ]
+    assert [transaction_id for page in pages for transaction_id in page] == expected
+    assert all(len(page) <= 2 for page in pages)
+
+
+def test_last_page_has_no_next_cursor(db):
+    run(db.fuel_transactions.insert_many([make_transaction(index, NOW) for index in range(3)]))
+
+    response = run(server.paginate_transactions({"client_id": "client-1"}, None, 3, None, None, None, None))
+
+    assert len(orjson.loads(response.body)) == 3
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b'{"i": "tx-0001"}').decode(),
+    base64.urlsafe_b64encode(b'{"d": "yesterday", "i": "tx-0001"}').decode(),
+    base64.urlsafe_b64encode(b'["2026-09-15T12:00:00", "tx-0001"]').decode(),
+])
+def test_malformed_cursor_is_rejected_with_400(db, cursor):
+    with pytest.raises(HTTPException) as error:
+        run(server.paginate_transactions({"client_id": "client-1"}, cursor, 10, None, None, None, None))
+
+    assert error.value.status_code == 400
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.conftest import run
+from tests.test_pagination import make_transaction
+
+BRASILIA = timezone(timedelta(hours=-3))
+
+
+def test_rollup_day_truncates_in_utc():
+    local_evening = datetime(2026, 9, 15, 22, 0, tzinfo=BRASILIA)
+
+    assert server.rollup_day(local_evening) == datetime(2026, 9, 16, tzinfo=timezone.utc)
+    assert server.rollup_day(datetime(2026, 9, 16, 1, 0)) == datetime(2026, 9, 16)
+    assert server.rollup_key({**make_transaction(1, local_evening), "fuel_type": "diesel"}).endswith(":2026-09-16")
+
+
+@pytest.fixture
+def three_days(db):
+    """Transactions every three hours from 2026-09-14 00:00 to 2026-09-16 21:00 UTC, with rollups"""
+    transactions = [
+        make_transaction(index, datetime(2026, 9, 14) + timedelta(hours=3 * index), total_amount=float(index + 1))
+        for index in range(24)
+    ]
+    run(db.fuel_transactions.insert_many([dict(transaction) for transaction in transactions]))
+    run(server.apply_transaction_rollups(transactions))
+    return transactions
+
+
+def expected_amount(transactions, start_date, end_date):
+    return sum(
+        transaction["total_amount"]
+        for transaction in transactions
+        if start_date <= transaction["transaction_date"].replace(tzinfo=timezone.utc) <= end_date
+    )
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    # Partial first and last day around a full rollup day
+    (datetime(2026, 9, 14, 10, 0, tzinfo=timezone.utc), datetime(2026, 9, 16, 13, 0, tzinfo=timezone.utc)),
+    # Edges exactly on day boundaries
+    (datetime(2026, 9, 14, tzinfo=timezone.utc), datetime(2026, 9, 16, tzinfo=timezone.utc)),
+    # Within a single day
+    (datetime(2026, 9, 15, 4, 0, tzinfo=timezone.utc), datetime(2026, 9, 15, 20, 0, tzinfo=timezone.utc)),
+    # The same partial edges expressed in São Paulo time
+    (datetime(2026, 9, 14, 7, 0, tzinfo=BRASILIA), datetime(2026, 9, 16, 10, 0, tzinfo=BRASILIA)),
+])
+def test_partial_day_edges_merge_with_full_day_rollups(three_days, start_date, end_date):
+    summary = run(server.summarize_period_transactions("client-1", start_date, end_date))
+
+    assert summary["gasoline"]["amount"] == expected_amount(three_days, start_date, end_date)
+    assert summary["gasoline"]["count"] == sum(
+        1 for transaction in three_days
+        if start_date <= transaction["transaction_date"].replace(tzinfo=timezone.utc) <= end_date
+    )
+
+
+def test_offset_timestamp_is_summarized_on_its_utc_day(db):
+    transaction = make_transaction(1, datetime(2026, 9, 15, 22, 0, tzinfo=BRASILIA), total_amount=80.0)
+    run(db.fuel_transactions.insert_one(dict(transaction)))
+    run(server.apply_transaction_rollups([transaction]))
+
+    utc_day = run(server.summarize_period_transactions(
+        "client-1", datetime(2026, 9, 16, tzinfo=timezone.utc), datetime(2026, 9, 16, 23, 59, tzinfo=timezone.utc)
+    ))
+    previous_day = run(server.summarize_period_transactions(
+        "client-1", datetime(2026, 9, 15, tzinfo=timezone.utc), datetime(2026, 9, 15, 23, 59, tzinfo=timezone.utc)
+    ))
+
+    assert utc_day["gasoline"]["amount"] == 80.0
+    assert previous_day == {}
@@ -0,0 +1,92 @@
+import socket
+from email.mime.text import MIMEText
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import server
+from tests.conftest import run
+
+REFUSED = "refused@example.com"
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.delivered = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server_, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return "550 5.1.1 Mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server_, session, envelope):
+        self.sessions.add(id(session))
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+def make_pool(port, size):
+    return server.SMTPConnectionPool(
+        hostname="127.0.0.1",
+        port=port,
+        username="",
+        password="",
+        start_tls=False,
+        size=size,
+        max_messages_per_connection=100,
+        idle_check_seconds=30,
+        timeout=5
+    )
+
+
+def make_message(recipient):
+    message = MIMEText("Seu código de verificação é: 123456")
+    message["From"] = "portal@example.com"
+    message["To"] = recipient
+    message["Subject"] = "Código de verificação"
+    return message
+
+
+async def send_and_close(pool, messages):
+    try:
+        return await pool.send_batch(messages)
+    finally:
+        await pool.close()
+
+
+def test_send_batch_reuses_pooled_connections(smtp_server):
+    handler, port = smtp_server
+    pool = make_pool(port, size=2)
+    recipients = [f"user{index}@example.com" for index in range(6)]
+
+    results = run(send_and_close(pool, [make_message(recipient) for recipient in recipients]))
+
+    assert results == [True] * 6
+    assert sorted(handler.delivered) == sorted(recipients)
+    assert pool.connections_opened <= 2
+
+
+def test_refused_recipient_keeps_the_connection(smtp_server):
+    handler, port = smtp_server
+    pool = make_pool(port, size=1)
+    messages = [make_message("first@example.com"), make_message(REFUSED), make_message("last@example.com")]
+
+    results = run(send_and_close(pool, messages))
+
+    assert results == [True, False, True]
+    assert handler.delivered == ["first@example.com", "last@example.com"]
+    assert pool.connections_opened == 1
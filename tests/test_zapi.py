@@ -0,0 +1,66 @@
+import httpx
+import pytest
+
+import server
+from tests.conftest import run
+
+
+@pytest.fixture
+def zapi(monkeypatch):
+    """Route Z-API calls through a scripted transport and record each attempt"""
+    attempts = []
+
+    def install(*outcomes):
+        def handler(request):
+            outcome = outcomes[len(attempts)]
+            attempts.append(request)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return httpx.Response(outcome)
+
+        async def post():
+            http_client = httpx.AsyncClient(base_url="https://zapi.test", transport=httpx.MockTransport(handler))
+            monkeypatch.setattr(server, "zapi_http_client", http_client)
+            async with http_client:
+                return await server.zapi_post("/send-text", {"phone": "5534999402367", "message": "hi"})
+
+        return post
+
+    monkeypatch.setattr(server, "ZAPI_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(server, "ZAPI_MAX_RETRIES", 2)
+    return install, attempts
+
+
+def test_connect_errors_and_retryable_statuses_are_retried(zapi):
+    install, attempts = zapi
+    post = install(httpx.ConnectError("refused"), 503, 200)
+
+    response = run(post())
+
+    assert response.status_code == 200
+    assert len(attempts) == 3
+
+
+def test_read_timeout_after_sending_is_not_retried(zapi):
+    install, attempts = zapi
+    post = install(httpx.ReadTimeout("slow"), 200)
+
+    assert run(post()) is None
+    assert len(attempts) == 1
+
+
+@pytest.mark.parametrize("status_code", [400, 500, 502])
+def test_other_statuses_are_returned_without_retrying(zapi, status_code):
+    install, attempts = zapi
+    post = install(status_code, 200)
+
+    assert run(post()).status_code == status_code
+    assert len(attempts) == 1
+
+
+def test_gives_up_after_max_retries(zapi):
+    install, attempts = zapi
+    post = install(429, 429, 429)
+
+    assert run(post()).status_code == 429
+    assert len(attempts) == 3